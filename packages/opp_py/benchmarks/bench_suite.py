@@ -0,0 +1,305 @@
+"""Throughput benchmarks for the OPP hot paths, with saved baselines and a regression gate.
+
+Usage:
+    python packages/opp_py/benchmarks/bench_suite.py                      # run and print
+    python packages/opp_py/benchmarks/bench_suite.py --only analyze --hops 1e3,1e4,1e5,1e6
+    python packages/opp_py/benchmarks/bench_suite.py --save my-baseline.json
+    python packages/opp_py/benchmarks/bench_suite.py --compare my-baseline.json --threshold 0.25
+
+Groups (``--only``, comma separated):
+  - merkle: ``merkle_root`` over random 64-byte leaves
+  - canonical: ``canonical`` / ``cid_of`` on a typical envelope and on a 1e3-hop bundle
+  - envelope: ``create_envelope`` (canonicalize, hash, Ed25519 sign)
+  - stamp: ``@stamp`` per call against a local stand-in gateway (sync and background sending)
+  - analyze: ``build_graph_from_bundle`` / ``to_passport`` on synthetic bundles (``synth.py``)
+  - exporter: exporter endpoints under concurrent load (in-process ASGI, stubbed gateway);
+    skipped when FastAPI is not installed
+
+Each case reports the best of ``--repeat`` runs as throughput (items per second).
+``--compare`` fails (exit code 1) when a case's throughput is more than ``--threshold``
+below the baseline's. Throughput depends on the machine, so compare against a baseline
+recorded on the same kind of host; ``baseline.json`` next to this file was recorded on a
+1-CPU Linux VM (Python 3.11, orjson backend).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import datetime
+import gc
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+from opp import canonical as canon
+from opp.decorators import stamp
+from opp.graph import build_graph_from_bundle, to_passport
+from opp.merkle import merkle_root
+from opp.odin_shim import OPEClient
+from opp.sender import get_sender
+from synth import synth_bundle, synth_bundle_bytes
+
+SEED = base64.urlsafe_b64encode(bytes([7]) * 32).decode().rstrip("=")
+REPO_ROOT = Path(__file__).resolve().parents[3]
+
+
+@dataclass
+class Case:
+    name: str
+    unit: str
+    items: int
+    run: Callable[[], object]
+
+
+def _sizes(spec: str) -> list[int]:
+    return [int(float(s)) for s in spec.split(",") if s]
+
+
+def _label(n: int) -> str:
+    exp = len(str(n)) - 1
+    return f"1e{exp}" if n == 10 ** exp else str(n)
+
+
+def bench_merkle(args: argparse.Namespace) -> Iterator[Case]:
+    for n in _sizes(args.leaves):
+        chunks = [os.urandom(64) for _ in range(n)]
+        yield Case(f"merkle_root[{_label(n)}]", "leaves/s", n, lambda c=chunks: merkle_root(c))
+
+
+def bench_canonical(args: argparse.Namespace) -> Iterator[Case]:
+    client = OPEClient(gateway_url="http://bench.invalid", sender_priv_b64=SEED, sender_kid="bench")
+    env = client.create_envelope(next(iter(synth_bundle(3)["chain"]))["normalized"], "opp.step.v1", "opp.step.v1",
+                                 trace_id="bench")
+    calls = args.calls
+    yield Case("canonical[envelope]", "calls/s", calls, lambda: [canon.canonical(env) for _ in range(calls)])
+    yield Case("cid_of[envelope]", "calls/s", calls, lambda: [canon.cid_of(env) for _ in range(calls)])
+    bundle = synth_bundle(1000)
+    yield Case("cid_of[bundle 1e3]", "hops/s", 1000, lambda: canon.cid_of(bundle))
+
+
+def bench_envelope(args: argparse.Namespace) -> Iterator[Case]:
+    client = OPEClient(gateway_url="http://bench.invalid", sender_priv_b64=SEED, sender_kid="bench")
+    payload = synth_bundle(3)["chain"][2]["normalized"]
+    calls = args.calls
+    yield Case("create_envelope", "calls/s", calls,
+               lambda: [client.create_envelope(payload, "opp.step.v1", "opp.step.v1", trace_id="bench")
+                        for _ in range(calls)])
+
+
+class _Gateway(BaseHTTPRequestHandler):
+    """Stand-in gateway: accepts every envelope POST with 201."""
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        self.send_response(201)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def bench_stamp(args: argparse.Namespace) -> Iterator[Case]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Gateway)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = OPEClient(gateway_url=f"http://127.0.0.1:{server.server_port}", sender_priv_b64=SEED,
+                       sender_kid="bench")
+
+    @stamp("bench.step.v1", client=client)
+    def step(x: int) -> int:
+        return x + 1
+
+    mode = os.environ.get("OPP_SEND_MODE")
+    try:
+        calls = max(args.calls // 10, 1)  # two inline POSTs per call
+        os.environ["OPP_SEND_MODE"] = "sync"
+        yield Case("stamp[sync]", "calls/s", calls, lambda: [step(i) for i in range(calls)])
+
+        def background() -> None:
+            for i in range(args.calls):
+                step(i)
+            get_sender(client).flush(timeout=60)  # delivery included
+
+        os.environ["OPP_SEND_MODE"] = "background"
+        yield Case("stamp[background]", "calls/s", args.calls, background)
+    finally:
+        if mode is None:
+            os.environ.pop("OPP_SEND_MODE", None)
+        else:
+            os.environ["OPP_SEND_MODE"] = mode
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+
+def bench_analyze(args: argparse.Namespace) -> Iterator[Case]:
+    for n in _sizes(args.hops):
+        bundle = synth_bundle(n)
+        graph = build_graph_from_bundle(bundle)
+        yield Case(f"build_graph_from_bundle[{_label(n)}]", "hops/s", n, lambda b=bundle: build_graph_from_bundle(b))
+        yield Case(f"to_passport[{_label(n)}]", "hops/s", n, lambda g=graph, b=bundle: to_passport(g, b))
+        del bundle, graph
+        gc.collect()
+
+
+def bench_exporter(args: argparse.Namespace) -> Iterator[Case]:
+    try:
+        import httpx
+        sys.path.insert(0, str(REPO_ROOT))
+        from services.exporter_api import main
+    except ImportError as e:
+        print(f"exporter: skipped ({e})", file=sys.stderr)
+        return
+    hops = 1000
+    body = synth_bundle_bytes(hops)
+    etag = '"bench-v1"'
+
+    async def gateway(request: httpx.Request) -> httpx.Response:
+        if request.headers.get("if-none-match") == etag:
+            return httpx.Response(304, headers={"etag": etag})
+        return httpx.Response(200, content=body, headers={"etag": etag, "content-type": "application/json"})
+
+    loop = asyncio.new_event_loop()
+    main._http = httpx.AsyncClient(transport=httpx.MockTransport(gateway))
+    api = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://exporter")
+    fresh = main.CACHE_FRESH
+    concurrency = args.concurrency
+    traces = [f"warm-{i}" for i in range(16)]
+    rounds = [0]
+
+    async def load(paths: list[str]) -> None:
+        it = iter(paths)
+
+        async def worker() -> None:
+            for path in it:
+                r = await api.get(path)
+                r.raise_for_status()
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    def run(paths: Callable[[], list[str]]) -> Callable[[], object]:
+        return lambda: loop.run_until_complete(load(paths()))
+
+    def uncached() -> list[str]:  # new trace ids every run: fetch, parse and analyze each
+        rounds[0] += 1
+        return [f"/passport/cold-{rounds[0]}-{i}" for i in range(args.requests // 8)]
+
+    try:
+        loop.run_until_complete(load([f"/passport/{t}" for t in traces]))
+        main.CACHE_FRESH = 1e9
+        for endpoint in ("passport", "graph"):
+            paths = [f"/{endpoint}/{traces[i % len(traces)]}" for i in range(args.requests)]
+            yield Case(f"exporter.{endpoint}[cached,c={concurrency}]", "req/s", len(paths), run(lambda p=paths: p))
+        main.CACHE_FRESH = 0.0
+        paths = [f"/passport/{traces[i % len(traces)]}" for i in range(args.requests)]
+        yield Case(f"exporter.passport[revalidated,c={concurrency}]", "req/s", len(paths), run(lambda: paths))
+        yield Case(f"exporter.passport[uncached 1e3 hops,c={concurrency}]", "req/s", args.requests // 8,
+                   run(uncached))
+    finally:
+        main.CACHE_FRESH = fresh
+        loop.run_until_complete(api.aclose())
+        loop.run_until_complete(main._http.aclose())
+        loop.close()
+
+
+GROUPS: dict[str, Callable[[argparse.Namespace], Iterator[Case]]] = {
+    "merkle": bench_merkle,
+    "canonical": bench_canonical,
+    "envelope": bench_envelope,
+    "stamp": bench_stamp,
+    "analyze": bench_analyze,
+    "exporter": bench_exporter,
+}
+
+
+def measure(case: Case, repeat: int) -> dict[str, Any]:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        case.run()
+        best = min(best, time.perf_counter() - t0)
+    return {"unit": case.unit, "items": case.items, "seconds": round(best, 6),
+            "throughput": round(case.items / best, 2)}
+
+
+def machine() -> dict[str, Any]:
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "machine": platform.machine(), "system": platform.system(), "cpus": os.cpu_count(),
+            "canonical_backend": canon.backend()}
+
+
+def compare(name: str, result: dict[str, Any], baseline: dict[str, Any], threshold: float) -> tuple[str, bool]:
+    """Status column text and whether ``name`` regressed past ``threshold``."""
+    base = baseline.get("results", {}).get(name)
+    if base is None:
+        return "new", False
+    change = result["throughput"] / base["throughput"] - 1
+    regressed = change < -threshold
+    return f"{change:+7.1%} {'REGRESSED' if regressed else 'ok'}", regressed
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--only", default=",".join(GROUPS), help=f"comma separated groups ({', '.join(GROUPS)})")
+    ap.add_argument("--hops", default="1e3,1e4,1e5", help="synthetic bundle sizes for the analyze group")
+    ap.add_argument("--leaves", default="1e4,1e5", help="leaf counts for the merkle group")
+    ap.add_argument("--calls", type=int, default=1000, help="calls per run for per-call cases")
+    ap.add_argument("--requests", type=int, default=512, help="requests per run for the exporter group")
+    ap.add_argument("--concurrency", type=int, default=32, help="concurrent exporter requests")
+    ap.add_argument("--repeat", type=int, default=3, help="runs per case; the best one counts")
+    ap.add_argument("--save", metavar="PATH", help="write the results as a baseline")
+    ap.add_argument("--compare", metavar="PATH", help="baseline to compare against")
+    ap.add_argument("--threshold", type=float, default=0.25,
+                    help="allowed throughput drop vs the baseline before failing (0.25 = 25%%)")
+    args = ap.parse_args()
+
+    groups = [g.strip() for g in args.only.split(",") if g.strip()]
+    unknown = sorted(set(groups) - set(GROUPS))
+    if unknown:
+        raise SystemExit(f"unknown groups: {unknown} (expected some of {list(GROUPS)})")
+    baseline: dict[str, Any] = {}
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        here, there = machine(), baseline.get("machine", {})
+        diff = sorted(k for k in here if k in there and here[k] != there[k])
+        if diff:
+            print(f"warning: baseline recorded on a different host ({', '.join(diff)} differ)", file=sys.stderr)
+
+    info = machine()
+    print(" ".join(f"{k}={v}" for k, v in info.items()))
+    print(f"{'case':<44} {'throughput':>14} {'unit':<9} {'best s':>9}" + ("  vs baseline" if baseline else ""))
+    results: dict[str, Any] = {}
+    regressions = []
+    for group in groups:
+        for case in GROUPS[group](args):
+            res = results[case.name] = measure(case, args.repeat)
+            line = f"{case.name:<44} {res['throughput']:>14,.0f} {res['unit']:<9} {res['seconds']:>9.4f}"
+            if baseline:
+                status, regressed = compare(case.name, res, baseline, args.threshold)
+                line += f"  {status}"
+                if regressed:
+                    regressions.append(case.name)
+            print(line, flush=True)
+
+    if args.save:
+        doc = {"created": datetime.datetime.now(datetime.UTC).isoformat(timespec="seconds"),
+               "machine": info, "results": results}
+        Path(args.save).write_text(json.dumps(doc, indent=2) + "\n", encoding="utf-8")
+    if regressions:
+        raise SystemExit(f"throughput regressed more than {args.threshold:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
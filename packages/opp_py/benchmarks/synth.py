@@ -0,0 +1,64 @@
+"""Deterministic synthetic export bundles for the benchmarks.
+
+Hops look like what instrumented pipelines emit: a linked chain (64-hex ``receipt_hash``
+and ``prev_receipt_hash``), second-resolution UTC timestamps and normalized payloads
+cycling through ingest / train / eval / export steps, with eval metrics and safety flags,
+a dataset manifest every 100 hops and OPA policy decisions (one deny in eight) every 50.
+The same ``(n, trace_id, seed)`` always gives the same bundle.
+"""
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+from collections.abc import Iterator
+from typing import Any
+
+__all__ = ["synth_bundle", "synth_bundle_bytes", "synth_hops"]
+
+STEPS = ("ingest.v1", "train.v1", "eval.v1", "export.v1")
+_T0 = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+
+
+def _normalized(i: int, trace_id: str) -> dict[str, Any]:
+    step = STEPS[i % len(STEPS)]
+    norm: dict[str, Any] = {"step": step, "phase": "end", "status": "ok", "trace": trace_id}
+    if step == "ingest.v1" and i % 100 == 0:
+        norm["dataset"] = {"name": f"shard-{i // 100}", "chunks": [
+            {"cid": hashlib.sha256(f"{trace_id}:{i}:{c}".encode()).hexdigest(), "bytes": 1 << 20} for c in range(4)]}
+    if step == "train.v1":
+        norm["model_id"] = "bench-model-1"
+    if step == "eval.v1":
+        norm["metrics"] = {"accuracy": round(0.5 + (i % 500) / 1000, 3), "loss": round(1.0 / (1 + i), 6)}
+        norm["safety"] = {"pii": False, "toxicity": i % 997 == 0}
+    if i % 50 == 0:
+        norm["policy"] = {"engine": "opa", "decisions": [
+            {"rule": "data.allow", "outcome": "deny" if i % 400 == 0 else "allow"}]}
+    return norm
+
+
+def synth_hops(n: int, trace_id: str = "bench", *, seed: int = 0) -> Iterator[dict[str, Any]]:
+    """``n`` linked hops of one trace."""
+    prev = None
+    for i in range(n):
+        rid = hashlib.sha256(f"{seed}:{trace_id}:{i}".encode()).hexdigest()
+        hop: dict[str, Any] = {
+            "trace_id": trace_id,
+            "receipt_hash": rid,
+            "ts": (_T0 + datetime.timedelta(seconds=i)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "normalized": _normalized(i, trace_id),
+        }
+        if prev is not None:
+            hop["prev_receipt_hash"] = prev
+        prev = rid
+        yield hop
+
+
+def synth_bundle(n: int, trace_id: str = "bench", *, seed: int = 0) -> dict[str, Any]:
+    """An export bundle (``{"trace_id", "chain"}``) of ``n`` hops."""
+    return {"trace_id": trace_id, "chain": list(synth_hops(n, trace_id, seed=seed))}
+
+
+def synth_bundle_bytes(n: int, trace_id: str = "bench", *, seed: int = 0) -> bytes:
+    """``synth_bundle`` as the gateway's export endpoint serves it."""
+    return json.dumps(synth_bundle(n, trace_id, seed=seed), separators=(",", ":")).encode("utf-8")
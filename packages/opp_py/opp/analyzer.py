@@ -0,0 +1,324 @@
+"""Single-pass bundle analysis.
+
+``BundleAnalyzer`` visits every hop of an export bundle exactly once and accumulates
+whichever outputs were requested:
+
+  - ``graph``: nodes/edges as ``build_graph_from_bundle`` returns them, kept as a
+    columnar ``ReceiptChain`` until ``graph()`` materializes them
+  - ``passport``: the auditor summary ``to_passport`` returns (implies ``policy``)
+  - ``policy``: policy engines, decisions and breaches
+  - ``validation``: hash-chain continuity (``prev_receipt_hash`` links)
+
+Outputs that were not requested cost nothing beyond the shared hop loop, e.g. the
+``/policy`` endpoint never materializes graph nodes. Hops can be fed one at a time,
+so the analyzer also works on streamed bundles.
+
+``snapshot()`` saves the accumulated state as a JSON-safe dict and
+``BundleAnalyzer.from_snapshot`` continues from it: fed the grown chain again, the
+restored analyzer only position-checks the hops the snapshot covers (the last one must
+carry the snapshot's ``receipt_hash``, the next one must link to it) and folds in the
+rest, giving the same results as a full pass. ``finish()`` reports ``"mismatch"`` when
+the chain no longer extends the snapshot (rewritten or truncated history); the caller
+then analyzes from scratch. ``skip(n)`` tells it the source already left out the first
+``n`` hops (e.g. a receipt store read from an offset).
+"""
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import Any
+
+from .chain import ReceiptChain
+from .merkle import merkle_root
+
+__all__ = ["ALL_OUTPUTS", "SNAPSHOT_VERSION", "BundleAnalyzer", "hop_dataset_roots"]
+
+ALL_OUTPUTS = frozenset({"graph", "passport", "policy", "validation"})
+SNAPSHOT_VERSION = 1
+_ALLOW_OUTCOMES = ("allow", "pass", "ok")
+
+
+def _chunk_root(ds: dict[str, Any]) -> str | None:
+    roots = [c.get("cid", "") for c in ds.get("chunks", []) if c.get("cid")]
+    return merkle_root([cid.encode() for cid in roots]) if roots else None
+
+
+def hop_dataset_roots(norm: dict[str, Any]) -> list[str]:
+    """Dataset Merkle roots derived from one hop's normalized payload."""
+    ds = norm.get("dataset") or norm.get("datasets")
+    found: list[str | None] = []
+    if isinstance(ds, list):
+        found = [_chunk_root(d) for d in ds if isinstance(d, dict) and "chunks" in d]
+    elif isinstance(ds, dict) and "chunks" in ds:
+        found = [_chunk_root(ds)]
+    return [r for r in found if r]
+
+
+class BundleAnalyzer:
+    """Accumulates graph / passport / policy / validation results in one pass over hops."""
+
+    def __init__(self, outputs: Iterable[str] = ALL_OUTPUTS):
+        wanted = frozenset(outputs)
+        unknown = wanted - ALL_OUTPUTS
+        if unknown:
+            raise ValueError(f"unknown analyzer outputs: {sorted(unknown)}")
+        self.outputs = wanted
+        self._graph = "graph" in wanted
+        self._passport = "passport" in wanted
+        self._policy = self._passport or "policy" in wanted
+        self._validation = "validation" in wanted
+
+        self.count = 0
+        self.trace_id: str | None = None
+        self.bundle_cid: str | None = None
+        self.first_hop_trace_id: str | None = None
+        self._last_hash: Any = None
+        # graph
+        self.chain = ReceiptChain()
+        # passport
+        self.steps: set[str] = set()
+        self.first_ts: str | None = None
+        self.last_ts: str | None = None
+        self.model_id: str | None = None
+        self.metrics: dict[str, Any] = {}
+        self.safety: dict[str, bool] = {}
+        self.dataset_roots: list[str] = []
+        # policy
+        self.policy_engines: list[str] = []
+        self.policy_decisions: list[dict[str, Any]] = []
+        self.policy_breaches: list[dict[str, Any]] = []
+        # validation
+        self.chain_ok = True
+        self.break_at: int | None = None
+        # resuming from a snapshot: hops before resumed_at were already accumulated
+        self.resumed_at = 0
+        self.resume_status = "none"
+        self._position = 0
+
+    @classmethod
+    def analyze(cls, bundle: dict[str, Any], outputs: Iterable[str] = ALL_OUTPUTS) -> BundleAnalyzer:
+        a = cls(outputs)
+        a.set_meta(bundle)
+        a.feed_all(bundle.get("chain") or bundle.get("hops") or [])
+        return a
+
+    def set_meta(self, bundle: dict[str, Any]) -> None:
+        """Record bundle-level fields (everything except the hop list)."""
+        self.trace_id = bundle.get("trace_id") or self.trace_id
+        self.bundle_cid = bundle.get("bundle_cid") or bundle.get("cid") or self.bundle_cid
+
+    def feed_all(self, hops: Iterable[dict[str, Any]]) -> BundleAnalyzer:
+        for hop in hops:
+            self.feed(hop)
+        return self
+
+    def feed(self, hop: dict[str, Any]) -> None:
+        if self.resume_status != "none" and not self._resume_feed(hop):
+            return
+        idx = self.count
+        rid = hop.get("receipt_hash")
+        ts = hop.get("ts")
+        norm = hop.get("normalized", {})
+        if idx == 0:
+            self.first_hop_trace_id = hop.get("trace_id")
+        if self._validation and idx > 0 and self.chain_ok and hop.get("prev_receipt_hash") != self._last_hash:
+            self.chain_ok = False
+            self.break_at = idx
+        if self._graph:
+            self.chain.append(rid, ts, norm.get("step"))
+        if self._passport:
+            self._feed_passport(norm, ts)
+        if self._policy:
+            self._feed_policy(norm)
+        self._last_hash = rid
+        self.count = idx + 1
+
+    def _resume_feed(self, hop: dict[str, Any]) -> bool:
+        """Position bookkeeping of a restored analyzer; True if ``hop`` is new and must be folded in."""
+        pos = self._position
+        self._position = pos + 1
+        if self.resume_status == "mismatch":
+            return False
+        if pos < self.resumed_at:
+            if pos == self.resumed_at - 1 and hop.get("receipt_hash") != self._last_hash:
+                self.resume_status = "mismatch"
+            return False
+        if pos == self.resumed_at and self.resume_status == "pending":
+            if hop.get("prev_receipt_hash") != self._last_hash:
+                self.resume_status = "mismatch"
+                return False
+            self.resume_status = "matched"
+        return True
+
+    def skip(self, n: int) -> None:
+        """The hop source starts at index ``n`` (at most the snapshot's hop count)."""
+        if not 0 <= n <= self.resumed_at or self._position:
+            raise ValueError(f"can only skip up to the {self.resumed_at} snapshotted hops, before feeding")
+        self._position = n
+
+    def finish(self) -> str:
+        """Resume status once every hop was fed: ``none``, ``matched`` or ``mismatch``."""
+        if self.resume_status == "pending":
+            self.resume_status = "matched" if self._position == self.resumed_at else "mismatch"
+        return self.resume_status
+
+    def snapshot(self) -> dict[str, Any]:
+        """JSON-safe accumulated state, to continue with ``from_snapshot`` once the chain grows."""
+        if self.finish() == "mismatch":
+            raise RuntimeError("chain does not extend the snapshot this analyzer resumed from")
+        snap: dict[str, Any] = {
+            "version": SNAPSHOT_VERSION, "outputs": sorted(self.outputs), "count": self.count,
+            "last_hash": self._last_hash, "trace_id": self.trace_id, "bundle_cid": self.bundle_cid,
+            "first_hop_trace_id": self.first_hop_trace_id,
+        }
+        if self._graph:
+            snap["chain"] = self.chain.to_dict()
+        if self._passport:
+            snap.update(steps=sorted(self.steps), first_ts=self.first_ts, last_ts=self.last_ts,
+                        model_id=self.model_id, metrics=self.metrics, safety=self.safety,
+                        dataset_roots=self.dataset_roots)
+        if self._policy:
+            snap.update(policy_engines=self.policy_engines, policy_decisions=self.policy_decisions,
+                        policy_breaches=self.policy_breaches)
+        if self._validation:
+            snap.update(chain_ok=self.chain_ok, break_at=self.break_at)
+        return snap
+
+    @classmethod
+    def from_snapshot(cls, snap: dict[str, Any]) -> BundleAnalyzer:
+        """Analyzer continuing from ``snap``; feed it the whole grown chain (or ``skip`` the prefix)."""
+        if snap.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"unsupported analyzer snapshot version {snap.get('version')!r}")
+        a = cls(snap["outputs"])
+        a.count = a.resumed_at = int(snap["count"])
+        a.resume_status = "pending"
+        a._last_hash = snap["last_hash"]
+        a.trace_id, a.bundle_cid = snap["trace_id"], snap["bundle_cid"]
+        a.first_hop_trace_id = snap["first_hop_trace_id"]
+        if a._graph:
+            a.chain = ReceiptChain.from_dict(snap["chain"])
+        if a._passport:  # containers are copied: the snapshot may back a result still being served
+            a.steps = set(snap["steps"])
+            a.first_ts, a.last_ts, a.model_id = snap["first_ts"], snap["last_ts"], snap["model_id"]
+            a.metrics, a.safety = dict(snap["metrics"]), dict(snap["safety"])
+            a.dataset_roots = list(snap["dataset_roots"])
+        if a._policy:
+            a.policy_engines = list(snap["policy_engines"])
+            a.policy_decisions = list(snap["policy_decisions"])
+            a.policy_breaches = list(snap["policy_breaches"])
+        if a._validation:
+            a.chain_ok, a.break_at = snap["chain_ok"], snap["break_at"]
+        return a
+
+    def _feed_passport(self, norm: dict[str, Any], ts: str | None) -> None:
+        step = norm.get("step")
+        if step:
+            self.steps.add(step)
+        if ts:
+            if self.first_ts is None:
+                self.first_ts = ts
+            self.last_ts = ts
+        if not self.model_id:
+            self.model_id = norm.get("model_id") or norm.get("model")
+        m = norm.get("metrics")
+        if isinstance(m, dict):
+            # prefer final metric (later overwrites earlier)
+            self.metrics.update(m)
+        sf = norm.get("safety") or {}
+        if isinstance(sf, dict):
+            for k, v in sf.items():
+                if isinstance(v, bool):
+                    self.safety[k] = self.safety.get(k, False) or v
+        self.dataset_roots.extend(hop_dataset_roots(norm))
+
+    def _feed_policy(self, norm: dict[str, Any]) -> None:
+        policy = norm.get("policy") or {}
+        if not isinstance(policy, dict):
+            return
+        eng = policy.get("engine") or policy.get("policy_engine")
+        if eng and eng not in self.policy_engines:
+            self.policy_engines.append(eng)
+        decs = policy.get("decisions") or norm.get("policy_decisions")
+        if isinstance(decs, list):
+            for d in decs:
+                if isinstance(d, dict):
+                    self.policy_decisions.append(d)
+                    outcome = (d.get("outcome") or d.get("result") or d.get("decision") or "").lower()
+                    if outcome and outcome not in _ALLOW_OUTCOMES:
+                        self.policy_breaches.append(d)
+
+    def _require(self, output: str) -> None:
+        if output not in self.outputs:
+            raise RuntimeError(f"analyzer was not asked for '{output}' (outputs={sorted(self.outputs)})")
+
+    @property
+    def nodes(self) -> list[dict[str, Any]]:
+        return list(self.chain.iter_nodes())
+
+    @property
+    def edges(self) -> list[dict[str, Any]]:
+        return list(self.chain.iter_edges())
+
+    @property
+    def resolved_trace_id(self) -> str | None:
+        return self.trace_id or self.first_hop_trace_id
+
+    def graph(self) -> dict[str, Any]:
+        self._require("graph")
+        return self.chain.graph()
+
+    def policy(self) -> dict[str, Any]:
+        if not self._policy:
+            self._require("policy")
+        return {
+            "engines": self.policy_engines,
+            "decisions": self.policy_decisions,
+            "breaches": self.policy_breaches,
+            "breach_count": len(self.policy_breaches),
+        }
+
+    def validation(self) -> dict[str, Any]:
+        self._require("validation")
+        return {"ok": self.chain_ok, "count": self.count, "break_at": self.break_at}
+
+    def passport(self, graph: dict[str, Any] | None = None) -> dict[str, Any]:
+        """Passport summary; ``graph`` (if given) supplies the receipt/integrity counts."""
+        self._require("passport")
+        if graph is not None:
+            receipts = graph.get("count")
+            nodes, edges = len(graph.get("nodes", [])), len(graph.get("edges", []))
+        else:
+            receipts, nodes, edges = self.count, self.count, max(self.count - 1, 0)
+        steps = sorted(self.steps)
+        return {
+            "trace_id": self.resolved_trace_id,
+            "receipts": receipts,
+            "steps": steps,
+            "first_ts": self.first_ts,
+            "last_ts": self.last_ts,
+            "model_id": self.model_id,
+            "dataset_roots": self.dataset_roots,
+            "metrics": self.metrics,
+            "safety_flags": self.safety,
+            "policy_engines": self.policy_engines,
+            "policy_decisions": self.policy_decisions,
+            "policy_breaches": self.policy_breaches,
+            "bundle_cid": self.bundle_cid,
+            "integrity": {
+                "graph_nodes": nodes,
+                "graph_edges": edges,
+            },
+            "summary": f"Model {self.model_id or 'N/A'} with {len(steps)} steps and {len(self.dataset_roots)} dataset roots"
+        }
+
+    def results(self) -> dict[str, Any]:
+        """Every requested output, keyed by output name."""
+        out: dict[str, Any] = {}
+        if self._graph:
+            out["graph"] = self.graph()
+        if self._passport:
+            out["passport"] = self.passport()
+        if "policy" in self.outputs:
+            out["policy"] = self.policy()
+        if self._validation:
+            out["validation"] = self.validation()
+        return out
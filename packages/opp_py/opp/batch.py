@@ -0,0 +1,204 @@
+"""Batch processing of many traces: concurrent fetches, pooled analysis, streamed results.
+
+``arun_batch`` pulls trace ids lazily from any iterable (e.g. a file or stdin), keeps
+at most ``concurrency`` traces in flight over one pooled ``httpx.AsyncClient``, and
+yields one result dict per trace in completion order:
+
+    {"trace_id": ..., "ok": bool, "result": {...}}      # or "error": "..." instead of "result"
+
+With ``gateway`` the export bundle is fetched and analyzed (and, for ``validate`` with
+``deep``, verified receipt by receipt) on a worker pool, so parsing and hashing run
+in parallel with the downloads; with ``api`` the exporter's endpoint result is
+returned as is; ``gateway`` may also be a local receipt store URL (``opp.store``), read
+in the workers. ``result`` has the shape the single-trace CLI command prints.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from collections.abc import AsyncIterator, Iterable, Iterator, Mapping
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any
+
+import httpx
+
+from .analyzer import BundleAnalyzer
+from .checkpoint import CheckpointStore
+from .store import ReceiptStore, is_store_url, open_store
+from .stream import iter_bundle_hops
+from .transport import TransportConfig, arequest, build_async_client
+from .verify import verify_hops
+
+__all__ = ["COMMANDS", "arun_batch", "command_result", "iter_trace_ids", "process_bundle", "process_stored"]
+
+COMMANDS = ("graph", "validate", "passport", "policy")
+_OUTPUTS = {"graph": {"graph"}, "validate": {"validation"}, "passport": {"passport"}, "policy": {"policy"}}
+_stores: dict[str, CheckpointStore] = {}
+_read_stores: dict[tuple[int, str], ReceiptStore] = {}
+
+
+def iter_trace_ids(lines: Iterable[str]) -> Iterator[str]:
+    """Trace ids from lines of text, skipping blanks and ``#`` comments."""
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def command_result(command: str, analyzer: BundleAnalyzer) -> dict[str, Any]:
+    """What ``opp <command>`` prints for an analyzed bundle."""
+    if command == "graph":
+        return {"graph": analyzer.graph()}
+    if command == "validate":
+        return analyzer.validation()
+    if command == "passport":
+        return analyzer.passport()
+    if command == "policy":
+        pol = analyzer.policy()
+        return {
+            "trace_id": analyzer.resolved_trace_id,
+            "policy_engines": pol["engines"],
+            "breaches": pol["breaches"],
+            "breach_count": pol["breach_count"],
+        }
+    raise ValueError(f"unknown command {command!r} (expected one of {COMMANDS})")
+
+
+def _checkpoints(path: str | None) -> CheckpointStore | None:
+    if not path:
+        return None
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = CheckpointStore(path)
+    return store
+
+
+def _read_store(url: str) -> ReceiptStore:
+    key = (os.getpid(), url)
+    store = _read_stores.get(key)
+    if store is None:
+        store = _read_stores[key] = open_store(url, readonly=True)
+    return store
+
+
+def _process_hops(command: str, hops: Iterable[dict[str, Any]], meta: dict[str, Any], trace_id: str,
+                  options: Mapping[str, Any]) -> dict[str, Any]:
+    if command == "validate" and options.get("deep"):
+        analyzer = BundleAnalyzer({"validation"})
+        chain = list(hops)
+        analyzer.feed_all(chain)
+        deep = verify_hops(chain, checkpoints=_checkpoints(options.get("checkpoint_db")), trace_id=trace_id,
+                           trusted=options.get("trusted"), allow_embedded=not options.get("trusted_only"))
+        result = analyzer.validation()
+        result["deep"] = deep
+        result["ok"] = result["ok"] and deep["ok"]
+    else:
+        analyzer = BundleAnalyzer(_OUTPUTS[command])
+        analyzer.feed_all(hops)
+        analyzer.set_meta(meta)
+        result = command_result(command, analyzer)
+    return {"ok": bool(result.get("ok", True)) if command == "validate" else True, "result": result}
+
+
+def process_bundle(command: str, body: bytes, trace_id: str, options: Mapping[str, Any]) -> dict[str, Any]:
+    """Analyze one fetched bundle (runs in a pool worker; arguments and result are picklable).
+
+    ``options`` may enable deep validation: ``deep``, ``trusted`` (kid -> raw key),
+    ``trusted_only`` and ``checkpoint_db``.
+    """
+    meta: dict[str, Any] = {}
+    return _process_hops(command, iter_bundle_hops([body], meta), meta, trace_id, options)
+
+
+def process_stored(command: str, store_url: str, trace_id: str, options: Mapping[str, Any]) -> dict[str, Any]:
+    """``process_bundle`` for a trace read from a local receipt store (see ``opp.store``)."""
+    return _process_hops(command, _read_store(store_url).iter_hops(trace_id), {"trace_id": trace_id}, trace_id,
+                         options)
+
+
+async def _run_one(client: httpx.AsyncClient, cfg: TransportConfig, command: str, trace_id: str,
+                   gateway: str | None, api: str | None, pool: Executor | None,
+                   options: Mapping[str, Any]) -> dict[str, Any]:
+    try:
+        if api:
+            url = f"{api}/{command}/{trace_id}" + ("?deep=true" if command == "validate" and options.get("deep") else "")
+            r = await arequest(client, "GET", url, cfg)
+            r.raise_for_status()
+            data = r.json()
+            ok = bool(data.get("ok")) if command == "validate" else True
+            return {"trace_id": trace_id, "ok": ok, "result": data}
+        loop = asyncio.get_running_loop()
+        if gateway is not None and is_store_url(gateway):
+            out = await loop.run_in_executor(pool, process_stored, command, gateway, trace_id, dict(options))
+            return {"trace_id": trace_id, **out}
+        r = await arequest(client, "GET", f"{gateway}/v1/receipts/export/{trace_id}", cfg)
+        r.raise_for_status()
+        out = await loop.run_in_executor(pool, process_bundle, command, r.content, trace_id, dict(options))
+        return {"trace_id": trace_id, **out}
+    except Exception as e:  # noqa: BLE001 - one bad trace becomes its error line, the batch goes on
+        return {"trace_id": trace_id, "ok": False, "error": f"{type(e).__name__}: {e}"}
+
+
+async def arun_batch(
+    trace_ids: Iterable[str],
+    command: str,
+    *,
+    gateway: str | None = None,
+    api: str | None = None,
+    concurrency: int = 16,
+    workers: int | None = 1,
+    executor: str | Executor = "process",
+    options: Mapping[str, Any] | None = None,
+    client: httpx.AsyncClient | None = None,
+    cfg: TransportConfig | None = None,
+) -> AsyncIterator[dict[str, Any]]:
+    """Yield per-trace results as they complete (see module docstring)."""
+    if command not in COMMANDS:
+        raise ValueError(f"unknown command {command!r} (expected one of {COMMANDS})")
+    if not (api or gateway):
+        raise ValueError("provide api or gateway")
+    cfg = cfg or TransportConfig.from_env(timeout=15.0, max_connections=max(concurrency, 1))
+    own_client = client is None
+    http = client or build_async_client(cfg)
+    own_pool = False
+    pool: Executor | None = None
+    if isinstance(executor, Executor):
+        pool = executor
+    elif gateway and not api:
+        n = workers or os.cpu_count() or 1
+        if executor == "process" and n > 1:
+            pool = ProcessPoolExecutor(max_workers=n)
+        elif executor in ("thread", "process"):
+            pool = ThreadPoolExecutor(max_workers=n)
+        else:
+            raise ValueError(f"unknown executor {executor!r} (expected 'thread' or 'process')")
+        own_pool = True
+    ids = iter(trace_ids)
+    results: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue()
+
+    async def worker() -> None:
+        try:
+            for trace_id in ids:  # shared iterator: each id is taken by exactly one worker
+                results.put_nowait(await _run_one(http, cfg, command, trace_id, gateway, api, pool, options or {}))
+        finally:
+            results.put_nowait(None)
+
+    tasks = [asyncio.ensure_future(worker()) for _ in range(max(concurrency, 1))]
+    try:
+        running = len(tasks)
+        while running:
+            item = await results.get()
+            if item is None:
+                running -= 1
+            else:
+                yield item
+        for t in tasks:
+            t.result()  # surface unexpected worker errors
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if own_client:
+            await http.aclose()
+        if own_pool and pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,146 @@
+"""In-process LRU cache with per-entry TTL and an optional on-disk tier.
+
+Used by the exporter to keep fetched bundles and their derived artifacts (graph,
+passport, policy, validation) between requests. The disk tier is write-through JSON
+(one file per key, named by the key's sha256), so values stored with a ``disk_dir``
+must be JSON-serializable; it survives restarts and is shared by workers on one host.
+Disk errors never propagate: the cache is best-effort.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+__all__ = ["TTLCache"]
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries expire ``ttl`` seconds after being set."""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0, *, disk_dir: str | None = None,
+                 clock: Callable[[], float] = time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self._clock = clock
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def _disk_path(self, key: str) -> str:
+        assert self.disk_dir is not None
+        return os.path.join(self.disk_dir, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _disk_get(self, key: str, now: float) -> tuple[float, Any] | None:
+        try:
+            with open(self._disk_path(key), encoding="utf-8") as f:
+                rec = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if rec.get("key") != key or rec.get("expires", 0) <= now:
+            return None
+        return rec["expires"], rec["value"]
+
+    def _disk_set(self, key: str, expires: float, value: Any) -> None:
+        path = self._disk_path(key)
+        tmp = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "expires": expires, "value": value}, f, separators=(",", ":"))
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError):
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def get(self, key: str, default: Any = None, *, count: bool = True) -> Any:
+        now = self._clock()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                if item[0] > now:
+                    self._data.move_to_end(key)
+                    if count:
+                        self.hits += 1
+                    return item[1]
+                del self._data[key]
+                self.expirations += 1
+        if self.disk_dir and self.maxsize > 0:
+            found = self._disk_get(key, now)
+            if found is not None:
+                with self._lock:
+                    self._store(key, found[0], found[1])
+                    if count:
+                        self.hits += 1
+                        self.disk_hits += 1
+                return found[1]
+        if count:
+            with self._lock:
+                self.misses += 1
+        return default
+
+    def _store(self, key: str, expires: float, value: Any) -> None:
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        if self.maxsize <= 0:
+            return
+        expires = self._clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._store(key, expires, value)
+        if self.disk_dir:
+            self._disk_set(key, expires, value)
+
+    def pop(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+        if self.disk_dir:
+            try:
+                os.unlink(self._disk_path(key))
+            except OSError:
+                pass
+        return item[1] if item is not None else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "disk_hits": self.disk_hits,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "disk": self.disk_dir,
+        }
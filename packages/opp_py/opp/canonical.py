@@ -0,0 +1,131 @@
+"""Canonical JSON: the exact bytes every OPP content id (CID) is computed over.
+
+The canonical form is, byte for byte::
+
+    json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+so CIDs never change with the backend. When ``orjson`` is installed it encodes first and
+the result is checked against the cases where it differs from the stdlib: floats
+(``repr`` exponent notation, e.g. ``1e+16`` vs ``1e16``), NaN/Infinity (orjson writes
+``null``), integers beyond 64 bits, non-string keys and ``str``/``int``/``dict``
+subclasses. Any of those re-encode with the stdlib, so the accelerated path is only
+ever faster, never different.
+
+``OPP_CANONICAL_BACKEND`` selects ``auto`` (default: orjson when importable), ``orjson``
+or ``stdlib``; ``set_backend()`` switches at runtime.
+
+``iter_canonical`` / ``hash_canonical`` stream the canonical bytes in chunks (e.g. into
+sha256) without building the whole bytes object, for very large documents.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from collections.abc import Callable, Iterator
+from typing import Any
+
+__all__ = ["BACKENDS", "backend", "canonical", "cid_of", "hash_canonical", "iter_canonical", "set_backend"]
+
+BACKENDS = ("auto", "orjson", "stdlib")
+
+_ENCODER = json.JSONEncoder(sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def _stdlib(obj: Any) -> bytes:
+    return _ENCODER.encode(obj).encode("utf-8")
+
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised when orjson is absent
+    orjson = None  # type: ignore[assignment]
+    _OPTS = 0
+else:
+    _OPTS = (orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_SUBCLASS
+             | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+# orjson and ``repr`` print the same shortest digits but pick notation differently for
+# |x| < 1e-4 (orjson: ``0.00001``) and exponent forms (orjson: ``1e16``, repr: ``1e+16``);
+# NaN/Infinity come out as ``null``. Those are the only float mismatches (checked against
+# random doubles), and all are caught by the two substring tests below. Matches inside
+# string values only cause an unnecessary, still correct, stdlib re-encode.
+_EXPONENT = re.compile(rb"e-?[0-9]+[,\]}]")
+
+
+def _differs_from_stdlib(out: bytes) -> bool:
+    return b"null" in out or b"0.0000" in out or _EXPONENT.search(out) is not None
+
+
+def _orjson(obj: Any) -> bytes:
+    if type(obj) is float:
+        return _stdlib(obj)
+    try:
+        out: bytes = orjson.dumps(obj, option=_OPTS)
+    except TypeError:  # orjson.JSONEncodeError: big ints, non-str keys, subclasses, ...
+        return _stdlib(obj)
+    if _differs_from_stdlib(out):
+        return _stdlib(obj)
+    return out
+
+
+_encode: Callable[[Any], bytes] = _stdlib
+_backend = "stdlib"
+
+
+def set_backend(name: str) -> str:
+    """Select the encoder backend; returns the effective backend name."""
+    global _encode, _backend
+    if name not in BACKENDS:
+        raise ValueError(f"unknown canonical backend {name!r} (expected one of {BACKENDS})")
+    if name == "orjson" and orjson is None:
+        raise RuntimeError("OPP canonical backend 'orjson' requested but orjson is not installed")
+    if name != "stdlib" and orjson is not None:
+        _encode, _backend = _orjson, "orjson"
+    else:
+        _encode, _backend = _stdlib, "stdlib"
+    return _backend
+
+
+def backend() -> str:
+    return _backend
+
+
+def canonical(obj: Any) -> bytes:
+    return _encode(obj)
+
+
+def iter_canonical(obj: Any, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+    """Yield the canonical bytes of ``obj`` in chunks of roughly ``chunk_size`` bytes."""
+    parts: list[str] = []
+    size = 0
+    for piece in _ENCODER.iterencode(obj):
+        parts.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield "".join(parts).encode("utf-8")
+            parts.clear()
+            size = 0
+    if parts:
+        yield "".join(parts).encode("utf-8")
+
+
+def hash_canonical(obj: Any, h: Any = None) -> Any:
+    """Stream the canonical bytes of ``obj`` into ``h`` (a new sha256 by default) and return it."""
+    if h is None:
+        h = hashlib.sha256()
+    for chunk in iter_canonical(obj):
+        h.update(chunk)
+    return h
+
+
+def cid_of(obj: Any, *, stream: bool = False) -> str:
+    """``sha256:<hex>`` over the canonical bytes; ``stream=True`` never materializes them."""
+    if stream:
+        hexdigest: str = hash_canonical(obj).hexdigest()
+        return "sha256:" + hexdigest
+    return "sha256:" + hashlib.sha256(_encode(obj)).hexdigest()
+
+
+set_backend(os.getenv("OPP_CANONICAL_BACKEND", "auto").lower() or "auto")
@@ -0,0 +1,206 @@
+"""Compact columnar receipt chains.
+
+``ReceiptChain`` keeps the per-hop fields of the provenance graph in flat columns
+instead of one node dict (and one edge dict) per hop:
+
+  - ``receipt_hash``: 32 bytes per hop in one ``bytearray`` when it is 64 lowercase hex
+    digits (the gateway's sha256 form); any other value is kept as is in a sparse side
+    table (per column)
+  - ``ts``: microseconds since the epoch in an ``array('q')`` plus a one-byte format code
+    from which the original ISO-8601 UTC string is rebuilt exactly; other values go to
+    the side table
+  - ``step``: an ``array('I')`` of ids into the table of distinct step names
+
+Edges are implicit (hop ``i - 1`` -> hop ``i``, in chain order) and, like nodes, are only
+materialized by ``iter_nodes``/``iter_edges``/``graph``. A typical hop costs ~45 bytes
+instead of the ~1 KB its node and edge dicts take. ``to_dict``/``from_dict`` give a
+JSON-safe form (base64 columns) for caches.
+"""
+from __future__ import annotations
+
+import base64
+import datetime
+import re
+import sys
+from array import array
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+__all__ = ["ReceiptChain"]
+
+_HEX64 = re.compile(r"[0-9a-f]{64}")
+_EPOCH = datetime.datetime(1970, 1, 1)
+_US = datetime.timedelta(microseconds=1)
+# ts format code = 2 * fraction code + suffix code; _RAW marks a value kept in the side table
+_FRACTIONS = {19: "seconds", 23: "milliseconds", 26: "microseconds"}
+_TIMESPECS = ("seconds", "milliseconds", "microseconds")
+_SUFFIXES = ("Z", "+00:00")
+_RAW = 0xFF
+_NO_STEP = 0xFFFFFFFF  # non-string step, kept in the side table
+_ZERO_HASH = bytes(32)
+
+
+def _encode_ts(ts: Any) -> tuple[int, int] | None:
+    """(microseconds, format code) for a UTC ISO-8601 string that round-trips exactly."""
+    if not isinstance(ts, str):
+        return None
+    if ts.endswith("Z"):
+        body, suffix = ts[:-1], 0
+    elif ts.endswith("+00:00"):
+        body, suffix = ts[:-6], 1
+    else:
+        return None
+    spec = _FRACTIONS.get(len(body))
+    if spec is None or body[10:11] != "T":
+        return None
+    try:
+        dt = datetime.datetime.fromisoformat(body)
+    except ValueError:
+        return None
+    if dt.isoformat(timespec=spec) != body:
+        return None
+    return (dt - _EPOCH) // _US, 2 * _TIMESPECS.index(spec) + suffix
+
+
+def _decode_ts(us: int, code: int) -> str:
+    return (_EPOCH + us * _US).isoformat(timespec=_TIMESPECS[code >> 1]) + _SUFFIXES[code & 1]
+
+
+def _le(col: array) -> bytes:
+    if sys.byteorder == "big":
+        col = array(col.typecode, col)
+        col.byteswap()
+    return col.tobytes()
+
+
+def _from_le(typecode: str, raw: bytes) -> array:
+    col = array(typecode)
+    col.frombytes(raw)
+    if sys.byteorder == "big":
+        col.byteswap()
+    return col
+
+
+class ReceiptChain:
+    """Columnar (receipt_hash, ts, step) per hop, in chain order (see module docstring)."""
+
+    __slots__ = ("_hashes", "_raw_hash", "_raw_step", "_raw_ts", "_step_ids", "_step_index", "_steps", "_ts", "_ts_fmt")
+
+    def __init__(self) -> None:
+        self._hashes = bytearray()
+        self._ts = array("q")
+        self._ts_fmt = bytearray()
+        self._steps = array("I")
+        self._step_index: dict[Any, int] = {}
+        self._step_ids: list[Any] = []
+        # sparse side tables: hop index -> original value that has no compact form
+        self._raw_hash: dict[int, Any] = {}
+        self._raw_ts: dict[int, Any] = {}
+        self._raw_step: dict[int, Any] = {}
+
+    @classmethod
+    def from_hops(cls, hops: Iterable[dict[str, Any]]) -> ReceiptChain:
+        chain = cls()
+        for hop in hops:
+            chain.append(hop.get("receipt_hash"), hop.get("ts"), hop.get("normalized", {}).get("step"))
+        return chain
+
+    def append(self, receipt_hash: Any, ts: Any, step: Any) -> None:
+        idx = len(self._ts)
+        if isinstance(receipt_hash, str) and _HEX64.fullmatch(receipt_hash):
+            self._hashes += bytes.fromhex(receipt_hash)
+        else:
+            self._hashes += _ZERO_HASH
+            self._raw_hash[idx] = receipt_hash
+        enc = _encode_ts(ts)
+        if enc is None:
+            self._ts.append(0)
+            self._ts_fmt.append(_RAW)
+            self._raw_ts[idx] = ts
+        else:
+            self._ts.append(enc[0])
+            self._ts_fmt.append(enc[1])
+        if step is not None and not isinstance(step, str):
+            self._steps.append(_NO_STEP)
+            self._raw_step[idx] = step
+            return
+        sid = self._step_index.get(step)
+        if sid is None:
+            sid = self._step_index[step] = len(self._step_ids)
+            self._step_ids.append(step)
+        self._steps.append(sid)
+
+    def __len__(self) -> int:
+        return len(self._ts)
+
+    def receipt_hash(self, i: int) -> Any:
+        if i in self._raw_hash:
+            return self._raw_hash[i]
+        return self._hashes[32 * i:32 * i + 32].hex()
+
+    def ts(self, i: int) -> Any:
+        code = self._ts_fmt[i]
+        return self._raw_ts[i] if code == _RAW else _decode_ts(self._ts[i], code)
+
+    def step(self, i: int) -> Any:
+        sid = self._steps[i]
+        return self._raw_step[i] if sid == _NO_STEP else self._step_ids[sid]
+
+    @property
+    def steps(self) -> list[Any]:
+        """Distinct step names (and None) in first-seen order."""
+        return list(self._step_ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate size of the columns (the side table and step names excluded)."""
+        return len(self._hashes) + len(self._ts_fmt) + self._ts.itemsize * len(self._ts) \
+            + self._steps.itemsize * len(self._steps)
+
+    def iter_nodes(self) -> Iterator[dict[str, Any]]:
+        for i in range(len(self)):
+            yield {"id": self.receipt_hash(i), "ts": self.ts(i), "step": self.step(i)}
+
+    def iter_edges(self) -> Iterator[dict[str, Any]]:
+        prev = self.receipt_hash(0) if len(self) else None
+        for i in range(1, len(self)):
+            rid = self.receipt_hash(i)
+            yield {"from": prev, "to": rid, "type": "link"}
+            prev = rid
+
+    def graph(self) -> dict[str, Any]:
+        """Nodes/edges as ``build_graph_from_bundle`` returns them."""
+        return {"nodes": list(self.iter_nodes()), "edges": list(self.iter_edges()), "count": len(self)}
+
+    def to_dict(self) -> dict[str, Any]:
+        """JSON-safe form: base64 little-endian columns plus the step table and side tables."""
+        def b64(raw: bytes) -> str:
+            return base64.b64encode(raw).decode("ascii")
+
+        return {
+            "count": len(self),
+            "hashes": b64(bytes(self._hashes)),
+            "ts": b64(_le(self._ts)),
+            "ts_fmt": b64(bytes(self._ts_fmt)),
+            "steps": b64(_le(self._steps)),
+            "step_ids": self._step_ids,
+            "raw": {"hash": list(self._raw_hash.items()), "ts": list(self._raw_ts.items()),
+                    "step": list(self._raw_step.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> ReceiptChain:
+        chain = cls()
+        chain._hashes = bytearray(base64.b64decode(data["hashes"]))
+        chain._ts = _from_le("q", base64.b64decode(data["ts"]))
+        chain._ts_fmt = bytearray(base64.b64decode(data["ts_fmt"]))
+        chain._steps = _from_le("I", base64.b64decode(data["steps"]))
+        chain._step_ids = list(data["step_ids"])
+        chain._step_index = {s: i for i, s in enumerate(chain._step_ids)}
+        raw = data["raw"]
+        chain._raw_hash = {int(i): v for i, v in raw["hash"]}
+        chain._raw_ts = {int(i): v for i, v in raw["ts"]}
+        chain._raw_step = {int(i): v for i, v in raw["step"]}
+        if not len(chain._hashes) == 32 * len(chain._ts) == 32 * len(chain._ts_fmt) == 32 * len(chain._steps):
+            raise ValueError("inconsistent ReceiptChain columns")
+        return chain
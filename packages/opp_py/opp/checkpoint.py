@@ -0,0 +1,155 @@
+"""Checkpoints of already-validated chain prefixes, for incremental re-validation.
+
+Traces grow by appending hops, so a trace that deep-validated yesterday (per-receipt
+CID + signature checks, ``opp.verify``) only needs today's new suffix checked. A
+checkpoint records, per trace and key ``scope`` (which keys the receipts were checked
+against, see ``ReceiptVerifier.scope``), how many hops were validated (``count``), the
+last one's ``receipt_hash`` and a running sha256 ``digest`` over the canonical JSON of
+those hops. Plain continuity checks are cheaper per hop than that digest, so they are
+not checkpointed.
+
+``PrefixTracker`` recomputes that digest while a bundle streams in. Hashing a hop is far
+cheaper than verifying its signature, so hops inside the checkpointed prefix are only
+hashed; once the prefix is complete the digest is compared with the checkpoint, and the
+suffix is validated as usual (its first hop must link to the checkpoint's
+``receipt_hash``, which the analyzer's continuity check already enforces). A rewritten or
+truncated history shows up as ``status == "mismatch"`` and the caller re-validates the
+whole chain.
+
+``CheckpointStore`` persists checkpoints in SQLite (stdlib ``sqlite3``, WAL mode), so
+one database can be shared by the CLI and the exporter on a host.
+"""
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections.abc import Mapping
+from typing import Any
+
+from .canonical import canonical
+
+__all__ = ["CheckpointStore", "PrefixTracker"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    trace_id TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    receipt_hash TEXT,
+    digest TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (trace_id, scope)
+)
+"""
+
+
+class CheckpointStore:
+    """SQLite-backed ``(trace_id, scope) -> checkpoint`` table; safe to share between threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(_SCHEMA)
+
+    def get(self, trace_id: str, scope: str = "") -> dict[str, Any] | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT count, receipt_hash, digest, updated_at FROM checkpoints WHERE trace_id = ? AND scope = ?",
+                (trace_id, scope),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return {"trace_id": trace_id, "scope": scope, "count": row[0], "receipt_hash": row[1],
+                "digest": row[2], "updated_at": row[3]}
+
+    def put(self, trace_id: str, count: int, receipt_hash: Any, digest: str, scope: str = "") -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO checkpoints (trace_id, scope, count, receipt_hash, digest, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (trace_id, scope, count, receipt_hash, digest, time.time()),
+            )
+
+    def record(self, trace_id: str, tracker: PrefixTracker, scope: str = "") -> None:
+        """Checkpoint everything ``tracker`` has seen (call only after it all validated)."""
+        if tracker.count:
+            self.put(trace_id, tracker.count, tracker.last_hash, tracker.digest, scope)
+
+    def delete(self, trace_id: str, scope: str | None = None) -> None:
+        with self._lock:
+            if scope is None:
+                self._db.execute("DELETE FROM checkpoints WHERE trace_id = ?", (trace_id,))
+            else:
+                self._db.execute("DELETE FROM checkpoints WHERE trace_id = ? AND scope = ?", (trace_id, scope))
+
+    def __len__(self) -> int:
+        with self._lock:
+            n: int = self._db.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        return n
+
+    def stats(self) -> dict[str, Any]:
+        return {"path": self.path, "checkpoints": len(self), "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self) -> CheckpointStore:  # noqa: PYI034
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+class PrefixTracker:
+    """Running digest over fed hops, checked against ``checkpoint`` (``None``: no checkpoint).
+
+    ``feed(hop)`` returns True for hops inside the checkpointed prefix, which the caller
+    may skip expensive checks for; they are trusted only if ``finish()`` reports
+    ``"matched"``. Other statuses: ``"none"`` (no checkpoint) and ``"mismatch"``.
+    """
+
+    def __init__(self, checkpoint: Mapping[str, Any] | None = None):
+        self.checkpoint = checkpoint
+        self.count = 0
+        self.last_hash: Any = None
+        self._h = hashlib.sha256()
+        self.status = "none" if checkpoint is None else "pending"
+        self.resume_at = int(checkpoint["count"]) if checkpoint is not None else 0
+
+    def feed(self, hop: Mapping[str, Any]) -> bool:
+        self._h.update(canonical(hop))
+        self._h.update(b"\n")
+        idx = self.count
+        self.count = idx + 1
+        self.last_hash = hop.get("receipt_hash")
+        cp = self.checkpoint
+        if cp is None or self.status == "mismatch" or idx >= self.resume_at:
+            return False
+        if idx == self.resume_at - 1:
+            same = self._h.hexdigest() == cp["digest"] and self.last_hash == cp["receipt_hash"]
+            self.status = "matched" if same else "mismatch"
+        return True
+
+    @property
+    def digest(self) -> str:
+        return self._h.hexdigest()
+
+    def finish(self) -> str:
+        if self.status == "pending":  # bundle shorter than the checkpoint: history was truncated
+            self.status = "mismatch"
+        return self.status
+
+    def summary(self) -> dict[str, Any]:
+        return {"status": self.finish(), "resumed_at": self.resume_at if self.status == "matched" else 0,
+                "count": self.count}
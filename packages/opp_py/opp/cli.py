@@ -1,82 +1,272 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import os
 import sys
+import time
+from collections.abc import Iterable, Iterator
 from typing import Any, cast
 
 import httpx
 import typer
 
-from .graph import build_graph_from_bundle, to_passport
+from .analyzer import BundleAnalyzer
+from .batch import COMMANDS, arun_batch, command_result, iter_trace_ids
+from .checkpoint import CheckpointStore, PrefixTracker
+from .dataset import ChunkCache, Chunker, dataset_manifest
+from .formats import FORMATS, encode
+from .snapshot import SnapshotStore, resume, snapshot_scope
+from .store import is_store_url, open_store
+from .stream import iter_bundle_hops
+from .transport import TransportConfig, build_client, open_stream, request
+from .verify import ReceiptVerifier, key_scope, keys_from_jwks
 
 app = typer.Typer(help="OPP CLI — provenance graphs, passports, validation")
 
+_TRANSPORT = TransportConfig.from_env(timeout=15.0)
+_http: httpx.Client | None = None
+
+def _client() -> httpx.Client:
+    """Process-wide pooled client so repeated fetches reuse keep-alive connections."""
+    global _http
+    if _http is None:
+        _http = build_client(_TRANSPORT)
+    return _http
+
 def _get(url: str) -> dict[str, Any]:
     """Fetch JSON returning a typed dict."""
-    with httpx.Client(timeout=15.0) as client:
-        r = client.get(url)
+    r = request(_client(), "GET", url, _TRANSPORT)
+    r.raise_for_status()
+    data = r.json()
+    # Ensure mapping type for mypy; httpx returns Any
+    return cast(dict[str, Any], data)
+
+def _iter_body(url: str) -> Iterator[bytes]:
+    """Stream a response body in chunks instead of loading it whole."""
+    r = open_stream(_client(), "GET", url, _TRANSPORT)
+    try:
         r.raise_for_status()
-        data = r.json()
-        # Ensure mapping type for mypy; httpx returns Any
-        return cast(dict[str, Any], data)
+        yield from r.iter_bytes()
+    finally:
+        r.close()
+
+def _hops(gateway: str, trace: str, start: int = 0) -> Iterator[dict[str, Any]]:
+    """A trace's hops, streamed from the gateway export or read from a local receipt store URL.
+
+    ``start`` skips hops only for stores; the gateway export always starts at the first hop.
+    """
+    if is_store_url(gateway):
+        with open_store(gateway, readonly=True) as store:
+            yield from store.iter_hops(trace, start)
+    else:
+        yield from iter_bundle_hops(_iter_body(f"{gateway}/v1/receipts/export/{trace}"))
+
+def _analyze(gateway: str, trace: str, outputs: set[str], snapshots: SnapshotStore | None = None) -> BundleAnalyzer:
+    """Fetch an export bundle and analyze it hop by hop as it streams in.
+
+    With ``snapshots`` the analysis continues from the trace's saved state, folding in only
+    new hops (a store is read from the first new one), and the updated state is saved.
+    """
+    scope = snapshot_scope(outputs, gateway)
+    snap = snapshots.get(trace, scope) if snapshots is not None else None
+    while True:
+        analyzer = resume(snap, outputs)
+        if is_store_url(gateway):
+            analyzer.set_meta({"trace_id": trace})
+            analyzer.skip(analyzer.resumed_at)
+            analyzer.feed_all(_hops(gateway, trace, analyzer.resumed_at))
+        else:
+            meta: dict[str, Any] = {}
+            analyzer.feed_all(iter_bundle_hops(_iter_body(f"{gateway}/v1/receipts/export/{trace}"), meta))
+            analyzer.set_meta(meta)
+        if analyzer.finish() != "mismatch":
+            break
+        snap = None  # the trace no longer extends the snapshot: analyze it from scratch
+    if snapshots is not None:
+        snapshots.put(trace, analyzer.snapshot(), scope)
+    return analyzer
+
+def _deep_validate(gateway: str, trace: str, verifier: ReceiptVerifier) -> dict[str, Any]:
+    """Continuity + per-receipt verification in one streamed pass over the bundle."""
+    analyzer = BundleAnalyzer({"validation"})
+    try:
+        for hop in _hops(gateway, trace):
+            analyzer.feed(hop)
+            verifier.feed(hop)
+        deep_result = verifier.result()
+    finally:
+        verifier.close()
+    result = analyzer.validation()
+    result["deep"] = deep_result
+    result["ok"] = result["ok"] and deep_result["ok"]
+    return result
+
+def _check_format(fmt: str) -> None:
+    if fmt not in FORMATS:
+        raise typer.BadParameter(f"--format must be one of {', '.join(FORMATS)}")
+
+def _emit(obj: Any, fmt: str, out: str | None = None) -> None:
+    """Print (or write to ``out``) ``obj`` in output format ``fmt``; binary formats go to stdout as bytes."""
+    if fmt == "json" and not out:
+        print(json.dumps(obj, indent=2))
+        return
+    data = encode(obj, fmt)
+    if out:
+        with open(out, "wb") as f:
+            f.write(data)
+        print(f"Wrote {out}")
+    elif fmt == "json-compact":
+        print(data.decode("utf-8"))
+    else:
+        sys.stdout.flush()
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+
+_FORMAT_HELP = f"Output format: {', '.join(FORMATS)}"
 
 @app.command()
 def graph(trace: str = typer.Option(..., "--trace", help="Trace ID"),
           api: str | None = typer.Option(None, "--api", help="Exporter API base (if set uses /graph)"),
-          gateway: str | None = typer.Option(None, "--gateway", help="Gateway base (if set fetches /v1/receipts/export)")):
+          gateway: str | None = typer.Option(None, "--gateway", help="Gateway base (if set fetches /v1/receipts/export) or receipt store URL"),
+          fmt: str = typer.Option("json", "--format", help=_FORMAT_HELP)):
+    _check_format(fmt)
     if api:
-        data = _get(f"{api}/graph/{trace}")
-        print(json.dumps(data, indent=2))
+        _emit(_get(f"{api}/graph/{trace}"), fmt)
         return
     if not gateway:
         raise typer.BadParameter("Provide --api or --gateway")
-    bundle = _get(f"{gateway}/v1/receipts/export/{trace}")
-    g = build_graph_from_bundle(bundle)
-    print(json.dumps({"graph": g}, indent=2))
+    _emit(command_result("graph", _analyze(gateway, trace, {"graph"})), fmt)
 
 @app.command()
 def validate(trace: str = typer.Option(..., "--trace"),
-             gateway: str = typer.Option(..., "--gateway", help="Gateway base URL"),
-             api: str | None = typer.Option(None, "--api", help="Exporter API (uses /validate)")):
+             gateway: str = typer.Option(..., "--gateway", help="Gateway base URL or local receipt store URL"),
+             api: str | None = typer.Option(None, "--api", help="Exporter API (uses /validate)"),
+             deep: bool = typer.Option(False, "--deep", help="Recompute every receipt CID and verify its signature"),
+             keys: str | None = typer.Option(None, "--keys", help="JWKS file of trusted sender keys (deep mode)"),
+             trusted_only: bool = typer.Option(False, "--trusted-only", help="Reject receipts whose key is not in --keys"),
+             workers: int = typer.Option(1, "--workers", help="Deep-mode verification workers"),
+             executor: str = typer.Option("process", "--executor", help="Deep-mode pool: process or thread"),
+             checkpoint_db: str | None = typer.Option(None, "--checkpoint-db",
+                                                      help="SQLite file of verified prefixes; deep mode only checks new hops")):
     if api:
-        data = _get(f"{api}/validate/{trace}")
+        data = _get(f"{api}/validate/{trace}" + ("?deep=true" if deep else ""))
         print(json.dumps(data, indent=2))
         sys.exit(0 if data.get("ok") else 2)
-    bundle = _get(f"{gateway}/v1/receipts/export/{trace}")
-    # Local minimal validation: just presence and chain continuity
-    chain = bundle.get("chain") or bundle.get("hops") or []
-    ok = True
-    for i in range(1, len(chain)):
-        if chain[i].get("prev_receipt_hash") != chain[i-1].get("receipt_hash"):
-            ok = False
-            break
-    print(json.dumps({"ok": ok, "count": len(chain)}, indent=2))
-    sys.exit(0 if ok else 2)
+    if not deep:
+        # Local minimal validation: just presence and chain continuity
+        result = _analyze(gateway, trace, {"validation"}).validation()
+        print(json.dumps(result, indent=2))
+        sys.exit(0 if result["ok"] else 2)
+    trusted: dict[str, bytes] = {}
+    if keys:
+        with open(keys, encoding="utf-8") as f:
+            trusted = keys_from_jwks(json.load(f))
+    store = CheckpointStore(checkpoint_db) if checkpoint_db else None
+    scope = key_scope(trusted, not trusted_only)
+
+    def verifier(checkpoint: dict[str, Any] | None) -> ReceiptVerifier:
+        return ReceiptVerifier(trusted=trusted, allow_embedded=not trusted_only, trace_id=trace, workers=workers,
+                               executor=executor, prefix=PrefixTracker(checkpoint) if store is not None else None)
+
+    try:
+        v = verifier(store.get(trace, scope) if store is not None else None)
+        result = _deep_validate(gateway, trace, v)
+        if store is not None and result["deep"]["checkpoint"]["status"] == "mismatch":
+            v = verifier(None)  # the checkpointed history changed: verify the whole chain again
+            result = _deep_validate(gateway, trace, v)
+            result["deep"]["checkpoint"]["status"] = "mismatch"
+        if store is not None and result["ok"] and v.prefix is not None:
+            store.record(trace, v.prefix, scope)
+    finally:
+        if store is not None:
+            store.close()
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["ok"] else 2)
 
 @app.command()
 def passport(trace: str = typer.Option(..., "--trace"),
              gateway: str = typer.Option(..., "--gateway"),
-             out: str | None = typer.Option(None, "--out", help="Write to file")):
-    bundle = _get(f"{gateway}/v1/receipts/export/{trace}")
-    graph = build_graph_from_bundle(bundle)
-    passport_obj = to_passport(graph, bundle)
-    s = json.dumps(passport_obj, indent=2)
-    if out:
-        with open(out, "w", encoding="utf-8") as f:
-            f.write(s)
-        print(f"Wrote {out}")
+             out: str | None = typer.Option(None, "--out", help="Write to file"),
+             fmt: str = typer.Option("json", "--format", help=_FORMAT_HELP),
+             snapshot_db: str | None = typer.Option(None, "--snapshot-db",
+                                                    help="SQLite file of saved passport state; only new hops are folded in")):
+    _check_format(fmt)
+    if snapshot_db:
+        with SnapshotStore(snapshot_db) as snapshots:
+            passport_obj = _analyze(gateway, trace, {"passport"}, snapshots).passport()
     else:
-        print(s)
+        passport_obj = _analyze(gateway, trace, {"passport"}).passport()
+    _emit(passport_obj, fmt, out)
 
 @app.command()
 def policy(trace: str = typer.Option(..., "--trace"), gateway: str = typer.Option(..., "--gateway")):
-    bundle = _get(f"{gateway}/v1/receipts/export/{trace}")
-    graph = build_graph_from_bundle(bundle)
-    passport_obj = to_passport(graph, bundle)
-    out = {
-        "trace_id": passport_obj.get("trace_id"),
-        "policy_engines": passport_obj.get("policy_engines"),
-        "breaches": passport_obj.get("policy_breaches"),
-        "breach_count": len(passport_obj.get("policy_breaches", [])),
-    }
-    print(json.dumps(out, indent=2))
+    print(json.dumps(command_result("policy", _analyze(gateway, trace, {"policy"})), indent=2))
+
+_BATCH_TRACES = typer.Argument(None, help="Trace IDs (default: --from, else stdin)")
+
+@app.command()
+def batch(command: str = typer.Argument(..., help="graph, validate, passport or policy"),
+          traces: list[str] | None = _BATCH_TRACES,
+          from_file: str | None = typer.Option(None, "--from", help="File of trace IDs, one per line ('-' for stdin)"),
+          gateway: str | None = typer.Option(None, "--gateway", help="Gateway base URL or local receipt store URL"),
+          api: str | None = typer.Option(None, "--api", help="Exporter API base URL"),
+          concurrency: int = typer.Option(16, "--concurrency", help="Traces fetched at once"),
+          workers: int = typer.Option(os.cpu_count() or 1, "--workers", help="Bundles processed in parallel"),
+          executor: str = typer.Option("process", "--executor", help="Worker pool: process or thread"),
+          deep: bool = typer.Option(False, "--deep", help="validate: verify every receipt CID and signature"),
+          keys: str | None = typer.Option(None, "--keys", help="JWKS file of trusted sender keys (deep mode)"),
+          trusted_only: bool = typer.Option(False, "--trusted-only", help="Reject receipts whose key is not in --keys"),
+          checkpoint_db: str | None = typer.Option(None, "--checkpoint-db", help="SQLite file of verified prefixes")):
+    """Run COMMAND for many traces; prints one NDJSON line per trace as it completes."""
+    if command not in COMMANDS:
+        raise typer.BadParameter(f"command must be one of {', '.join(COMMANDS)}")
+    if not (api or gateway):
+        raise typer.BadParameter("Provide --api or --gateway")
+    if traces:
+        ids: Iterable[str] = traces
+    elif from_file and from_file != "-":
+        ids = iter_trace_ids(open(from_file, encoding="utf-8"))  # noqa: SIM115 - read lazily, closed at exit
+    else:
+        ids = iter_trace_ids(sys.stdin)
+    options: dict[str, Any] = {"deep": deep, "trusted_only": trusted_only, "checkpoint_db": checkpoint_db}
+    if keys:
+        with open(keys, encoding="utf-8") as f:
+            options["trusted"] = keys_from_jwks(json.load(f))
+    summary = {"total": 0, "ok": 0, "failed": 0, "errors": 0}
+
+    async def run() -> None:
+        async for item in arun_batch(ids, command, gateway=gateway, api=api, concurrency=concurrency,
+                                     workers=workers, executor=executor, options=options):
+            summary["total"] += 1
+            summary["ok" if item["ok"] else "errors" if "error" in item else "failed"] += 1
+            sys.stdout.write(json.dumps(item, separators=(",", ":")) + "\n")
+            sys.stdout.flush()
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    print(json.dumps({"summary": {**summary, "seconds": round(time.perf_counter() - start, 3)}}), file=sys.stderr)
+    sys.exit(2 if summary["failed"] else 1 if summary["errors"] else 0)
+
+_DATASET_PATHS = typer.Argument(..., help="Files or directories to chunk")
+
+@app.command("dataset-root")
+def dataset_root(paths: list[str] = _DATASET_PATHS,
+                 chunk_size: int = typer.Option(1 << 20, "--chunk-size", help="Fixed chunk size / CDC average (bytes)"),
+                 cdc: bool = typer.Option(False, "--cdc", help="Content-defined chunking instead of fixed-size (pure Python, ~20 MB/s)"),
+                 cache: str | None = typer.Option(None, "--cache", help="Chunk cache file; unchanged files are skipped"),
+                 workers: int = typer.Option(1, "--workers", help="Files hashed in parallel"),
+                 out: str | None = typer.Option(None, "--out", help="Write the manifest to file")):
+    manifest = dataset_manifest(
+        paths,
+        chunker=Chunker(chunk_size, cdc=cdc),
+        cache=ChunkCache(cache) if cache else None,
+        workers=workers,
+    )
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        print(json.dumps({"root": manifest["root"], "files": len(manifest["files"]),
+                          "chunks": len(manifest["chunks"]), "manifest": out}, indent=2))
+    else:
+        print(json.dumps(manifest, indent=2))
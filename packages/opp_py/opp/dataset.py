@@ -0,0 +1,205 @@
+"""Dataset chunking straight from disk: chunk CID manifests + Merkle roots.
+
+Files are memory-mapped and hashed through ``memoryview`` slices, so chunk bytes are
+never copied into Python ``bytes``. Chunks are fixed-size by default or
+content-defined (gear rolling hash, FastCDC-style) so that insertions only disturb
+nearby chunk boundaries.
+
+Fixed-size chunking is the fast path: it runs at sha256 speed and is the one to use
+for multi-TB datasets. Content-defined chunking steps a pure-Python rolling hash over
+every byte past each chunk's minimum size, about 20 MB/s per core, and the hash loop
+holds the GIL, so ``workers`` threads do not speed it up. Use it for data that is
+edited in place, where stable boundaries matter more than throughput.
+
+The manifest is shaped like a receipt ``dataset`` payload (``{"chunks": [{"cid": ...}]}``)
+and its ``root`` equals what ``graph._collect_dataset_roots`` derives from it.
+
+A ``ChunkCache`` keyed by (inode, mtime, size, chunker) lets re-runs skip unchanged files.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import threading
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from .merkle import MerkleBuilder
+
+__all__ = ["ChunkCache", "Chunker", "chunk_file", "dataset_manifest", "iter_files"]
+
+# Deterministic 64-bit gear table for content-defined chunking.
+_GEAR = [int.from_bytes(hashlib.sha256(b"opp-gear-%d" % i).digest()[:8], "big") for i in range(256)]
+_MASK64 = (1 << 64) - 1
+
+
+class Chunker:
+    """Chunking parameters; ``cdc=True`` switches from fixed-size to content-defined."""
+
+    def __init__(self, chunk_size: int = 1 << 20, *, cdc: bool = False,
+                 min_size: int | None = None, max_size: int | None = None):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        self.chunk_size = chunk_size
+        self.cdc = cdc
+        self.min_size = min_size or max(1, chunk_size // 4)
+        self.max_size = max_size or chunk_size * 4
+        # boundary when the low bits of the rolling hash are zero: ~chunk_size average
+        self._mask = (1 << max(1, (chunk_size - self.min_size).bit_length() - 1)) - 1
+
+    @property
+    def spec(self) -> str:
+        if self.cdc:
+            return f"cdc-gear:{self.min_size}:{self.chunk_size}:{self.max_size}"
+        return f"fixed:{self.chunk_size}"
+
+    def boundaries(self, buf: memoryview) -> Iterator[tuple[int, int]]:
+        """Yield (offset, length) for every chunk of ``buf``; with ``cdc`` a per-byte Python loop (slow)."""
+        n = len(buf)
+        if not self.cdc:
+            for off in range(0, n, self.chunk_size):
+                yield off, min(self.chunk_size, n - off)
+            return
+        gear, mask, mx = _GEAR, self._mask, self.max_size
+        start = 0
+        while start < n:
+            end = min(start + mx, n)
+            cut = end
+            h = 0
+            for i in range(start + self.min_size, end):
+                h = ((h << 1) + gear[buf[i]]) & _MASK64
+                if not h & mask:
+                    cut = i + 1
+                    break
+            yield start, cut - start
+            start = cut
+
+
+def chunk_file(path: str, chunker: Chunker) -> list[dict[str, Any]]:
+    """Memory-map ``path`` and return its chunks as ``{"cid", "offset", "size"}`` dicts."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            mv = memoryview(mm)
+            try:
+                return [
+                    {"cid": "sha256:" + hashlib.sha256(mv[off:off + size]).hexdigest(), "offset": off, "size": size}
+                    for off, size in chunker.boundaries(mv)
+                ]
+            finally:
+                mv.release()
+
+
+class ChunkCache:
+    """Persistent JSON cache of per-file chunk lists keyed by (inode, mtime, size, chunker)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(path, encoding="utf-8") as f:
+                self._entries: dict[str, Any] = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._entries = {}
+
+    @staticmethod
+    def _stamp(st: os.stat_result, chunker: Chunker) -> list[Any]:
+        return [st.st_ino, st.st_mtime_ns, st.st_size, chunker.spec]
+
+    def get(self, path: str, st: os.stat_result, chunker: Chunker) -> list[dict[str, Any]] | None:
+        entry = self._entries.get(os.path.abspath(path))
+        with self._lock:
+            if entry is not None and entry.get("key") == self._stamp(st, chunker):
+                self.hits += 1
+                chunks: list[dict[str, Any]] = entry["chunks"]
+                return chunks
+            self.misses += 1
+        return None
+
+    def put(self, path: str, st: os.stat_result, chunker: Chunker, chunks: list[dict[str, Any]]) -> None:
+        with self._lock:
+            self._entries[os.path.abspath(path)] = {"key": self._stamp(st, chunker), "chunks": chunks}
+            self._dirty = True
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp.{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+
+def iter_files(paths: Iterable[str]) -> Iterator[tuple[str, str]]:
+    """Yield (display_path, fs_path) for files, walking directories in sorted order."""
+    for p in paths:
+        if os.path.isdir(p):
+            for root, dirs, files in os.walk(p):
+                dirs.sort()
+                for name in sorted(files):
+                    full = os.path.join(root, name)
+                    yield os.path.relpath(full, p).replace(os.sep, "/"), full
+        else:
+            yield os.path.basename(p), p
+
+
+def dataset_manifest(
+    paths: Iterable[str],
+    *,
+    chunker: Chunker | None = None,
+    cache: ChunkCache | None = None,
+    workers: int = 1,
+) -> dict[str, Any]:
+    """Chunk and hash files/directories into a manifest with its dataset Merkle root.
+
+    The root is ``merkle_root`` over the chunk CID strings (file order, then offset order).
+    """
+    chunker = chunker or Chunker()
+    files = list(iter_files(paths))
+
+    def one(fs_path: str) -> list[dict[str, Any]]:
+        st = os.stat(fs_path)
+        cached = cache.get(fs_path, st, chunker) if cache is not None else None
+        if cached is not None:
+            return cached
+        chunks = chunk_file(fs_path, chunker)
+        if cache is not None:
+            cache.put(fs_path, st, chunker, chunks)
+        return chunks
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            per_file = list(pool.map(one, [fs for _, fs in files]))
+    else:
+        per_file = [one(fs) for _, fs in files]
+    if cache is not None:
+        cache.save()
+
+    builder = MerkleBuilder()
+    all_chunks: list[dict[str, Any]] = []
+    entries = []
+    for (name, _), chunks in zip(files, per_file, strict=True):
+        first = len(all_chunks)
+        for c in chunks:
+            builder.add(c["cid"].encode())
+            all_chunks.append({"cid": c["cid"], "size": c["size"]})
+        entries.append({
+            "path": name,
+            "size": sum(c["size"] for c in chunks),
+            "chunk_range": [first, len(all_chunks)],
+        })
+    return {
+        "chunker": chunker.spec,
+        "files": entries,
+        "chunks": all_chunks,
+        "root": builder.root(),
+    }
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import asyncio
+import inspect
 import os
-from collections.abc import Callable
+import threading
+import time
+from collections.abc import Awaitable, Callable
 from functools import wraps
 from typing import Any
 
@@ -10,18 +14,116 @@ try:
 except Exception:  # pragma: no cover
     from .odin_shim import OPEClient
 
-from .util import utcnow
+from . import metrics
+from .iohash import io_cid
+from .odin_shim import AsyncOPEClient
+from .sampling import Aggregator, SamplingPolicy, keep_call
+from .sender import background_enabled, get_sender
+from .util import env_trace_id, utcnow
 
+# Env-derived clients per client class, cached as (gateway, seed, kid, store) -> client for the owning pid.
+_cache: dict[type, tuple[tuple[str, str, str | None, str | None], Any]] = {}
+_cache_pid: int | None = None
+_cache_lock = threading.Lock()
+_HANDOFF = metrics.histogram("opp_stamp_handoff_seconds",
+                             "Time @stamp spends handing a receipt over (queue put, or the inline POST in sync mode)",
+                             ("mode",))
 
-def _get_client(explicit: OPEClient | None) -> OPEClient:
-    if explicit is not None:
-        return explicit
+
+def reset_client_cache() -> None:
+    """Drop the cached env-derived clients (e.g. between tests)."""
+    global _cache_pid
+    _cache.clear()
+    _cache_pid = None
+
+
+def _env_client(cls: type) -> Any:
+    """Return the process-wide ``cls`` instance for the current env settings.
+
+    Key derivation only happens when (gateway, seed, kid, receipt store) changes or after fork.
+    """
     gw = os.getenv("OPP_GATEWAY_URL", "http://127.0.0.1:8080")
     seed = os.getenv("ODIN_SENDER_PRIV_B64") or os.getenv("OPP_SENDER_PRIV_B64")
     kid = os.getenv("ODIN_SENDER_KID") or os.getenv("OPP_SENDER_KID", "opp-sender")
     if not seed:
         raise RuntimeError("Missing ODIN_SENDER_PRIV_B64 / OPP_SENDER_PRIV_B64 for stamping")
-    return OPEClient(gateway_url=gw, sender_priv_b64=seed, sender_kid=kid)
+    global _cache_pid
+    key = (gw, seed, kid, os.getenv("OPP_RECEIPT_STORE"))
+    pid = os.getpid()
+    entry = _cache.get(cls)
+    if entry is not None and entry[0] == key and _cache_pid == pid:
+        return entry[1]
+    with _cache_lock:
+        if _cache_pid != pid:
+            _cache.clear()
+            _cache_pid = pid
+        entry = _cache.get(cls)
+        if entry is None or entry[0] != key:
+            entry = (key, cls(gateway_url=gw, sender_priv_b64=seed, sender_kid=kid))
+            _cache[cls] = entry
+        return entry[1]
+
+
+def _get_client(explicit: OPEClient | None) -> OPEClient:
+    """Return ``explicit`` or the cached env-derived client."""
+    if explicit is not None:
+        return explicit
+    client: OPEClient = _env_client(OPEClient)
+    return client
+
+
+def _get_async_client(explicit: AsyncOPEClient | None) -> AsyncOPEClient:
+    if explicit is not None:
+        return explicit
+    client: AsyncOPEClient = _env_client(AsyncOPEClient)
+    return client
+
+
+def _send(client: OPEClient, env: dict[str, Any]) -> None:
+    """Hand an envelope to the background sender, or POST inline in sync mode.
+
+    Clients without ``send_batch`` (e.g. test doubles, external SDKs) are always sent inline.
+    """
+    if background_enabled() and hasattr(client, "send_batch"):
+        with metrics.timed(_HANDOFF, "background"):
+            get_sender(client).submit(env)
+        return
+    with metrics.timed(_HANDOFF, "sync"):
+        client.send_envelope(env)
+
+
+def _async_sender(explicit: Any) -> tuple[Any, Callable[[dict[str, Any]], Awaitable[None]]]:
+    """Pick the client and a non-blocking send for coroutine / async generator wrappers.
+
+    Clients with an async ``send_envelope`` are awaited; in background mode envelopes are
+    queued (no I/O on the loop); in sync mode the env-derived ``AsyncOPEClient`` is awaited;
+    any other sync client is sent from a worker thread.
+    """
+    if explicit is not None and inspect.iscoroutinefunction(getattr(explicit, "send_envelope", None)):
+        async def send_awaitable(env: dict[str, Any]) -> None:
+            await explicit.send_envelope(env)
+        return explicit, send_awaitable
+    if explicit is None and not background_enabled():
+        aclient = _get_async_client(None)
+
+        async def send_async(env: dict[str, Any]) -> None:
+            await aclient.send_envelope(env)
+        return aclient, send_async
+    client = _get_client(explicit)
+
+    async def send_sync(env: dict[str, Any]) -> None:
+        if background_enabled() and hasattr(client, "send_batch"):
+            get_sender(client).submit(env)
+        else:
+            await asyncio.to_thread(client.send_envelope, env)
+    return client, send_sync
+
+
+def _run_detached(coro: Awaitable[Any]) -> None:
+    """Run ``coro`` on a private event loop in a helper thread (callers may or may not be inside a loop)."""
+    t = threading.Thread(target=asyncio.run, args=(coro,), name="opp-aggregate-send")
+    t.start()
+    t.join()
 
 
 def stamp(
@@ -30,34 +132,213 @@ def stamp(
     *,
     inputs: Callable[[tuple[Any, ...], dict[str, Any]], Any] | None = None,
     outputs: Callable[[Any], Any] | None = None,
-    client: OPEClient | None = None,
+    client: OPEClient | AsyncOPEClient | None = None,
+    sample: float | None = None,
+    aggregate: float | None = None,
 ):
     """Decorator emitting start/end step receipts.
 
     Optional inputs/outputs callables allow hashing of function IO for provenance linking.
-    """
-    from .util import cid_of  # local import to avoid cycles
+    Envelopes are delivered by the background sender (see ``opp.sender``) unless
+    ``OPP_SEND_MODE=sync``.
 
+    Coroutine functions, async generators and generators are stamped around their actual
+    execution: the start receipt when the body starts running, the end receipt when it
+    returns, raises or is closed. For generators ``outputs`` receives the generator's return
+    value (``None`` for async generators); async generators do not forward ``asend()`` values.
+
+    For high-frequency functions, ``sample`` stamps only that fraction of calls and
+    ``aggregate`` (seconds) replaces per-call receipts of functions and coroutine functions
+    with one ``opp.step.aggregate.v1`` summary receipt per window; both default to the
+    ``OPP_SAMPLE_*`` / ``OPP_AGGREGATE`` environment policy (see ``opp.sampling``).
+    """
     attrs = attrs or {}
+    policy = SamplingPolicy.from_env()
+    rate = policy.rate_for(step_type) if sample is None else sample
+    if not 0.0 <= rate <= 1.0:
+        raise ValueError(f"sample must be within [0, 1], got {rate}")
+    window = policy.window_for(step_type) if aggregate is None else aggregate
+    sampling = rate < 1.0
+
+    def sampled_in() -> bool:
+        return keep_call(rate, policy.by, step_type, env_trace_id())
+
+    def cid_from(make: Callable[..., Any] | None, *args: Any) -> str | None:
+        if make is None:
+            return None
+        try:
+            return io_cid(make(*args))
+        except Exception:  # noqa: BLE001 - user hash callables must not fail the stamped call
+            return None
+
+    def start_payload(f_args: tuple[Any, ...], f_kwargs: dict[str, Any]) -> dict[str, Any]:
+        payload: dict[str, Any] = {
+            "step": step_type,
+            "phase": "start",
+            "ts": utcnow(),
+            "attrs": attrs,
+        }
+        if inputs is not None:
+            try:
+                inp_obj = inputs(f_args, f_kwargs)
+                payload["inputs_cid"] = io_cid(inp_obj)
+            except Exception:  # pragma: no cover
+                payload["inputs_cid_error"] = True
+        return payload
+
+    def end_payload(status: str, result: Any) -> dict[str, Any]:
+        payload: dict[str, Any] = {
+            "step": step_type,
+            "phase": "end",
+            "ts": utcnow(),
+            "status": status,
+        }
+        if outputs is not None and status == "ok":
+            try:
+                out_obj = outputs(result)
+                payload["outputs_cid"] = io_cid(out_obj)
+            except Exception:  # pragma: no cover
+                payload["outputs_cid_error"] = True
+        return payload
+
+    def envelope(_client: Any, payload: dict[str, Any], payload_type: str = "opp.step.v1") -> dict[str, Any]:
+        env: dict[str, Any] = _client.create_envelope(payload, payload_type, payload_type)
+        return env
+
+    async_only = inspect.iscoroutinefunction(getattr(client, "send_envelope", None))
+
+    def deliver(summary: dict[str, Any]) -> None:  # outside the wrappers: ticker thread, flush, exit
+        if async_only:
+            _run_detached(client.send_envelope(envelope(client, summary, "opp.step.aggregate.v1")))  # type: ignore[union-attr]
+            return
+        _client = _get_client(client)
+        _send(_client, envelope(_client, summary, "opp.step.aggregate.v1"))
+
+    # Explicit async clients are bound to their loop: their windows close on calls and flushes only.
+    agg = Aggregator(step_type, window, max_calls=policy.max_calls, attrs=attrs, sample_rate=rate, deliver=deliver,
+                     background=not async_only) if window else None
 
     def deco(fn: Callable[..., Any]):
+        if agg is not None and (inspect.isgeneratorfunction(fn) or inspect.isasyncgenfunction(fn)):
+            raise TypeError("aggregate applies to functions and coroutine functions, not generators")
+
+        if inspect.iscoroutinefunction(fn):
+            async def aggregated_async(f_args: tuple[Any, ...], f_kwargs: dict[str, Any]) -> Any:
+                assert agg is not None
+                in_cid = cid_from(inputs, f_args, f_kwargs)
+                status = "ok"
+                result: Any = None
+                t0 = time.perf_counter()
+                try:
+                    result = await fn(*f_args, **f_kwargs)
+                    return result
+                except asyncio.CancelledError:
+                    status = "cancelled"
+                    raise
+                except Exception:
+                    status = "error"
+                    raise
+                finally:
+                    summary = agg.record(time.perf_counter() - t0, status, in_cid,
+                                         cid_from(outputs, result) if status == "ok" else None)
+                    if summary is not None:
+                        _client, send = _async_sender(client)
+                        await send(envelope(_client, summary, "opp.step.aggregate.v1"))
+
+            @wraps(fn)
+            async def async_wrapper(*f_args: Any, **f_kwargs: Any):
+                if sampling and not sampled_in():
+                    return await fn(*f_args, **f_kwargs)
+                if agg is not None:
+                    return await aggregated_async(f_args, f_kwargs)
+                _client, send = _async_sender(client)
+                await send(envelope(_client, start_payload(f_args, f_kwargs)))
+                status = "ok"
+                result: Any = None
+                try:
+                    result = await fn(*f_args, **f_kwargs)
+                    return result
+                except asyncio.CancelledError:
+                    status = "cancelled"
+                    raise
+                except Exception:
+                    status = "error"
+                    raise
+                finally:
+                    await send(envelope(_client, end_payload(status, result)))
+            return async_wrapper
+
+        if inspect.isasyncgenfunction(fn):
+            @wraps(fn)
+            async def agen_wrapper(*f_args: Any, **f_kwargs: Any):
+                if sampling and not sampled_in():
+                    async for item in fn(*f_args, **f_kwargs):
+                        yield item
+                    return
+                _client, send = _async_sender(client)
+                await send(envelope(_client, start_payload(f_args, f_kwargs)))
+                status = "ok"
+                try:
+                    async for item in fn(*f_args, **f_kwargs):
+                        yield item
+                except asyncio.CancelledError:
+                    status = "cancelled"
+                    raise
+                except Exception:
+                    status = "error"
+                    raise
+                finally:
+                    await send(envelope(_client, end_payload(status, None)))
+            return agen_wrapper
+
+        if inspect.iscoroutinefunction(getattr(client, "send_envelope", None)):
+            raise TypeError(f"{type(client).__name__} can only stamp coroutine functions and async generators")
+
+        if inspect.isgeneratorfunction(fn):
+            @wraps(fn)
+            def gen_wrapper(*f_args: Any, **f_kwargs: Any):
+                if sampling and not sampled_in():
+                    return (yield from fn(*f_args, **f_kwargs))
+                _client = _get_client(client)
+                _send(_client, envelope(_client, start_payload(f_args, f_kwargs)))
+                status = "ok"
+                result: Any = None
+                try:
+                    result = yield from fn(*f_args, **f_kwargs)
+                    return result
+                except Exception:
+                    status = "error"
+                    raise
+                finally:
+                    _send(_client, envelope(_client, end_payload(status, result)))
+            return gen_wrapper
+
+        def aggregated(f_args: tuple[Any, ...], f_kwargs: dict[str, Any]) -> Any:
+            assert agg is not None
+            in_cid = cid_from(inputs, f_args, f_kwargs)
+            status = "ok"
+            result: Any = None
+            t0 = time.perf_counter()
+            try:
+                result = fn(*f_args, **f_kwargs)
+                return result
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                summary = agg.record(time.perf_counter() - t0, status, in_cid,
+                                     cid_from(outputs, result) if status == "ok" else None)
+                if summary is not None:
+                    deliver(summary)
+
         @wraps(fn)
         def wrapper(*f_args: Any, **f_kwargs: Any):
+            if sampling and not sampled_in():
+                return fn(*f_args, **f_kwargs)
+            if agg is not None:
+                return aggregated(f_args, f_kwargs)
             _client = _get_client(client)
-            start_payload: dict[str, Any] = {
-                "step": step_type,
-                "phase": "start",
-                "ts": utcnow(),
-                "attrs": attrs,
-            }
-            if inputs is not None:
-                try:
-                    inp_obj = inputs(f_args, f_kwargs)
-                    start_payload["inputs_cid"] = cid_of(inp_obj)
-                except Exception:  # pragma: no cover
-                    start_payload["inputs_cid_error"] = True
-            env1 = _client.create_envelope(start_payload, "opp.step.v1", "opp.step.v1")
-            _client.send_envelope(env1)
+            _send(_client, envelope(_client, start_payload(f_args, f_kwargs)))
             status = "ok"
             result: Any = None
             try:
@@ -67,20 +348,17 @@ def stamp(
                 status = "error"
                 raise
             finally:
-                end_payload: dict[str, Any] = {
-                    "step": step_type,
-                    "phase": "end",
-                    "ts": utcnow(),
-                    "status": status,
-                }
-                if outputs is not None and status == "ok":
-                    try:
-                        out_obj = outputs(result)
-                        end_payload["outputs_cid"] = cid_of(out_obj)
-                    except Exception:  # pragma: no cover
-                        end_payload["outputs_cid_error"] = True
-                env2 = _client.create_envelope(end_payload, "opp.step.v1", "opp.step.v1")
-                _client.send_envelope(env2)
+                _send(_client, envelope(_client, end_payload(status, result)))
         return wrapper
 
     return deco
+
+
+def _reset_after_fork() -> None:
+    global _cache_lock
+    _cache_lock = threading.Lock()
+    reset_client_cache()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,246 @@
+"""Output encodings for graphs, passports and the other CLI / exporter results.
+
+  - ``json``: indented JSON, the CLI default
+  - ``json-compact``: single-line JSON (orjson when installed, same value as ``json``)
+  - ``cbor``: CBOR (RFC 8949), a compact binary form of the same value that decoders in
+    most languages (and dataframe loaders) read directly
+
+Big graphs are where this matters: indented JSON goes through the pure-Python encoder
+and repeats every key with its indentation. The CBOR encoder pre-encodes repeated short
+strings and uses only standard major types (no custom tags): strings stay text strings,
+hex digests included, so any CBOR decoder returns exactly the value ``json.loads`` gives
+for the ``json`` output. Tags other than bignums (2, 3) are decoded to the tagged value.
+The codec is dependency-free and covers JSON-like values plus ``bytes`` and big integers.
+
+``negotiate(accept)`` maps an HTTP ``Accept`` header to a format for the exporter.
+"""
+from __future__ import annotations
+
+import json
+import struct
+from collections.abc import Mapping
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised when orjson is absent
+    orjson = None  # type: ignore[assignment]
+
+__all__ = ["FORMATS", "MEDIA_TYPES", "cbor_dumps", "cbor_loads", "decode", "encode", "negotiate"]
+
+FORMATS = ("json", "json-compact", "cbor")
+MEDIA_TYPES = {"json": "application/json", "json-compact": "application/json", "cbor": "application/cbor"}
+
+_HEADS = [bytes((i,)) for i in range(256)]
+_keys: dict[str, bytes] = {}  # encoded short strings (dict keys, step names, enum-like values)
+_strs: dict[bytes, str] = {}  # and decoded ones
+_MAX_KEYS = 4096
+
+
+def _head(major: int, n: int) -> bytes:
+    mt = major << 5
+    if n < 24:
+        return _HEADS[mt | n]
+    if n < 0x100:
+        return bytes((mt | 24, n))
+    if n < 0x10000:
+        return _HEADS[mt | 25] + n.to_bytes(2, "big")
+    if n < 0x100000000:
+        return _HEADS[mt | 26] + n.to_bytes(4, "big")
+    return _HEADS[mt | 27] + n.to_bytes(8, "big")
+
+
+def _str(s: str) -> bytes:
+    b = _keys.get(s)
+    if b is None:
+        raw = s.encode("utf-8")
+        b = _head(3, len(raw)) + raw
+        if len(raw) <= 24 and len(_keys) < _MAX_KEYS:
+            _keys[s] = b
+    return b
+
+
+def _int(n: int, out: bytearray) -> None:
+    if 0 <= n < 1 << 64:
+        out += _head(0, n)
+    elif -(1 << 64) <= n < 0:
+        out += _head(1, -1 - n)
+    else:  # bignum tags 2 / 3
+        m = n if n >= 0 else -1 - n
+        raw = m.to_bytes((m.bit_length() + 7) // 8, "big")
+        out += _HEADS[0xC2 if n >= 0 else 0xC3] + _head(2, len(raw)) + raw
+
+
+def _enc(obj: Any, out: bytearray) -> None:
+    t = type(obj)
+    if t is str:
+        out += _str(obj)
+    elif t is dict:
+        out += _head(5, len(obj))
+        for k, v in obj.items():
+            _enc(k, out)
+            _enc(v, out)
+    elif t is list or t is tuple:
+        out += _head(4, len(obj))
+        for v in obj:
+            _enc(v, out)
+    elif obj is None:
+        out.append(0xF6)
+    elif obj is True:
+        out.append(0xF5)
+    elif obj is False:
+        out.append(0xF4)
+    elif t is int:
+        _int(obj, out)
+    elif t is float:
+        out += b"\xfb" + struct.pack(">d", obj)
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        raw = bytes(obj)
+        out += _head(2, len(raw)) + raw
+    elif isinstance(obj, str):
+        out += _str(str(obj))
+    elif isinstance(obj, int):
+        _int(int(obj), out)
+    elif isinstance(obj, float):
+        _enc(float(obj), out)
+    elif isinstance(obj, Mapping):
+        _enc(dict(obj), out)
+    elif isinstance(obj, (list, tuple)):
+        _enc(list(obj), out)
+    else:
+        raise TypeError(f"cannot CBOR-encode {t.__name__}")
+
+
+def _dec(data: bytes, pos: int) -> tuple[Any, int]:
+    ib = data[pos]
+    major, info = ib >> 5, ib & 31
+    pos += 1
+    if major == 7:
+        return _simple(data, pos, info)
+    if info < 24:
+        n = info
+    elif info <= 27:
+        size = 1 << (info - 24)
+        _need(data, pos + size)
+        n = int.from_bytes(data[pos:pos + size], "big")
+        pos += size
+    else:
+        raise ValueError("indefinite-length or reserved CBOR items are not supported")
+    if major == 3:
+        end = pos + n
+        _need(data, end)
+        raw = data[pos:end]
+        s = _strs.get(raw) if n <= 24 else None
+        if s is None:
+            s = raw.decode("utf-8")
+            if n <= 24 and len(_strs) < _MAX_KEYS:
+                _strs[raw] = s
+        return s, end
+    if major == 5:
+        obj = {}
+        for _ in range(n):
+            k, pos = _dec(data, pos)
+            obj[k], pos = _dec(data, pos)
+        return obj, pos
+    if major == 4:
+        items = []
+        for _ in range(n):
+            v, pos = _dec(data, pos)
+            items.append(v)
+        return items, pos
+    if major == 0:
+        return n, pos
+    if major == 1:
+        return -1 - n, pos
+    if major == 2:
+        _need(data, pos + n)
+        return data[pos:pos + n], pos + n
+    value, pos = _dec(data, pos)  # major 6: tag
+    if isinstance(value, bytes) and n in (2, 3):
+        m = int.from_bytes(value, "big")
+        return (m if n == 2 else -1 - m), pos
+    return value, pos  # other tags: the tagged value as is
+
+
+def _simple(data: bytes, pos: int, info: int) -> tuple[Any, int]:
+    if info == 20:
+        return False, pos
+    if info == 21:
+        return True, pos
+    if info in (22, 23):
+        return None, pos
+    fmt = {25: ">e", 26: ">f", 27: ">d"}.get(info)
+    if fmt is None:
+        raise ValueError(f"unsupported CBOR simple value {info}")
+    size = struct.calcsize(fmt)
+    _need(data, pos + size)
+    return struct.unpack_from(fmt, data, pos)[0], pos + size
+
+
+def _need(data: bytes, end: int) -> None:
+    if end > len(data):
+        raise ValueError("truncated CBOR data")
+
+
+def cbor_dumps(obj: Any) -> bytes:
+    out = bytearray()
+    _enc(obj, out)
+    return bytes(out)
+
+
+def cbor_loads(data: bytes) -> Any:
+    value, end = _dec(bytes(data), 0)
+    if end != len(data):
+        raise ValueError("trailing bytes after CBOR item")
+    return value
+
+
+def encode(obj: Any, fmt: str = "json") -> bytes:
+    """``obj`` in output format ``fmt`` (one of ``FORMATS``)."""
+    if fmt == "json":
+        return json.dumps(obj, indent=2).encode("utf-8")
+    if fmt == "json-compact":
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj)
+            except TypeError:  # big ints, non-str keys: the stdlib handles them
+                pass
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+    if fmt == "cbor":
+        return cbor_dumps(obj)
+    raise ValueError(f"unknown format {fmt!r} (expected one of {FORMATS})")
+
+
+def decode(data: bytes, fmt: str = "json") -> Any:
+    if fmt in ("json", "json-compact"):
+        return json.loads(data)
+    if fmt == "cbor":
+        return cbor_loads(data)
+    raise ValueError(f"unknown format {fmt!r} (expected one of {FORMATS})")
+
+
+def negotiate(accept: str | None) -> str:
+    """``cbor`` when the ``Accept`` header prefers ``application/cbor`` over JSON, else ``json``.
+
+    Higher ``q`` wins, then an explicit media type over a wildcard, then the first listed.
+    """
+    best, rank = "json", (0.0, 0)
+    for part in (accept or "").split(","):
+        media, *params = (p.strip().lower() for p in part.split(";"))
+        if media == "application/cbor":
+            fmt = "cbor"
+        elif media in ("application/json", "application/*", "*/*"):
+            fmt = "json"
+        else:
+            continue
+        q = 1.0
+        for p in params:
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        key = (q, 0 if "*" in media else 1)
+        if q > 0 and key > rank:
+            best, rank = fmt, key
+    return best
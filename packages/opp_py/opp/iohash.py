@@ -0,0 +1,181 @@
+"""Content ids for ``@stamp`` inputs/outputs: type-dispatched, zero-copy and memoized.
+
+``io_cid(obj)`` is what ``@stamp`` records as ``inputs_cid`` / ``outputs_cid``. JSON values
+(dicts, lists, strings, numbers) keep their canonical-JSON ``cid_of``; everything else is
+hashed by type instead of being serialized:
+
+  - buffer-protocol objects (``bytes``, ``bytearray``, ``memoryview``, numpy arrays,
+    ``array.array``): sha256 over the raw memory, read through a ``memoryview`` (no copy
+    for contiguous buffers). Plain byte buffers hash to ``sha256(data)``; typed or
+    multi-dimensional ones prefix ``opp-buffer:<format>:<shape>`` so equal bytes with a
+    different dtype or shape get a different CID.
+  - ``os.PathLike`` (``pathlib.Path``): sha256 of the file content through ``mmap`` (equal
+    to the CID of the same bytes), cached by path and (inode, mtime, size).
+  - iterators / generators: consumed item by item, each item hashed as above, and the
+    CID is the ``merkle_root`` of the item CIDs (utf-8), in O(log n) memory.
+  - lists / tuples / dicts holding any of the above (e.g. ``(array, path)`` from an
+    ``inputs=lambda a, k: a`` selector): each member goes through ``io_cid``. A list or
+    tuple gets the Merkle root of its member CIDs (the CID of iterating it); a dict gets
+    the Merkle root of ``"<key CID> <value CID>"`` leaves sorted, like canonical JSON keys.
+
+``register(type, fn)`` adds or overrides a hasher (``fn(obj) -> "sha256:..."``) for a type
+and its subclasses, e.g. DataFrames. Results for objects that support weak references are
+memoized by identity while the object is alive, so an array passed through several steps
+is hashed once; this assumes it is not mutated in place in between (``forget(obj)`` drops
+a memoized CID, ``io_cid(obj, memo=False)`` bypasses the memo).
+"""
+from __future__ import annotations
+
+import functools
+import hashlib
+import mmap
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from typing import Any
+
+from .canonical import cid_of
+from .merkle import MerkleBuilder
+
+__all__ = ["clear_cache", "file_cid", "forget", "io_cid", "register"]
+
+_FILE_CACHE_SIZE = 4096
+_BYTE_FORMATS = ("B", "b", "c")
+
+# The memo is only touched with single dict operations (atomic under the GIL): its weakref
+# callbacks can run from the garbage collector at any point, so it takes no lock.
+_memo: dict[int, tuple[weakref.ref[Any], str]] = {}
+_files: OrderedDict[str, tuple[tuple[int, int, int], str]] = OrderedDict()
+_lock = threading.Lock()
+
+
+def _buffer_cid(mv: memoryview) -> str:
+    h = hashlib.sha256()
+    if mv.ndim != 1 or mv.format not in _BYTE_FORMATS:
+        h.update(f"opp-buffer:{mv.format}:{','.join(map(str, mv.shape or ()))}\n".encode())
+    if mv.c_contiguous:
+        with mv.cast("B") as flat:
+            h.update(flat)
+    else:
+        h.update(mv.tobytes())
+    return "sha256:" + h.hexdigest()
+
+
+@functools.singledispatch
+def _hash(obj: Any) -> str:
+    try:
+        mv = memoryview(obj)
+    except TypeError:
+        return cid_of(obj)
+    with mv:
+        return _buffer_cid(mv)
+
+
+@_hash.register(str)
+@_hash.register(int)
+@_hash.register(float)
+@_hash.register(type(None))
+def _hash_json(obj: Any) -> str:
+    return cid_of(obj)
+
+
+@_hash.register(list)
+@_hash.register(tuple)
+def _hash_sequence(obj: list[Any] | tuple[Any, ...]) -> str:
+    try:
+        return cid_of(obj)
+    except TypeError:  # a member is not JSON (bytes, a path, an array, ...)
+        return _hash_iter(iter(obj))
+
+
+@_hash.register(dict)
+def _hash_dict(obj: dict[Any, Any]) -> str:
+    try:
+        return cid_of(obj)
+    except TypeError:
+        pass
+    builder = MerkleBuilder()
+    for leaf in sorted(f"{io_cid(k, memo=False)} {io_cid(v, memo=False)}" for k, v in obj.items()):
+        builder.add(leaf.encode("utf-8"))
+    return builder.root()
+
+
+@_hash.register(os.PathLike)
+def _hash_path(obj: os.PathLike[Any]) -> str:
+    return file_cid(os.fspath(obj))
+
+
+@_hash.register(Iterator)
+def _hash_iter(obj: Iterator[Any]) -> str:
+    builder = MerkleBuilder()
+    for item in obj:
+        builder.add(io_cid(item, memo=False).encode("utf-8"))
+    return builder.root()
+
+
+def register(cls: type, fn: Callable[[Any], str]) -> None:
+    """Hash instances of ``cls`` (and subclasses) with ``fn``, which returns a ``sha256:`` CID."""
+    _hash.register(cls, fn)
+
+
+def file_cid(path: str | os.PathLike[Any]) -> str:
+    """sha256 CID of a file's content, reused while its (inode, mtime, size) are unchanged."""
+    path = os.path.abspath(os.fspath(path))
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with _lock:
+            hit = _files.get(path)
+            if hit is not None and hit[0] == key:
+                _files.move_to_end(path)
+                return hit[1]
+        h = hashlib.sha256()
+        if st.st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as mv:
+                h.update(mv)
+    cid = "sha256:" + h.hexdigest()
+    with _lock:
+        _files[path] = (key, cid)
+        _files.move_to_end(path)
+        while len(_files) > _FILE_CACHE_SIZE:
+            _files.popitem(last=False)
+    return cid
+
+
+def io_cid(obj: Any, *, memo: bool = True) -> str:
+    """CID of a stamped function's input or output object (see module docstring)."""
+    if not memo:
+        return _hash(obj)
+    key = id(obj)
+    hit = _memo.get(key)
+    if hit is not None and hit[0]() is obj:
+        return hit[1]
+    cid = _hash(obj)
+    try:
+        ref = weakref.ref(obj, functools.partial(_drop, key))
+    except TypeError:  # dicts, lists, bytes, ...: no weak references, no memo
+        return cid
+    _memo[key] = (ref, cid)
+    return cid
+
+
+def _drop(key: int, ref: weakref.ref[Any]) -> None:
+    hit = _memo.get(key)
+    if hit is not None and hit[0] is ref:
+        _memo.pop(key, None)
+
+
+def forget(obj: Any) -> None:
+    """Drop the memoized CID of ``obj`` (e.g. after mutating it in place)."""
+    hit = _memo.get(id(obj))
+    if hit is not None and hit[0]() is obj:
+        _memo.pop(id(obj), None)
+
+
+def clear_cache() -> None:
+    """Drop all memoized object CIDs and cached file CIDs."""
+    _memo.clear()
+    with _lock:
+        _files.clear()
@@ -0,0 +1,176 @@
+"""JWKS cache holding ready-to-use Ed25519 public keys by ``kid``.
+
+Keys are parsed once per JWKS fetch instead of once per signature check. Freshness
+follows the response's ``Cache-Control`` (``max-age`` / ``s-maxage``; ``no-store`` /
+``no-cache`` mean "refetch on next use"), falling back to ``default_ttl``:
+
+  - past ``refresh_ahead`` of the TTL, a lookup triggers a background refresh and is
+    served from the current keys;
+  - once expired, the lookup refetches inline (stale keys are served if that fails);
+  - an unknown ``kid`` forces a refetch (rate-limited by ``min_refetch_interval``) so
+    rotated-in keys are picked up immediately; keys dropped from the JWKS disappear.
+
+Concurrent fetches of one JWKS URL are coalesced.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import re
+import time
+from collections.abc import Awaitable, Callable, Mapping
+from typing import Any
+
+import httpx
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+from .singleflight import SingleFlight
+
+__all__ = ["JWKSCache", "cache_control_max_age", "public_key_from_jwk", "verify_ed25519"]
+
+_MAX_AGE = re.compile(r"(?:^|,)\s*(s-maxage|max-age)\s*=\s*\"?(\d+)")
+
+
+def _b64u_decode(s: str) -> bytes:
+    s = s.strip()
+    return base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+
+
+def public_key_from_jwk(jwk: Mapping[str, Any]) -> Ed25519PublicKey | None:
+    """Ed25519 key for an OKP/Ed25519 JWK, ``None`` for other or malformed keys."""
+    if jwk.get("kty", "OKP") != "OKP" or jwk.get("crv", "Ed25519") != "Ed25519":
+        return None
+    try:
+        return Ed25519PublicKey.from_public_bytes(_b64u_decode(jwk["x"]))
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
+def verify_ed25519(key: Ed25519PublicKey, message: bytes, signature: bytes | str) -> bool:
+    """Check a raw or base64url signature; never raises for bad input."""
+    try:
+        sig = _b64u_decode(signature) if isinstance(signature, str) else signature
+        key.verify(sig, message)
+        return True
+    except (InvalidSignature, ValueError):
+        return False
+
+
+def cache_control_max_age(headers: Mapping[str, str]) -> float | None:
+    """Lifetime granted by ``Cache-Control`` (0 for no-store/no-cache), ``None`` if absent."""
+    cc = (headers.get("cache-control") or "").lower()
+    if not cc:
+        return None
+    if "no-store" in cc or "no-cache" in cc:
+        return 0.0
+    ages = dict(_MAX_AGE.findall(cc))
+    age = ages.get("s-maxage", ages.get("max-age"))
+    return float(age) if age is not None else None
+
+
+class JWKSCache:
+    """Cached ``kid -> Ed25519PublicKey`` view of one JWKS URL, fetched via ``afetch(url)``."""
+
+    def __init__(
+        self,
+        url: str,
+        afetch: Callable[[str], Awaitable[httpx.Response]],
+        *,
+        default_ttl: float = 300.0,
+        max_ttl: float = 86400.0,
+        refresh_ahead: float = 0.8,
+        min_refetch_interval: float = 10.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.url = url
+        self._afetch = afetch
+        self.default_ttl = default_ttl
+        self.max_ttl = max_ttl
+        self.refresh_ahead = refresh_ahead
+        self.min_refetch_interval = min_refetch_interval
+        self._clock = clock
+        self._keys: dict[str | None, Ed25519PublicKey] = {}
+        self._fetched_at: float | None = None
+        self._ttl = 0.0
+        self._flights = SingleFlight()
+        self._background: asyncio.Task[None] | None = None
+        self.fetches = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def kids(self) -> list[str | None]:
+        return list(self._keys)
+
+    def load(self, jwks: Mapping[str, Any], headers: Mapping[str, str] | None = None) -> None:
+        """Replace the key set from a JWKS document (+ response headers for its lifetime)."""
+        if not isinstance(jwks, Mapping):
+            raise TypeError("JWKS document must be a JSON object")
+        keys: dict[str | None, Ed25519PublicKey] = {}
+        for jwk in jwks.get("keys", []):
+            if not isinstance(jwk, Mapping):
+                continue
+            key = public_key_from_jwk(jwk)
+            if key is not None:
+                keys.setdefault(jwk.get("kid"), key)
+        age = cache_control_max_age({k.lower(): v for k, v in (headers or {}).items()})
+        self._ttl = min(self.default_ttl if age is None else age, self.max_ttl)
+        self._keys = keys
+        self._fetched_at = self._clock()
+
+    async def _fetch(self) -> None:
+        self.fetches += 1
+        r = await self._afetch(self.url)
+        r.raise_for_status()
+        self.load(r.json(), r.headers)
+
+    async def refresh(self) -> None:
+        await self._flights.do(self.url, self._fetch)
+
+    async def _refresh_quietly(self) -> None:
+        try:
+            await self.refresh()
+        except (httpx.HTTPError, ValueError, TypeError):  # stale keys keep being served; next lookup retries
+            self.errors += 1
+
+    def _age(self) -> float:
+        return float("inf") if self._fetched_at is None else self._clock() - self._fetched_at
+
+    def _lookup(self, kid: str | None) -> Ed25519PublicKey | None:
+        if kid is None:
+            return next(iter(self._keys.values()), None)
+        return self._keys.get(kid)
+
+    async def aget(self, kid: str | None) -> Ed25519PublicKey | None:
+        """Public key for ``kid`` (first key when ``kid`` is None), fetching as needed."""
+        age = self._age()
+        if age >= self._ttl:
+            if self._fetched_at is None:
+                await self.refresh()
+            else:
+                await self._refresh_quietly()
+        elif age >= self._ttl * self.refresh_ahead and (self._background is None or self._background.done()):
+            self._background = asyncio.ensure_future(self._refresh_quietly())
+        key = self._lookup(kid)
+        if key is None and self._age() >= min(self.min_refetch_interval, self._ttl):
+            await self.refresh()  # unknown kid: maybe rotated in since the last fetch
+            key = self._lookup(kid)
+        if key is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return key
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "url": self.url,
+            "kids": self.kids,
+            "ttl": self._ttl,
+            "age": None if self._fetched_at is None else round(self._age(), 3),
+            "fetches": self.fetches,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
@@ -1,6 +1,10 @@
 from __future__ import annotations
 
 import hashlib
+import os
+from collections.abc import Iterable, Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import IO, Any
 
 
 def _h(b: bytes) -> bytes:
@@ -18,3 +22,230 @@ def merkle_root(chunks: list[bytes]) -> str:
             nxt.append(_h(a + b))
         layer = nxt
     return "sha256:" + layer[0].hex()
+
+
+# --- bulk / parallel hashing -------------------------------------------------
+# Layers are kept as one contiguous buffer of 32-byte digests: the two children of
+# node j are the 64 bytes at [64j, 64j+64), hashed through a memoryview slice with no
+# ``a + b`` concatenation. Output is bit-identical to ``merkle_root``.
+
+_sha256 = hashlib.sha256
+
+
+def _hash_batch(chunks: Sequence[bytes]) -> bytes:
+    return b"".join([_sha256(c).digest() for c in chunks])
+
+
+def _reduce_layer(layer: bytes | bytearray | memoryview) -> bytes:
+    """Hash one layer of concatenated digests into the next (odd last node is duplicated)."""
+    mv = memoryview(layer)
+    even = len(mv) - len(mv) % 64
+    digests = [_sha256(mv[i:i + 64]).digest() for i in range(0, even, 64)]
+    if even < len(mv):
+        last = mv[even:]
+        h = _sha256(last)
+        h.update(last)
+        digests.append(h.digest())
+    return b"".join(digests)
+
+
+def hash_leaves(chunks: Sequence[bytes], *, pool: Executor | None = None, batch_size: int = 4096) -> bytes:
+    """Hash every leaf, returning the digests as one contiguous ``len(chunks) * 32`` buffer.
+
+    With a thread pool this scales for large leaves (hashlib releases the GIL above
+    ~2 KiB); small leaves need a process pool to parallelize.
+    """
+    if pool is None or len(chunks) <= batch_size:
+        return _hash_batch(chunks)
+    batches = [chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)]
+    return b"".join(pool.map(_hash_batch, batches))
+
+
+def _reduce_parallel(layer: bytes, pool: Executor, batch_nodes: int) -> bytes:
+    # Slices hold an even number of nodes, so only the final slice can need duplication.
+    step = batch_nodes * 64
+    slices = [layer[i:i + step] for i in range(0, len(layer), step)]
+    return b"".join(pool.map(_reduce_layer, slices))
+
+
+def merkle_root_digests(layer: bytes, *, pool: Executor | None = None, batch_nodes: int = 1 << 15) -> str:
+    """Merkle root over pre-hashed leaves given as concatenated 32-byte digests."""
+    if not layer:
+        return "sha256:" + _sha256(b"").hexdigest()
+    while len(layer) > 32:
+        if pool is not None and len(layer) > batch_nodes * 64:
+            layer = _reduce_parallel(layer, pool, batch_nodes)
+        else:
+            layer = _reduce_layer(layer)
+    return "sha256:" + layer.hex()
+
+
+def merkle_root_parallel(
+    chunks: Sequence[bytes],
+    *,
+    workers: int | None = None,
+    executor: str | Executor = "thread",
+    batch_size: int = 4096,
+) -> str:
+    """``merkle_root`` computed across a worker pool.
+
+    ``executor`` is ``"thread"`` (leaf hashing in threads; best for large leaves),
+    ``"process"`` (leaves and wide layers in worker processes; best for many small
+    leaves) or an existing ``Executor`` to reuse across calls.
+    """
+    if isinstance(executor, Executor):
+        digests = hash_leaves(chunks, pool=executor, batch_size=batch_size)
+        layer_pool = executor if isinstance(executor, ProcessPoolExecutor) else None
+        return merkle_root_digests(digests, pool=layer_pool)
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(chunks) <= batch_size:
+        return merkle_root_digests(_hash_batch(chunks))
+    if executor == "process":
+        with ProcessPoolExecutor(max_workers=workers) as pp:
+            return merkle_root_digests(hash_leaves(chunks, pool=pp, batch_size=batch_size), pool=pp)
+    if executor != "thread":
+        raise ValueError(f"unknown executor {executor!r} (expected 'thread' or 'process')")
+    with ThreadPoolExecutor(max_workers=workers) as tp:
+        digests = hash_leaves(chunks, pool=tp, batch_size=batch_size)
+    # 64-byte node hashes do not release the GIL; layers are reduced in this thread.
+    return merkle_root_digests(digests)
+
+
+class MerkleBuilder:
+    """Incremental Merkle tree with O(log n) state, root-compatible with ``merkle_root``.
+
+    Leaves are folded in as they arrive; only the roots of complete power-of-two
+    subtrees are kept (one per level, like a binary counter). ``root()`` applies the
+    same odd-node duplication as ``merkle_root`` without consuming the state, so more
+    leaves may be added afterwards.
+
+    Inclusion proofs are collected for the leaf indices passed as ``track`` (each adds
+    O(log n) state); use ``merkle_proof`` to stream a dataset again for one leaf.
+    """
+
+    def __init__(self, track: Iterable[int] = ()):
+        self._pending: list[bytes | None] = []
+        self._count = 0
+        self._paths: dict[int, list[tuple[str, bytes]]] = {i: [] for i in track}
+        self._leaves: dict[int, bytes] = {}
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, chunk: bytes) -> None:
+        self.add_hash(_h(chunk))
+
+    def add_hash(self, digest: bytes) -> None:
+        """Add a leaf whose sha256 digest is already known."""
+        idx = self._count
+        if idx in self._paths:
+            self._leaves[idx] = digest
+        node = digest
+        level = 0
+        pending = self._pending
+        while level < len(pending) and pending[level] is not None:
+            left = pending[level]
+            assert left is not None
+            pending[level] = None
+            span = 1 << level
+            idx -= span
+            if self._paths:
+                self._record(self._paths, idx, span, idx + 2 * span, left, node)
+            node = _h(left + node)
+            level += 1
+        if level == len(pending):
+            pending.append(node)
+        else:
+            pending[level] = node
+        self._count += 1
+
+    def update(self, chunks: Iterable[bytes]) -> MerkleBuilder:
+        for c in chunks:
+            self.add(c)
+        return self
+
+    def update_from_stream(self, f: IO[bytes], chunk_size: int = 1 << 20) -> MerkleBuilder:
+        """Add fixed-size chunks read from a binary file object (last chunk may be short)."""
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                return self
+            self.add(block)
+
+    @staticmethod
+    def _record(paths: dict[int, list[tuple[str, bytes]]], lstart: int, lspan: int, rend: int,
+                left: bytes, right: bytes) -> None:
+        mid = lstart + lspan
+        for t, path in paths.items():
+            if lstart <= t < mid:
+                path.append(("right", right))
+            elif mid <= t < rend:
+                path.append(("left", left))
+
+    def _finalize(self, paths: dict[int, list[tuple[str, bytes]]]) -> bytes:
+        n = self._count
+        if n == 0:
+            return hashlib.sha256(b"").digest()
+        top = len(self._pending) - 1
+        carry: bytes | None = None
+        carry_start = n
+        for level, p in enumerate(self._pending):
+            if level == top and carry is None:
+                assert p is not None
+                return p
+            span = 1 << level
+            if p is not None:
+                pstart = (n >> (level + 1)) << (level + 1)
+                right = carry if carry is not None else p
+                self._record(paths, pstart, span, n, p, right)
+                carry, carry_start = _h(p + right), pstart
+            elif carry is not None:
+                self._record(paths, carry_start, n - carry_start, n, carry, carry)
+                carry = _h(carry + carry)
+        assert carry is not None
+        return carry
+
+    def digest(self) -> bytes:
+        return self._finalize({})
+
+    def root(self) -> str:
+        return "sha256:" + self.digest().hex()
+
+    def proof(self, index: int) -> dict[str, Any]:
+        """Inclusion proof for a tracked leaf index."""
+        if index not in self._paths or index >= self._count:
+            raise KeyError(f"leaf {index} was not tracked or has not been added")
+        paths = {index: list(self._paths[index])}
+        root = self._finalize(paths)
+        return {
+            "index": index,
+            "leaf_count": self._count,
+            "leaf_hash": self._leaves[index].hex(),
+            "path": [{"side": side, "hash": h.hex()} for side, h in paths[index]],
+            "root": "sha256:" + root.hex(),
+        }
+
+
+def merkle_root_iter(chunks: Iterable[bytes]) -> str:
+    """``merkle_root`` for an iterator of leaves, without holding them in memory."""
+    return MerkleBuilder().update(chunks).root()
+
+
+def merkle_root_stream(f: IO[bytes], chunk_size: int = 1 << 20) -> str:
+    return MerkleBuilder().update_from_stream(f, chunk_size).root()
+
+
+def merkle_proof(chunks: Iterable[bytes], index: int) -> dict[str, Any]:
+    """Stream the leaves once and return the inclusion proof for ``chunks[index]``."""
+    return MerkleBuilder(track=[index]).update(chunks).proof(index)
+
+
+def verify_proof(leaf: bytes, proof: dict[str, Any], root: str) -> bool:
+    """Check that ``leaf`` (raw chunk bytes) is included under the trusted ``root``."""
+    node = _h(leaf)
+    if proof.get("leaf_hash") not in (None, node.hex()):
+        return False
+    for step in proof.get("path", []):
+        sibling = bytes.fromhex(step["hash"])
+        node = _h(node + sibling) if step["side"] == "right" else _h(sibling + node)
+    return "sha256:" + node.hex() == root
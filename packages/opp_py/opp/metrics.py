@@ -0,0 +1,273 @@
+"""Opt-in latency histograms and OpenTelemetry spans for stamping and the exporter.
+
+Instrumented code declares module-level histograms and wraps hot sections in ``timed``:
+
+    _SEND = metrics.histogram("opp_send_seconds", "Envelope delivery latency", ("target", "kind"))
+
+    with metrics.timed(_SEND, "gateway", "batch", span="opp.send"):
+        resp = client.post(url, json=body)
+
+Switches (environment, or ``enable()`` at runtime):
+  - OPP_METRICS=1: record histograms; ``render()`` returns them in the Prometheus text
+    format (the exporter serves it on ``/metrics``; ``serve(port)`` does the same from a
+    background thread in any process)
+  - OPP_OTEL=1: also open an OpenTelemetry span per ``timed`` section that names one
+    (needs ``opentelemetry-api``; configure the SDK and exporter in the application)
+
+With both off ``timed`` returns a shared no-op context manager: one call and one flag
+check per section. ``register_collector`` adds values read only at scrape time (queue
+counters, cache stats), so they cost nothing between scrapes.
+"""
+from __future__ import annotations
+
+import bisect
+import contextlib
+import importlib
+import logging
+import math
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+__all__ = [
+    "CONTENT_TYPE",
+    "DEFAULT_BUCKETS",
+    "Family",
+    "Histogram",
+    "enable",
+    "enabled",
+    "histogram",
+    "observe",
+    "register_collector",
+    "render",
+    "reset",
+    "serve",
+    "timed",
+    "tracing",
+]
+
+log = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+
+# (name, "counter" | "gauge", help, [(labels, value), ...])
+Family = tuple[str, str, str, list[tuple[dict[str, str], float]]]
+
+
+def _flag(name: str) -> bool:
+    return os.getenv(name, "").lower() in ("1", "true", "yes")
+
+
+_enabled = _flag("OPP_METRICS")
+_tracing = False
+_tracer: Any = None
+_NOOP = contextlib.nullcontext()
+_registry: dict[str, Histogram] = {}
+_collectors: list[Callable[[], Iterable[Family]]] = []
+_registry_lock = threading.Lock()
+
+
+class Histogram:
+    """Cumulative-bucket latency (or size) histogram, one series per label-value tuple."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple[str, ...], list[float]] = {}  # per-bucket counts, +Inf count, sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labelvalues}")
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0.0] * (len(self.buckets) + 2)
+            series[idx] += 1
+            series[-1] += value
+
+    def series(self) -> dict[tuple[str, ...], dict[str, Any]]:
+        """Per label-value tuple: cumulative ``buckets`` (upper bound -> count), ``count`` and ``sum``."""
+        out: dict[tuple[str, ...], dict[str, Any]] = {}
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for labels, counts in snapshot.items():
+            cumulative: dict[float, int] = {}
+            total = 0
+            for bound, n in zip((*self.buckets, math.inf), counts[:-1]):
+                total += int(n)
+                cumulative[bound] = total
+            out[labels] = {"buckets": cumulative, "count": total, "sum": counts[-1]}
+        return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+def histogram(name: str, help: str, labelnames: tuple[str, ...] = (),
+              buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    """The registered histogram ``name``, created on first use."""
+    with _registry_lock:
+        h = _registry.get(name)
+        if h is None:
+            h = _registry[name] = Histogram(name, help, labelnames, buckets)
+        elif h.labelnames != labelnames:
+            raise ValueError(f"histogram {name} already registered with labels {h.labelnames}")
+    return h
+
+
+def register_collector(fn: Callable[[], Iterable[Family]]) -> None:
+    """Add a callable producing counter/gauge families at render time."""
+    with _registry_lock:
+        if fn not in _collectors:
+            _collectors.append(fn)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def tracing() -> bool:
+    return _tracing
+
+
+def enable(metrics: bool = True, otel: bool | None = None) -> None:
+    """Switch histogram recording and, when ``otel`` is given, OpenTelemetry spans on or off."""
+    global _enabled, _tracing, _tracer
+    _enabled = metrics
+    if otel is not None:
+        if otel and _tracer is None:
+            try:
+                trace: Any = importlib.import_module("opentelemetry.trace")
+            except ImportError as e:
+                raise RuntimeError("OpenTelemetry spans need opentelemetry-api: pip install opentelemetry-api") from e
+            _tracer = trace.get_tracer("opp")
+        _tracing = otel
+
+
+class _Timer:
+    __slots__ = ("_hist", "_labels", "_span", "_span_cm", "_t0")
+
+    def __init__(self, hist: Histogram, labels: tuple[str, ...], span: str | None):
+        self._hist = hist
+        self._labels = labels
+        self._span = span
+        self._span_cm: Any = None
+        self._t0 = 0.0
+
+    def __enter__(self) -> _Timer:  # noqa: PYI034
+        if _tracing and self._span is not None:
+            self._span_cm = _tracer.start_as_current_span(self._span)
+            self._span_cm.__enter__()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        if _enabled:
+            self._hist.observe(time.perf_counter() - self._t0, *self._labels)
+        if self._span_cm is not None:
+            self._span_cm.__exit__(*exc)
+
+
+def timed(hist: Histogram, *labelvalues: str, span: str | None = None) -> contextlib.AbstractContextManager[Any]:
+    """Context manager observing the elapsed seconds into ``hist`` (and opening ``span`` when tracing)."""
+    if not (_enabled or (_tracing and span is not None)):
+        return _NOOP
+    return _Timer(hist, labelvalues, span)
+
+
+def observe(hist: Histogram, value: float, *labelvalues: str) -> None:
+    if _enabled:
+        hist.observe(value, *labelvalues)
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _labels(pairs: Iterable[tuple[str, str]]) -> str:
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}" if body else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def render() -> str:
+    """All histograms with observations and all collector families, Prometheus text format 0.0.4."""
+    lines: list[str] = []
+    with _registry_lock:
+        hists = sorted(_registry.values(), key=lambda h: h.name)
+        collectors = list(_collectors)
+    for h in hists:
+        series = h.series()
+        if not series:
+            continue
+        lines += [f"# HELP {h.name} {h.help}", f"# TYPE {h.name} histogram"]
+        for labelvalues, s in sorted(series.items()):
+            pairs = list(zip(h.labelnames, labelvalues))
+            for bound, n in s["buckets"].items():
+                lines.append(f"{h.name}_bucket{_labels([*pairs, ('le', _fmt(bound))])} {n}")
+            lines.append(f"{h.name}_sum{_labels(pairs)} {_fmt(s['sum'])}")
+            lines.append(f"{h.name}_count{_labels(pairs)} {s['count']}")
+    for collect in collectors:
+        try:
+            families = list(collect())
+        except Exception:  # a broken collector must not take the endpoint down
+            log.exception("metrics collector %r failed", collect)
+            continue
+        for name, kind, help_, samples in families:
+            lines += [f"# HELP {name} {help_}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{_labels(sorted(labels.items()))} {_fmt(value)}" for labels, value in samples]
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    """Drop all recorded observations (histograms stay registered)."""
+    with _registry_lock:
+        hists = list(_registry.values())
+    for h in hists:
+        h.reset()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("content-type", CONTENT_TYPE)
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def serve(port: int, addr: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve ``render()`` on ``http://addr:port/metrics`` from a daemon thread (e.g. in a training job)."""
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="opp-metrics", daemon=True).start()
+    return server
+
+
+if _flag("OPP_OTEL"):
+    try:
+        enable(_enabled, otel=True)
+    except RuntimeError as e:
+        log.warning("OPP_OTEL is set but spans are off: %s", e)
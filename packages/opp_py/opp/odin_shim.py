@@ -1,40 +1,46 @@
 from __future__ import annotations
 
+import asyncio
 import base64
 import datetime
-import hashlib
-import json
 import os
+import sqlite3
+import threading
 from typing import Any
 
 import httpx
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
 
-__all__ = ["OPEClient"]
+from . import metrics
+from .canonical import cid_of
+from .store import ReceiptStore, store_from_env
+from .transport import TransportConfig, arequest, build_async_client, build_client, request
+from .util import env_trace_id
 
-def _b64u(b: bytes) -> str:
-    return base64.urlsafe_b64encode(b).decode().rstrip("=")
+__all__ = ["AsyncOPEClient", "OPEClient"]
 
-def _canonical(obj: Any) -> bytes:
-    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+_CREATE = metrics.histogram("opp_envelope_create_seconds", "Time to build one signed envelope (payload CID + signature)")
+_SIGN = metrics.histogram("opp_envelope_sign_seconds", "Ed25519 signing time per envelope")
+_SEND = metrics.histogram("opp_send_seconds", "Envelope delivery latency per gateway POST or local store append",
+                          ("target", "kind"))
+# What a best-effort gateway send swallows: network/HTTP failures and unusable gateway URLs.
+_NET_ERRORS = (httpx.HTTPError, httpx.InvalidURL)
+# ... and what a best-effort store append swallows: I/O, SQLite and read-only/closed store errors.
+_STORE_ERRORS = (OSError, sqlite3.Error, RuntimeError)
 
-def _cid(obj: Any) -> str:
-    return "sha256:" + hashlib.sha256(_canonical(obj)).hexdigest()
+def _b64u(b: bytes) -> str:
+    return base64.urlsafe_b64encode(b).decode().rstrip("=")
 
 def _utcnow_iso() -> str:
     return datetime.datetime.now(datetime.UTC).isoformat()
 
-class OPEClient:
-    """Fallback OPEClient providing create_envelope() / send_envelope().
-
-    Environment variables (mirrors odin-sdk expectations):
-      - OPP_GATEWAY_URL / ODIN_GATEWAY_URL (default http://127.0.0.1:8080)
-      - OPP_SENDER_PRIV_B64 / ODIN_SENDER_PRIV_B64 : base64url 32-byte Ed25519 seed (no padding)
-      - OPP_SENDER_KID / ODIN_SENDER_KID : key id (default 'opp-sender')
-    send_envelope() will POST JSON to {gateway_url}/api/v1/envelopes if network reachable; otherwise it silently ignores errors.
-    """
-    def __init__(self, gateway_url: str | None = None, sender_priv_b64: str | None = None, sender_kid: str | None = None):
+class _SigningClient:
+    """Key material + create_envelope() shared by the sync and async clients."""
+    def __init__(self, gateway_url: str | None = None, sender_priv_b64: str | None = None, sender_kid: str | None = None,
+                 store: ReceiptStore | None = None):
+        # Local receipt store (explicit or OPP_RECEIPT_STORE): sends append to it instead of the gateway.
+        self.store = store if store is not None else store_from_env()
         self.gateway_url = gateway_url or os.getenv("OPP_GATEWAY_URL") or os.getenv("ODIN_GATEWAY_URL") or "http://127.0.0.1:8080"
         self.sender_priv_b64 = sender_priv_b64 or os.getenv("ODIN_SENDER_PRIV_B64") or os.getenv("OPP_SENDER_PRIV_B64")
         if not self.sender_priv_b64:
@@ -46,13 +52,20 @@ class OPEClient:
         self._priv = Ed25519PrivateKey.from_private_bytes(seed_bytes)
         self._pub = self._priv.public_key().public_bytes(encoding=serialization.Encoding.Raw, format=serialization.PublicFormat.Raw)
         self._pub_b64u = _b64u(self._pub)
+        self._bulk_supported = True
 
     def create_envelope(self, payload: dict[str, Any], payload_type: str, target_type: str, trace_id: str | None = None, ts: str | None = None) -> dict[str, Any]:
-        trace_id = trace_id or os.getenv("OPP_TRACE_ID") or os.getenv("ODIN_TRACE_ID") or "opp-trace"
+        with metrics.timed(_CREATE, span="opp.create_envelope"):
+            return self._create_envelope(payload, payload_type, target_type, trace_id, ts)
+
+    def _create_envelope(self, payload: dict[str, Any], payload_type: str, target_type: str, trace_id: str | None,
+                         ts: str | None) -> dict[str, Any]:
+        trace_id = trace_id or env_trace_id()
         ts = ts or _utcnow_iso()
-        cid = _cid(payload)
+        cid = cid_of(payload)
         msg = f"{cid}|{trace_id}|{ts}".encode()
-        sig = self._priv.sign(msg)
+        with metrics.timed(_SIGN):
+            sig = self._priv.sign(msg)
         return {
             "trace_id": trace_id,
             "ts": ts,
@@ -64,11 +77,142 @@ class OPEClient:
             "signature": _b64u(sig),
         }
 
+    def _url(self, path: str) -> str:
+        return self.gateway_url.rstrip("/") + path
+
+    def _store_envelopes(self, envs: list[dict[str, Any]], kind: str = "envelope") -> dict[str, Any]:
+        assert self.store is not None
+        try:
+            with metrics.timed(_SEND, "store", kind, span="opp.send"):
+                self.store.append_many(envs)
+        except _STORE_ERRORS:
+            return {"status_code": None, "count": len(envs)}
+        return {"status_code": 201, "count": len(envs)}
+
+    @staticmethod
+    def _batch_result(codes: list[int | None], count: int) -> dict[str, Any]:
+        failed = [c for c in codes if c is None or c >= 400]
+        return {"status_code": failed[0] if failed else (codes[-1] if codes else 200), "count": count}
+
+
+class OPEClient(_SigningClient):
+    """Fallback OPEClient providing create_envelope() / send_envelope().
+
+    Environment variables (mirrors odin-sdk expectations):
+      - OPP_GATEWAY_URL / ODIN_GATEWAY_URL (default http://127.0.0.1:8080)
+      - OPP_SENDER_PRIV_B64 / ODIN_SENDER_PRIV_B64 : base64url 32-byte Ed25519 seed (no padding)
+      - OPP_SENDER_KID / ODIN_SENDER_KID : key id (default 'opp-sender')
+      - OPP_RECEIPT_STORE : local receipt store URL (see opp.store); when set (or ``store`` is passed)
+        sends are appended to it instead of POSTed
+    send_envelope() will POST JSON to {gateway_url}/api/v1/envelopes if network reachable; otherwise it silently ignores errors.
+    send_batch() POSTs {"envelopes": [...]} to {gateway_url}/api/v1/envelopes/batch, falling back to
+    one send_envelope() per envelope when the gateway has no bulk endpoint.
+
+    HTTP goes through one pooled keep-alive httpx.Client owned by the instance (built lazily from
+    ``transport``, rebuilt after fork); pass ``http_client`` to supply your own. close() releases it.
+    """
+    def __init__(self, gateway_url: str | None = None, sender_priv_b64: str | None = None, sender_kid: str | None = None,
+                 *, transport: TransportConfig | None = None, http_client: httpx.Client | None = None,
+                 store: ReceiptStore | None = None):
+        super().__init__(gateway_url, sender_priv_b64, sender_kid, store)
+        self._transport = transport or TransportConfig.from_env()
+        self._http = http_client
+        self._http_pid = os.getpid() if http_client is not None else None
+        self._http_lock = threading.Lock()
+
+    def _client(self) -> httpx.Client:
+        pid = os.getpid()
+        if self._http is None or self._http_pid != pid:
+            with self._http_lock:
+                if self._http is None or self._http_pid != pid:
+                    # A pool inherited across fork shares sockets with the parent; never reuse it.
+                    self._http = build_client(self._transport)
+                    self._http_pid = pid
+        return self._http
+
+    def _post(self, url: str, body: Any, kind: str = "envelope") -> httpx.Response:
+        with metrics.timed(_SEND, "gateway", kind, span="opp.send"):
+            return request(self._client(), "POST", url, self._transport, json=body)
+
+    def close(self) -> None:
+        if self._http is not None and self._http_pid == os.getpid():
+            self._http.close()
+        self._http = None
+
     def send_envelope(self, env: dict[str, Any]):  # best-effort POST
-        url = self.gateway_url.rstrip("/") + "/api/v1/envelopes"
+        if self.store is not None:
+            return {"status_code": self._store_envelopes([env])["status_code"]}
         try:
-            with httpx.Client(timeout=2.0) as c:
-                resp = c.post(url, json=env)
-                return {"status_code": resp.status_code}
-        except Exception:
+            resp = self._post(self._url("/api/v1/envelopes"), env)
+            return {"status_code": resp.status_code}
+        except Exception:  # noqa: BLE001 - documented best effort: a receipt never fails the stamped call
             return {"status_code": None}
+
+    def send_batch(self, envs: list[dict[str, Any]]):  # best-effort bulk POST
+        if self.store is not None:
+            return self._store_envelopes(envs, "batch")
+        if self._bulk_supported:
+            try:
+                resp = self._post(self._url("/api/v1/envelopes/batch"), {"envelopes": envs}, "batch")
+            except _NET_ERRORS:
+                return {"status_code": None, "count": len(envs)}
+            if resp.status_code not in (404, 405):
+                return {"status_code": resp.status_code, "count": len(envs)}
+            self._bulk_supported = False
+        codes = [self.send_envelope(env).get("status_code") for env in envs]
+        return self._batch_result(codes, len(envs))
+
+
+class AsyncOPEClient(_SigningClient):
+    """asyncio variant of OPEClient: same envelopes, awaitable non-blocking sends.
+
+    The pooled httpx.AsyncClient is bound to the event loop that first used it and is
+    rebuilt when called from a different loop (e.g. successive ``asyncio.run`` calls).
+    """
+    def __init__(self, gateway_url: str | None = None, sender_priv_b64: str | None = None, sender_kid: str | None = None,
+                 *, transport: TransportConfig | None = None, http_client: httpx.AsyncClient | None = None,
+                 store: ReceiptStore | None = None):
+        super().__init__(gateway_url, sender_priv_b64, sender_kid, store)
+        self._transport = transport or TransportConfig.from_env()
+        self._http = http_client
+        self._http_loop: asyncio.AbstractEventLoop | None = None
+        self._pinned = http_client is not None
+
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._http is None or (not self._pinned and self._http_loop is not loop):
+            self._http = build_async_client(self._transport)
+            self._http_loop = loop
+        return self._http
+
+    async def _post(self, url: str, body: Any, kind: str = "envelope") -> httpx.Response:
+        with metrics.timed(_SEND, "gateway", kind, span="opp.send"):
+            return await arequest(self._client(), "POST", url, self._transport, json=body)
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+        self._http = None
+
+    async def send_envelope(self, env: dict[str, Any]) -> dict[str, Any]:  # best-effort POST
+        if self.store is not None:  # local disk append: no network round trip to wait on
+            return {"status_code": self._store_envelopes([env])["status_code"]}
+        try:
+            resp = await self._post(self._url("/api/v1/envelopes"), env)
+            return {"status_code": resp.status_code}
+        except Exception:  # noqa: BLE001 - same best-effort contract as OPEClient.send_envelope
+            return {"status_code": None}
+
+    async def send_batch(self, envs: list[dict[str, Any]]) -> dict[str, Any]:  # best-effort bulk POST
+        if self.store is not None:
+            return self._store_envelopes(envs, "batch")
+        if self._bulk_supported:
+            try:
+                resp = await self._post(self._url("/api/v1/envelopes/batch"), {"envelopes": envs}, "batch")
+            except _NET_ERRORS:
+                return {"status_code": None, "count": len(envs)}
+            if resp.status_code not in (404, 405):
+                return {"status_code": resp.status_code, "count": len(envs)}
+            self._bulk_supported = False
+        results = await asyncio.gather(*(self.send_envelope(env) for env in envs))
+        return self._batch_result([r.get("status_code") for r in results], len(envs))
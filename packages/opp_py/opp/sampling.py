@@ -0,0 +1,272 @@
+"""Sampling and aggregation for ``@stamp`` on high-frequency functions.
+
+A stamped per-record transform called millions of times would emit two signed envelopes
+per call. Two knobs reduce that, per step:
+
+  - sampling: only a fraction of calls is stamped. ``by="call"`` decides per call at
+    random; ``by="trace"`` is head-based: the decision hashes ``(trace_id, step)``, so a
+    step is recorded for all of a trace or none of it, identically in every process.
+  - aggregation: calls are not stamped individually; each window of ``window`` seconds
+    (or ``max_calls`` calls) collapses into one ``phase: "aggregate"`` summary receipt:
+
+        {"step", "phase": "aggregate", "ts", "attrs", "window": {"start", "end"},
+         "count", "errors", "status": {"ok": n, "error": n, ...},
+         "latency_ms": {"min", "max", "mean", "p50", "p95", "p99", "total"},
+         "inputs_root", "inputs_count", "outputs_root", "outputs_count", "sample_rate"?}
+
+    ``inputs_root`` / ``outputs_root`` are ``merkle_root`` over the per-call input / output
+    CIDs (utf-8, in call order), so anyone holding a call's CIDs can check them against
+    the signed summary; they are present only when ``inputs`` / ``outputs`` are given.
+
+Both combine: sampled-in calls are aggregated, and the summary carries the sample rate.
+Windows are closed by the call after they expire, by a background thread (checking twice
+per window, at least every second) and at interpreter exit; ``flush_aggregates()`` closes
+them on demand.
+
+Environment (defaults for every ``@stamp``; its ``sample=`` / ``aggregate=`` win):
+  - OPP_SAMPLE_RATE: fraction of calls stamped (default 1)
+  - OPP_SAMPLE_RATES: per-step rates, ``step=rate,step=rate``
+  - OPP_SAMPLE_BY: ``call`` (default) or ``trace``
+  - OPP_AGGREGATE: per-step aggregation windows in seconds, ``step=seconds,...``
+  - OPP_AGGREGATE_MAX_CALLS: calls after which a window closes early (default 10000)
+"""
+from __future__ import annotations
+
+import atexit
+import datetime
+import hashlib
+import logging
+import math
+import os
+import random
+import threading
+import time
+import weakref
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field
+from typing import Any
+
+from .merkle import MerkleBuilder
+
+__all__ = ["SAMPLE_BY", "Aggregator", "SamplingPolicy", "flush_aggregates", "keep_call"]
+
+log = logging.getLogger(__name__)
+
+SAMPLE_BY = ("call", "trace")
+
+
+def _parse_map(spec: str, name: str) -> dict[str, float]:
+    out: dict[str, float] = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        step, sep, value = part.rpartition("=")
+        if not sep or not step.strip():
+            raise ValueError(f"{name}: expected step=value pairs, got {part!r}")
+        out[step.strip()] = float(value)
+    return out
+
+
+@dataclass(frozen=True)
+class SamplingPolicy:
+    """Per-step sample rates and aggregation windows (see module docstring)."""
+
+    rate: float = 1.0
+    rates: Mapping[str, float] = field(default_factory=dict)
+    by: str = "call"
+    windows: Mapping[str, float] = field(default_factory=dict)
+    max_calls: int = 10_000
+
+    def __post_init__(self) -> None:
+        if self.by not in SAMPLE_BY:
+            raise ValueError(f"unknown sampling mode {self.by!r} (expected one of {SAMPLE_BY})")
+        for r in (self.rate, *self.rates.values()):
+            if not 0.0 <= r <= 1.0:
+                raise ValueError(f"sample rates must be within [0, 1], got {r}")
+
+    @classmethod
+    def from_env(cls) -> SamplingPolicy:
+        return cls(
+            rate=float(os.getenv("OPP_SAMPLE_RATE") or 1.0),
+            rates=_parse_map(os.getenv("OPP_SAMPLE_RATES", ""), "OPP_SAMPLE_RATES"),
+            by=(os.getenv("OPP_SAMPLE_BY") or "call").lower(),
+            windows=_parse_map(os.getenv("OPP_AGGREGATE", ""), "OPP_AGGREGATE"),
+            max_calls=int(os.getenv("OPP_AGGREGATE_MAX_CALLS") or 10_000),
+        )
+
+    def rate_for(self, step: str) -> float:
+        return self.rates.get(step, self.rate)
+
+    def window_for(self, step: str) -> float | None:
+        return self.windows.get(step)
+
+
+def keep_call(rate: float, by: str, step: str, trace_id: str) -> bool:
+    """Whether a call of ``step`` is stamped at ``rate``."""
+    if rate >= 1.0:
+        return True
+    if rate <= 0.0:
+        return False
+    if by == "trace":
+        h = hashlib.sha256(f"{trace_id}|{step}".encode()).digest()
+        return int.from_bytes(h[:8], "big") < rate * 2.0 ** 64
+    return random.random() < rate
+
+
+def _iso(t: float) -> str:
+    return datetime.datetime.fromtimestamp(t, datetime.UTC).isoformat()
+
+
+def _pct(ordered: list[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class Aggregator:
+    """Collects the calls of one stamped step and turns each window into a summary payload.
+
+    ``record`` returns the summary of a window the call closed (or None); ``deliver``, when
+    given, is how the background thread and ``flush_aggregates`` emit summaries.
+    """
+
+    def __init__(self, step: str, window: float, *, max_calls: int = 10_000, attrs: Mapping[str, Any] | None = None,
+                 sample_rate: float = 1.0, deliver: Callable[[dict[str, Any]], None] | None = None,
+                 background: bool = True):
+        if window <= 0:
+            raise ValueError("aggregation window must be positive")
+        self.step = step
+        self.window = window
+        self.max_calls = max(1, max_calls)
+        self.attrs = dict(attrs or {})
+        self.sample_rate = sample_rate
+        self.deliver = deliver
+        self.background = background
+        self._lock = threading.Lock()
+        self._reset()
+        _register(self)
+
+    def _reset(self) -> None:
+        self._start: float | None = None
+        self._last = 0.0
+        self._latencies: list[float] = []
+        self._status: dict[str, int] = {}
+        self._inputs = MerkleBuilder()
+        self._outputs = MerkleBuilder()
+
+    def record(self, seconds: float, status: str, inputs_cid: str | None = None,
+               outputs_cid: str | None = None) -> dict[str, Any] | None:
+        if self.background and _ticker_pid != os.getpid():
+            _start_ticker()
+        now = time.time()
+        with self._lock:
+            closed = self._close() if self._start is not None and now - self._start >= self.window else None
+            if self._start is None:
+                self._start = now
+            self._last = now
+            self._latencies.append(seconds)
+            self._status[status] = self._status.get(status, 0) + 1
+            if inputs_cid is not None:
+                self._inputs.add(inputs_cid.encode("utf-8"))
+            if outputs_cid is not None:
+                self._outputs.add(outputs_cid.encode("utf-8"))
+            if closed is None and len(self._latencies) >= self.max_calls:
+                closed = self._close()
+        return closed
+
+    def flush(self, force: bool = False) -> dict[str, Any] | None:
+        """Summary of the open window if it has expired (or any non-empty one with ``force``)."""
+        with self._lock:
+            if self._start is None or not (force or time.time() - self._start >= self.window):
+                return None
+            return self._close()
+
+    def _close(self) -> dict[str, Any]:
+        assert self._start is not None
+        lat = sorted(self._latencies)
+        ms = 1000.0
+        summary: dict[str, Any] = {
+            "step": self.step,
+            "phase": "aggregate",
+            "ts": _iso(time.time()),
+            "attrs": self.attrs,
+            "window": {"start": _iso(self._start), "end": _iso(self._last), "seconds": self.window},
+            "count": len(lat),
+            "errors": len(lat) - self._status.get("ok", 0),
+            "status": dict(self._status),
+            "latency_ms": {
+                "min": lat[0] * ms, "max": lat[-1] * ms, "mean": sum(lat) / len(lat) * ms,
+                "p50": _pct(lat, 0.5) * ms, "p95": _pct(lat, 0.95) * ms, "p99": _pct(lat, 0.99) * ms,
+                "total": sum(lat) * ms,
+            },
+        }
+        for name, builder in (("inputs", self._inputs), ("outputs", self._outputs)):
+            if len(builder):
+                summary[f"{name}_root"] = builder.root()
+                summary[f"{name}_count"] = len(builder)
+        if self.sample_rate < 1.0:
+            summary["sample_rate"] = self.sample_rate
+        self._reset()
+        return summary
+
+    def emit_due(self, force: bool = False) -> None:
+        summary = self.flush(force)
+        if summary is not None and self.deliver is not None:
+            try:
+                self.deliver(summary)
+            except Exception:
+                log.exception("could not deliver aggregate receipt for %s", self.step)
+
+
+_aggregators: weakref.WeakSet[Aggregator] = weakref.WeakSet()
+_state_lock = threading.Lock()
+_ticker_pid: int | None = None
+_exit_hook = False
+
+
+def _register(agg: Aggregator) -> None:
+    global _exit_hook
+    with _state_lock:
+        _aggregators.add(agg)
+        if not _exit_hook:
+            # Registered after the sender's exit hook (atexit runs last-in first-out), so the
+            # final summaries are queued before the senders flush and stop.
+            atexit.register(flush_aggregates)
+            _exit_hook = True
+
+
+def _start_ticker() -> None:
+    global _ticker_pid
+    with _state_lock:
+        if _ticker_pid == os.getpid():
+            return
+        _ticker_pid = os.getpid()
+    threading.Thread(target=_tick, name="opp-aggregate", daemon=True).start()
+
+
+def _tick() -> None:
+    while True:
+        with _state_lock:
+            aggs = [a for a in _aggregators if a.background]
+        time.sleep(min([1.0] + [a.window / 2 for a in aggs]))
+        for agg in aggs:
+            agg.emit_due()
+
+
+def flush_aggregates() -> None:
+    """Close and deliver every open aggregation window now (registered with ``atexit``)."""
+    with _state_lock:
+        aggs = list(_aggregators)
+    for agg in aggs:
+        agg.emit_due(force=True)
+
+
+def _forget_after_fork() -> None:
+    # The child must not re-emit the parent's open windows; its ticker starts with its first call.
+    global _state_lock
+    _state_lock = threading.Lock()
+    for agg in list(_aggregators):
+        agg._lock = threading.Lock()
+        agg._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_after_fork)
@@ -0,0 +1,255 @@
+"""Background, batched envelope delivery for ``@stamp``.
+
+Instead of POSTing every receipt inline, ``stamp`` hands signed envelopes to a
+``BatchSender``: a bounded queue drained by worker thread(s) that group envelopes
+by size and time and deliver them through ``client.send_batch()``. Each client
+gets its own sender, so envelopes always leave through the client that signed
+them (its transport, headers and receipt store). Pending envelopes are flushed
+when the interpreter exits.
+
+Tunables (environment):
+  - OPP_SEND_MODE: ``background`` (default) or ``sync`` (inline send_envelope)
+  - OPP_SEND_BATCH_SIZE: max envelopes per bulk POST (default 100)
+  - OPP_SEND_FLUSH_MS: max time a batch waits to fill up (default 50)
+  - OPP_SEND_QUEUE_SIZE: queue bound; envelopes beyond it are dropped (default 10000)
+  - OPP_SEND_WORKERS: worker threads per client (default 1)
+  - OPP_SEND_EXIT_TIMEOUT: seconds spent flushing at exit (default 5)
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from collections.abc import Iterator
+from typing import Any, Protocol
+
+from . import metrics
+
+__all__ = ["BatchSender", "background_enabled", "get_sender", "shutdown_senders"]
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+_QUEUE_DEPTH = metrics.histogram("opp_sender_queue_depth", "Envelopes queued for background delivery, sampled at submit",
+                                 buckets=(0, 1, 10, 100, 1000, 10_000))
+_BATCH_SIZE = metrics.histogram("opp_sender_batch_size", "Envelopes per background delivery",
+                                buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+
+class BatchClient(Protocol):
+    gateway_url: str
+
+    def send_batch(self, envs: list[dict[str, Any]]) -> dict[str, Any]: ...
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, ""))
+    except ValueError:
+        return default
+
+
+def background_enabled() -> bool:
+    return os.getenv("OPP_SEND_MODE", "background").lower() != "sync"
+
+
+class BatchSender:
+    """Bounded queue + worker threads delivering envelopes in batches.
+
+    ``submit()`` never blocks: when the queue is full the envelope is dropped and
+    counted in ``dropped`` so that a stalled gateway cannot stall the caller.
+    """
+
+    def __init__(
+        self,
+        client: BatchClient,
+        *,
+        max_batch: int = 100,
+        flush_interval: float = 0.05,
+        max_queue: int = 10_000,
+        workers: int = 1,
+    ):
+        self._client = client
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = max(0.0, flush_interval)
+        self._q: queue.Queue[Any] = queue.Queue(maxsize=max(1, max_queue))
+        self._lock = threading.Lock()
+        self._closed = False
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._threads = [
+            threading.Thread(target=self._run, name=f"opp-sender-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for t in self._threads:
+            t.start()
+
+    @property
+    def gateway(self) -> str:
+        return self._client.gateway_url.rstrip("/")
+
+    @property
+    def pending(self) -> int:
+        return self._q.unfinished_tasks
+
+    def submit(self, env: dict[str, Any]) -> bool:
+        """Queue an envelope for delivery; returns False if it had to be dropped."""
+        if self._closed:
+            # Late receipts (e.g. emitted from other atexit hooks) go out inline.
+            self._deliver([env])
+            return True
+        if metrics.enabled():
+            metrics.observe(_QUEUE_DEPTH, self._q.qsize())
+        try:
+            self._q.put_nowait(env)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                first = self.dropped == 1
+            if first:
+                log.warning("OPP envelope queue full (%d); dropping receipts", self._q.maxsize)
+            return False
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until every queued envelope has been delivered (or given up on)."""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._q.all_tasks_done:
+            while self._q.unfinished_tasks:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._q.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout: float | None = 5.0) -> bool:
+        """Flush pending envelopes and stop the workers."""
+        if self._closed:
+            return True
+        flushed = self.flush(timeout)
+        self._closed = True
+        for _ in self._threads:
+            try:
+                self._q.put_nowait(_STOP)
+            except queue.Full:  # pragma: no cover - only when flush timed out
+                break
+        for t in self._threads:
+            t.join(0.1 if not flushed else timeout)
+        return flushed
+
+    def stats(self) -> dict[str, int]:
+        return {"sent": self.sent, "failed": self.failed, "dropped": self.dropped, "pending": self.pending}
+
+    def _run(self) -> None:
+        while True:
+            item = self._q.get()
+            if item is _STOP:
+                self._q.task_done()
+                return
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    nxt = self._q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+            metrics.observe(_BATCH_SIZE, len(batch))
+            try:
+                self._deliver(batch)
+            finally:
+                for _ in range(len(batch) + stop):
+                    self._q.task_done()
+            if stop:
+                return
+
+    def _deliver(self, batch: list[dict[str, Any]]) -> None:
+        try:
+            res = self._client.send_batch(batch)
+            code = res.get("status_code")
+            ok = code is not None and code < 400
+        except Exception:  # noqa: BLE001 - a failing client must not kill the worker; counted as failed
+            ok = False
+        with self._lock:
+            if ok:
+                self.sent += len(batch)
+            else:
+                self.failed += len(batch)
+
+
+# Keyed by client identity: a sender holds its client, so the id is not reused while registered.
+_senders: dict[int, BatchSender] = {}
+_senders_lock = threading.Lock()
+
+
+def get_sender(client: BatchClient) -> BatchSender:
+    """Return the sender bound to ``client``, starting it if needed."""
+    key = id(client)
+    sender = _senders.get(key)
+    if sender is not None:
+        return sender
+    with _senders_lock:
+        sender = _senders.get(key)
+        if sender is None:
+            sender = BatchSender(
+                client,
+                max_batch=_env_int("OPP_SEND_BATCH_SIZE", 100),
+                flush_interval=_env_int("OPP_SEND_FLUSH_MS", 50) / 1000.0,
+                max_queue=_env_int("OPP_SEND_QUEUE_SIZE", 10_000),
+                workers=_env_int("OPP_SEND_WORKERS", 1),
+            )
+            _senders[key] = sender
+        return sender
+
+
+def shutdown_senders(timeout: float | None = None) -> None:
+    """Flush and stop every sender (registered with ``atexit``)."""
+    if timeout is None:
+        timeout = float(_env_int("OPP_SEND_EXIT_TIMEOUT", 5))
+    with _senders_lock:
+        senders = list(_senders.values())
+        _senders.clear()
+    for s in senders:
+        s.close(timeout)
+
+
+def _collect() -> Iterator[metrics.Family]:
+    with _senders_lock:
+        senders = list(_senders.values())
+    if not senders:
+        return
+    by_gateway: dict[str, list[BatchSender]] = {}
+    for s in senders:
+        by_gateway.setdefault(s.gateway, []).append(s)
+    for name, kind, stat, help_ in (
+        ("opp_sender_sent_total", "counter", "sent", "Envelopes delivered by the background sender"),
+        ("opp_sender_failed_total", "counter", "failed", "Envelopes the background sender gave up on"),
+        ("opp_sender_dropped_total", "counter", "dropped", "Envelopes dropped because the sender queue was full"),
+        ("opp_sender_pending", "gauge", "pending", "Envelopes queued or in flight"),
+    ):
+        yield name, kind, help_, [({"gateway": gw}, float(sum(s.stats()[stat] for s in group)))
+                                  for gw, group in sorted(by_gateway.items())]
+
+
+def _forget_after_fork() -> None:
+    # Worker threads do not survive fork(); the child starts with a clean registry.
+    global _senders_lock
+    _senders.clear()
+    _senders_lock = threading.Lock()
+
+
+atexit.register(shutdown_senders)
+metrics.register_collector(_collect)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_after_fork)
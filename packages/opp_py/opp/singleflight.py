@@ -0,0 +1,52 @@
+"""Request coalescing: concurrent identical async calls share one in-flight execution.
+
+``await flights.do(key, fn)`` runs ``fn()`` unless a call with the same key is already
+running on this event loop, in which case it waits for that call's result (or
+exception). Waiters are shielded from each other: a cancelled caller does not cancel
+the shared work. Nothing is cached after completion; pair with ``opp.cache`` for that.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any, TypeVar
+
+__all__ = ["SingleFlight"]
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._inflight: dict[tuple[int, Hashable], asyncio.Future[Any]] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        loop = asyncio.get_running_loop()
+        k = (id(loop), key)
+        self.calls += 1
+        fut = self._inflight.get(k)
+        if fut is not None and not fut.done():
+            self.shared += 1
+        else:
+            fut = asyncio.ensure_future(fn())
+            self._inflight[k] = fut
+
+            def _forget(done: asyncio.Future[Any], k: tuple[int, Hashable] = k) -> None:
+                if self._inflight.get(k) is done:
+                    del self._inflight[k]
+                if not done.cancelled():
+                    done.exception()  # mark retrieved: every waiter may have gone away
+
+            fut.add_done_callback(_forget)
+        result: T = await asyncio.shield(fut)
+        return result
+
+    def pending(self, key: Hashable) -> bool:
+        """Whether a call for ``key`` is currently running on this event loop."""
+        fut = self._inflight.get((id(asyncio.get_running_loop()), key))
+        return fut is not None and not fut.done()
+
+    def stats(self) -> dict[str, int]:
+        return {"in_flight": len(self._inflight), "calls": self.calls, "shared": self.shared}
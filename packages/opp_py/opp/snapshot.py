@@ -0,0 +1,109 @@
+"""Saved analyzer state, so passports of growing traces fold in only the new hops.
+
+A training job's trace gains hops all the time while its passport is requested every few
+minutes. ``SnapshotStore`` keeps the last ``BundleAnalyzer.snapshot()`` per trace (last-wins
+metrics, OR-ed safety flags, steps, time range, dataset roots, policy decisions and
+breaches, plus the graph columns and validation state when those outputs were requested).
+``resume`` turns it back into an analyzer that skips the hops the snapshot already
+covers; see ``opp.analyzer`` for how the prefix is checked.
+
+Snapshots are keyed by ``(trace_id, scope)``; ``snapshot_scope`` builds the scope from the
+requested outputs and the hop source, so a gateway and a local store, or the passport and
+graph commands, never overwrite each other's snapshots. Like ``CheckpointStore`` the table
+lives in SQLite (WAL mode), shareable between the CLI and the exporter on a host.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+from .analyzer import ALL_OUTPUTS, BundleAnalyzer
+
+__all__ = ["SnapshotStore", "resume", "snapshot_scope"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    trace_id TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (trace_id, scope)
+)
+"""
+
+
+def snapshot_scope(outputs: Iterable[str], source: str = "") -> str:
+    return ",".join(sorted(outputs)) + "|" + source
+
+
+def resume(snapshot: Mapping[str, Any] | None, outputs: Iterable[str] = ALL_OUTPUTS) -> BundleAnalyzer:
+    """An analyzer continuing from ``snapshot`` if it was taken for the same outputs, else a fresh one."""
+    wanted = frozenset(outputs)
+    if snapshot is not None and frozenset(snapshot.get("outputs", ())) == wanted:
+        return BundleAnalyzer.from_snapshot(dict(snapshot))
+    return BundleAnalyzer(wanted)
+
+
+class SnapshotStore:
+    """SQLite-backed ``(trace_id, scope) -> analyzer snapshot`` table; safe to share between threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(_SCHEMA)
+
+    def get(self, trace_id: str, scope: str = "") -> dict[str, Any] | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state FROM snapshots WHERE trace_id = ? AND scope = ?", (trace_id, scope)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        state: dict[str, Any] = json.loads(row[0])
+        return state
+
+    def put(self, trace_id: str, snapshot: Mapping[str, Any], scope: str = "") -> None:
+        state = json.dumps(snapshot, separators=(",", ":"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO snapshots (trace_id, scope, count, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (trace_id, scope, int(snapshot["count"]), state, time.time()),
+            )
+
+    def delete(self, trace_id: str, scope: str | None = None) -> None:
+        with self._lock:
+            if scope is None:
+                self._db.execute("DELETE FROM snapshots WHERE trace_id = ?", (trace_id,))
+            else:
+                self._db.execute("DELETE FROM snapshots WHERE trace_id = ? AND scope = ?", (trace_id, scope))
+
+    def __len__(self) -> int:
+        with self._lock:
+            n: int = self._db.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+        return n
+
+    def stats(self) -> dict[str, Any]:
+        return {"path": self.path, "snapshots": len(self), "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self) -> SnapshotStore:  # noqa: PYI034
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
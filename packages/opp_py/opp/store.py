@@ -0,0 +1,450 @@
+"""Local receipt stores: keep receipts on disk and read chains back without a gateway.
+
+A store links envelopes into per-trace chains the way the gateway's export does: each
+stored hop is the envelope plus ``normalized`` (its payload), ``prev_receipt_hash`` and
+``receipt_hash``. The local ``receipt_hash`` is ``sha256("{prev}|{cid}|{trace_id}|{ts}|{signature}")``
+in hex, so it commits to the previous hop and, through the CID and signature, to the
+payload. Stored hops therefore feed ``BundleAnalyzer``, ``ReceiptVerifier`` and every
+CLI command unchanged.
+
+Backends:
+
+  - ``SQLiteReceiptStore``: one table with indexes on ``(trace_id, idx)``, ``step`` and
+    ``ts``; safe for several writer processes (appends take an immediate transaction).
+  - ``SegmentReceiptStore``: append-only NDJSON segment files rolled at
+    ``segment_bytes``, with in-memory trace/step/ts indexes rebuilt by scanning on open;
+    fastest appends, single writer process: the writer holds an exclusive lock on the
+    directory (``flock``), so a second writer (another process, a forked worker)
+    fails to open instead of truncating records still being appended. A ``readonly``
+    store (e.g. the exporter's) takes no lock and indexes the writer's newer appends
+    before every read.
+
+``open_store(url)`` accepts ``sqlite:///path.db`` and ``segments:///dir`` (or a bare
+path: ``*.db``/``*.sqlite``/``*.sqlite3`` is SQLite, anything else a segment directory).
+``OPEClient(store=...)`` or ``OPP_RECEIPT_STORE`` make ``send_envelope`` write to a store
+instead of POSTing to the gateway, and the CLI accepts a store URL wherever it takes
+``--gateway``.
+"""
+from __future__ import annotations
+
+import bisect
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+from .canonical import canonical, cid_of
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: no advisory lock, single writer by convention
+    fcntl = None  # type: ignore[assignment]
+
+__all__ = [
+    "STORE_SCHEMES", "ReceiptStore", "SQLiteReceiptStore", "SegmentReceiptStore", "is_store_url", "open_store",
+    "store_from_env",
+]
+
+STORE_SCHEMES = ("sqlite://", "segments://")
+
+
+def is_store_url(url: str | None) -> bool:
+    return bool(url) and str(url).startswith(STORE_SCHEMES)
+
+
+def _receipt_hash(prev: str | None, cid: Any, trace_id: Any, ts: Any, sig: Any) -> str:
+    return hashlib.sha256(f"{prev or ''}|{cid}|{trace_id}|{ts}|{sig or ''}".encode()).hexdigest()
+
+
+def _step(hop: dict[str, Any]) -> str | None:
+    norm = hop.get("normalized")
+    step = norm.get("step") if isinstance(norm, dict) else None
+    return step if isinstance(step, str) else None
+
+
+class ReceiptStore(ABC):
+    """Append envelopes, read per-trace chains and query by step / time range."""
+
+    url: str
+
+    @staticmethod
+    def link(env: dict[str, Any], prev: str | None) -> dict[str, Any]:
+        """The stored hop for ``env`` appended after ``prev`` (a receipt hash, None for the first hop)."""
+        payload = env.get("payload", env.get("normalized"))
+        cid = env.get("cid") or cid_of(payload)
+        hop = {**env, "normalized": payload}
+        if prev is not None:
+            hop["prev_receipt_hash"] = prev
+        hop["receipt_hash"] = _receipt_hash(prev, cid, env.get("trace_id"), env.get("ts"), env.get("signature"))
+        return hop
+
+    def append(self, env: dict[str, Any]) -> dict[str, Any]:
+        return self.append_many([env])[0]
+
+    @abstractmethod
+    def append_many(self, envs: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Link and store envelopes in order (one transaction / write); returns the stored hops."""
+
+    @abstractmethod
+    def iter_hops(self, trace_id: str, start: int = 0) -> Iterator[dict[str, Any]]:
+        """Hops of one trace in chain order, from index ``start``."""
+
+    @abstractmethod
+    def head(self, trace_id: str) -> tuple[int, str] | None:
+        """(hop count, last receipt_hash) of a trace, None if unknown; changes on every append."""
+
+    @abstractmethod
+    def traces(self) -> list[str]:
+        ...
+
+    @abstractmethod
+    def query(self, *, step: str | None = None, since: str | None = None, until: str | None = None,
+              trace_id: str | None = None, limit: int | None = None) -> Iterator[dict[str, Any]]:
+        """Hops matching every given filter (``since <= ts < until``, ISO-8601 strings)."""
+
+    def export(self, trace_id: str) -> dict[str, Any]:
+        """The trace as a gateway-style export bundle."""
+        return {"trace_id": trace_id, "chain": list(self.iter_hops(trace_id))}
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> ReceiptStore:  # noqa: PYI034
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS receipts (
+        seq INTEGER PRIMARY KEY,
+        trace_id TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        receipt_hash TEXT NOT NULL,
+        step TEXT,
+        ts TEXT,
+        body TEXT NOT NULL,
+        UNIQUE (trace_id, idx)
+    )""",
+    "CREATE INDEX IF NOT EXISTS receipts_step ON receipts (step, ts)",
+    "CREATE INDEX IF NOT EXISTS receipts_ts ON receipts (ts)",
+)
+
+
+class SQLiteReceiptStore(ReceiptStore):
+    def __init__(self, path: str, *, readonly: bool = False):
+        self.path = path
+        self.url = f"sqlite://{path}"
+        self._lock = threading.Lock()
+        if readonly:
+            self._db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False,
+                                       isolation_level=None, timeout=30.0)
+            return
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for stmt in _SCHEMA:
+            self._db.execute(stmt)
+
+    def _head(self, trace_id: str) -> tuple[int, str] | None:
+        row = self._db.execute(
+            "SELECT idx, receipt_hash FROM receipts WHERE trace_id = ? ORDER BY idx DESC LIMIT 1", (trace_id,)
+        ).fetchone()
+        return (row[0] + 1, row[1]) if row else None
+
+    def head(self, trace_id: str) -> tuple[int, str] | None:
+        with self._lock:
+            return self._head(trace_id)
+
+    def append_many(self, envs: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+        out: list[dict[str, Any]] = []
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")  # heads are read and extended under one write lock
+            try:
+                heads: dict[str, tuple[int, str] | None] = {}
+                rows = []
+                for env in envs:
+                    tid = str(env.get("trace_id"))
+                    if tid not in heads:
+                        heads[tid] = self._head(tid)
+                    head = heads[tid]
+                    hop = self.link(env, head[1] if head else None)
+                    idx = head[0] if head else 0
+                    heads[tid] = (idx + 1, hop["receipt_hash"])
+                    rows.append((tid, idx, hop["receipt_hash"], _step(hop), hop.get("ts"), canonical(hop).decode()))
+                    out.append(hop)
+                self._db.executemany(
+                    "INSERT INTO receipts (trace_id, idx, receipt_hash, step, ts, body) VALUES (?, ?, ?, ?, ?, ?)", rows
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return out
+
+    def _rows(self, sql: str, args: tuple[Any, ...]) -> Iterator[dict[str, Any]]:
+        with self._lock:
+            bodies = [r[0] for r in self._db.execute(sql, args)]
+        for body in bodies:
+            yield json.loads(body)
+
+    def iter_hops(self, trace_id: str, start: int = 0) -> Iterator[dict[str, Any]]:
+        return self._rows("SELECT body FROM receipts WHERE trace_id = ? AND idx >= ? ORDER BY idx", (trace_id, start))
+
+    def traces(self) -> list[str]:
+        with self._lock:
+            return [r[0] for r in self._db.execute("SELECT DISTINCT trace_id FROM receipts ORDER BY trace_id")]
+
+    def query(self, *, step: str | None = None, since: str | None = None, until: str | None = None,
+              trace_id: str | None = None, limit: int | None = None) -> Iterator[dict[str, Any]]:
+        where, args = [], []
+        for clause, value in (("step = ?", step), ("ts >= ?", since), ("ts < ?", until), ("trace_id = ?", trace_id)):
+            if value is not None:
+                where.append(clause)
+                args.append(value)
+        sql = "SELECT body FROM receipts" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY ts, seq"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self._rows(sql, tuple(args))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class SegmentReceiptStore(ReceiptStore):
+    _PREFIX = "segment-"
+    _LOCK = "writer.lock"
+
+    def __init__(self, directory: str, *, segment_bytes: int = 64 << 20, fsync: bool = False, readonly: bool = False):
+        self.directory = directory
+        self.readonly = readonly
+        self.url = f"segments://{directory}"
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # location = (segment number, byte offset, length)
+        self._by_trace: dict[str, list[tuple[int, int, int]]] = {}
+        self._heads: dict[str, str] = {}
+        self._by_step: dict[str, list[tuple[int, int, int]]] = {}
+        self._ts_keys: list[tuple[str, int]] = []  # (ts, position in self._locs), kept sorted
+        self._locs: list[tuple[str, tuple[int, int, int]]] = []  # (trace_id, location) in append order
+        self._readers: dict[int, Any] = {}
+        self._scanned: dict[int, int] = {}  # segment -> bytes indexed (complete lines only)
+        self._seg = 0
+        self._writer: Any = None
+        self._lockfile: Any = None
+        self._pid = os.getpid()
+        if not readonly:
+            self._take_writer_lock()
+        self._load()
+
+    def _take_writer_lock(self) -> None:
+        f = open(os.path.join(self.directory, self._LOCK), "a+")  # noqa: SIM115 - held until close()
+        if fcntl is not None:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.seek(0)
+                holder = f.read().strip() or "?"
+                f.close()
+                raise RuntimeError(
+                    f"receipt store {self.url} is already open for writing (pid {holder}); segment stores take "
+                    "one writer process: open it readonly, or use a sqlite:// store for several writers") from None
+        f.seek(0)
+        f.truncate()
+        f.write(str(self._pid))
+        f.flush()
+        self._lockfile = f
+
+    def _path(self, seg: int) -> str:
+        return os.path.join(self.directory, f"{self._PREFIX}{seg:06d}.ndjson")
+
+    def _index(self, hop: dict[str, Any], loc: tuple[int, int, int]) -> None:
+        tid = str(hop.get("trace_id"))
+        self._by_trace.setdefault(tid, []).append(loc)
+        self._heads[tid] = hop["receipt_hash"]
+        step = _step(hop)
+        if step is not None:
+            self._by_step.setdefault(step, []).append(loc)
+        pos = len(self._locs)
+        self._locs.append((tid, loc))
+        ts = hop.get("ts")
+        if isinstance(ts, str):
+            key = (ts, pos)
+            if self._ts_keys and key < self._ts_keys[-1]:
+                bisect.insort(self._ts_keys, key)
+            else:
+                self._ts_keys.append(key)
+
+    def _scan(self, seg: int) -> None:
+        """Index the complete lines of ``seg`` past what is already indexed."""
+        offset = self._scanned.get(seg, 0)
+        try:
+            f = open(self._path(seg), "rb")  # noqa: SIM115 - closed below
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn (or, for readers, in-progress) final write: ignored for now
+                self._index(json.loads(line), (seg, offset, len(line) - 1))
+                offset += len(line)
+        self._scanned[seg] = offset
+
+    def _load(self) -> None:
+        segs = sorted(int(n[len(self._PREFIX):-len(".ndjson")]) for n in os.listdir(self.directory)
+                      if n.startswith(self._PREFIX) and n.endswith(".ndjson"))
+        for seg in segs:
+            self._scan(seg)
+            self._seg = seg
+        self._seg = self._seg or 1
+        if self.readonly:
+            return  # never truncate: a live writer may be mid-line
+        self._writer = open(self._path(self._seg), "ab")  # noqa: SIM115 - held for the store's lifetime
+        valid = self._valid_size(self._seg)
+        if self._writer.seek(0, os.SEEK_END) != valid:
+            self._writer.truncate(valid)
+            self._writer.seek(0, os.SEEK_END)
+
+    def _valid_size(self, seg: int) -> int:
+        locs = [loc for _, loc in self._locs if loc[0] == seg]
+        return locs[-1][1] + locs[-1][2] + 1 if locs else 0
+
+    def _refresh(self) -> None:
+        """Read-only stores: index what another process appended since the last read (lock held)."""
+        if not self.readonly:
+            return
+        while True:
+            try:
+                grown = os.stat(self._path(self._seg)).st_size > self._scanned.get(self._seg, 0)
+            except FileNotFoundError:
+                grown = False
+            if grown:
+                self._scan(self._seg)
+            if not os.path.exists(self._path(self._seg + 1)):  # writers only ever roll forward
+                return
+            self._seg += 1
+
+    def head(self, trace_id: str) -> tuple[int, str] | None:
+        with self._lock:
+            self._refresh()
+            locs = self._by_trace.get(trace_id)
+            return (len(locs), self._heads[trace_id]) if locs else None
+
+    def append_many(self, envs: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+        if self._writer is None:
+            raise RuntimeError(f"receipt store {self.url} is read-only or closed")
+        if os.getpid() != self._pid:  # a forked child shares the parent's lock and file offsets
+            raise RuntimeError(f"receipt store {self.url} was opened by process {self._pid}; open it in this process")
+        out: list[dict[str, Any]] = []
+        with self._lock:
+            for env in envs:
+                if self._writer.tell() >= self.segment_bytes:
+                    self._writer.close()
+                    self._seg += 1
+                    self._writer = open(self._path(self._seg), "ab")  # noqa: SIM115
+                hop = self.link(env, self._heads.get(str(env.get("trace_id"))))
+                line = canonical(hop)
+                offset = self._writer.tell()
+                self._writer.write(line + b"\n")
+                self._index(hop, (self._seg, offset, len(line)))
+                out.append(hop)
+            self._writer.flush()
+            if self.fsync:
+                os.fsync(self._writer.fileno())
+        return out
+
+    def _read(self, loc: tuple[int, int, int]) -> dict[str, Any]:
+        seg, offset, length = loc
+        f = self._readers.get(seg)
+        if f is None:
+            f = self._readers[seg] = open(self._path(seg), "rb")  # noqa: SIM115
+        f.seek(offset)
+        hop: dict[str, Any] = json.loads(f.read(length))
+        return hop
+
+    def _read_all(self, locs: list[tuple[int, int, int]]) -> Iterator[dict[str, Any]]:
+        with self._lock:
+            hops = [self._read(loc) for loc in locs]
+        yield from hops
+
+    def iter_hops(self, trace_id: str, start: int = 0) -> Iterator[dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            locs = self._by_trace.get(trace_id, [])[start:]
+        return self._read_all(locs)
+
+    def traces(self) -> list[str]:
+        with self._lock:
+            self._refresh()
+            return sorted(self._by_trace)
+
+    def query(self, *, step: str | None = None, since: str | None = None, until: str | None = None,
+              trace_id: str | None = None, limit: int | None = None) -> Iterator[dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            lo = bisect.bisect_left(self._ts_keys, (since, -1)) if since is not None else 0
+            hi = bisect.bisect_left(self._ts_keys, (until, -1)) if until is not None else len(self._ts_keys)
+            positions: Iterable[int]
+            if since is None and until is None:
+                positions = range(len(self._locs))
+            else:
+                positions = sorted(pos for _, pos in self._ts_keys[lo:hi])
+            step_locs = set(self._by_step.get(step, ())) if step is not None else None
+            picked: list[tuple[int, int, int]] = []
+            for pos in positions:
+                tid, loc = self._locs[pos]
+                if (trace_id is None or tid == trace_id) and (step_locs is None or loc in step_locs):
+                    picked.append(loc)
+                    if limit is not None and len(picked) >= limit:
+                        break
+        return self._read_all(picked)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            if self._lockfile is not None:
+                self._lockfile.close()  # releases the flock
+                self._lockfile = None
+            for f in self._readers.values():
+                f.close()
+            self._readers.clear()
+
+
+def open_store(url: str, *, readonly: bool = False) -> ReceiptStore:
+    """Open the store for ``sqlite:///path.db``, ``segments:///dir`` or a bare path."""
+    if url.startswith("sqlite://"):
+        return SQLiteReceiptStore(url[len("sqlite://"):], readonly=readonly)
+    if url.startswith("segments://"):
+        return SegmentReceiptStore(url[len("segments://"):], readonly=readonly)
+    if url.endswith((".db", ".sqlite", ".sqlite3")):
+        return SQLiteReceiptStore(url, readonly=readonly)
+    return SegmentReceiptStore(url, readonly=readonly)
+
+
+_env_stores: dict[tuple[int, str], ReceiptStore] = {}
+_env_lock = threading.Lock()
+
+
+def store_from_env(url: str | None = None) -> ReceiptStore | None:
+    """Process-wide store for ``url`` (default ``OPP_RECEIPT_STORE``), None when unset."""
+    url = url or os.getenv("OPP_RECEIPT_STORE")
+    if not url:
+        return None
+    key = (os.getpid(), url)  # connections and file handles are never shared across fork
+    with _env_lock:
+        store = _env_stores.get(key)
+        if store is None:
+            store = _env_stores[key] = open_store(url)
+        return store
@@ -0,0 +1,195 @@
+"""Incremental parsing of export bundles.
+
+``/v1/receipts/export/{trace}`` returns one JSON object whose ``chain`` (or ``hops``)
+array can be hundreds of MB. The parser here consumes the body chunk by chunk and
+yields hops one at a time, so peak memory is one hop plus one network chunk rather
+than several copies of the whole bundle. Every other top-level field is collected
+into a ``meta`` dict (complete once iteration finishes).
+"""
+from __future__ import annotations
+
+import codecs
+import json
+import re
+from collections.abc import AsyncIterable, AsyncIterator, Iterable, Iterator
+from typing import Any
+
+from .analyzer import ALL_OUTPUTS, BundleAnalyzer
+
+__all__ = ["BundleParser", "aanalyze_stream", "aiter_bundle_hops", "analyze_stream", "iter_bundle_hops"]
+
+HOP_KEYS = ("chain", "hops")
+
+_WS = re.compile(r"[ \t\n\r]*")
+_NUM_TAIL = re.compile(r"[0-9.eE+\-]*")  # what may still follow a number's decoded prefix
+_DECODER = json.JSONDecoder()
+
+
+class BundleParser:
+    """Push parser: ``feed()`` text/bytes, get back the hops completed so far.
+
+    Values are decoded with ``json``'s C ``raw_decode``. A value that is cut off at the
+    end of the buffer is retried only once the unparsed tail has doubled; incoming chunks
+    are held aside until then, which keeps copying and re-parsing of very large hops
+    linear overall.
+    """
+
+    def __init__(self, hop_keys: tuple[str, ...] = HOP_KEYS):
+        self.hop_keys = hop_keys
+        self.meta: dict[str, Any] = {}
+        self.hop_key: str | None = None
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._pending: list[str] = []
+        self._pending_len = 0
+        self._state = "start"
+        self._key: str | None = None
+        self._retry_at = 0
+        self._eof = False
+
+    def feed(self, data: bytes | str) -> list[dict[str, Any]]:
+        text = self._utf8.decode(data) if isinstance(data, bytes) else data
+        self._pending.append(text)
+        self._pending_len += len(text)
+        if len(self._buf) - self._pos + self._pending_len < self._retry_at:
+            return []  # still inside a value too large to be worth re-parsing yet
+        return self._parse()
+
+    def close(self) -> list[dict[str, Any]]:
+        self._pending.append(self._utf8.decode(b"", final=True))
+        self._eof = True
+        hops = self._parse()
+        if self._state != "done":
+            raise ValueError("truncated export bundle")
+        if _WS.match(self._buf, self._pos).end() != len(self._buf):  # type: ignore[union-attr]
+            raise ValueError("unexpected data after export bundle")
+        return hops
+
+    def _skip_ws(self) -> bool:
+        self._pos = _WS.match(self._buf, self._pos).end()  # type: ignore[union-attr]
+        return self._pos < len(self._buf)
+
+    def _value(self) -> tuple[bool, Any]:
+        """Decode the JSON value at the cursor; (False, None) when more data is needed."""
+        buf, pos = self._buf, self._pos
+        try:
+            value, end = _DECODER.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if self._eof:
+                raise
+            self._retry_at = 2 * (len(buf) - pos)
+            return False, None
+        if type(value) in (int, float):
+            # a number cut at the buffer edge may continue, also after its decoded prefix: "1." + "5", "1e" + "3"
+            edge = _NUM_TAIL.match(buf, end).end()  # type: ignore[union-attr]
+        else:
+            edge = end
+        if edge == len(buf) and not self._eof:
+            self._retry_at = len(buf) - pos + 1
+            return False, None
+        self._retry_at = 0
+        self._pos = end
+        return True, value
+
+    def _expect(self, ch: str) -> None:
+        if self._buf[self._pos] != ch:
+            raise ValueError(f"expected {ch!r} at offset {self._pos} of export bundle")
+        self._pos += 1
+
+    def _parse(self) -> list[dict[str, Any]]:
+        # join pending chunks once per parse (not per feed) and drop the consumed prefix
+        self._buf = self._buf[self._pos:] + "".join(self._pending)
+        self._pos = 0
+        self._pending.clear()
+        self._pending_len = 0
+        hops: list[dict[str, Any]] = []
+        while self._skip_ws():
+            st = self._state
+            if st == "start":
+                self._expect("{")
+                self._state = "key"
+            elif st == "key":
+                ch = self._buf[self._pos]
+                if ch == "}":
+                    self._pos += 1
+                    self._state = "done"
+                elif ch == ",":
+                    self._pos += 1
+                else:
+                    ok, key = self._value()
+                    if not ok:
+                        break
+                    if not isinstance(key, str):
+                        raise ValueError("export bundle keys must be strings")
+                    self._key = key
+                    self._state = "colon"
+            elif st == "colon":
+                self._expect(":")
+                self._state = "value"
+            elif st == "value":
+                if self._key in self.hop_keys and self.hop_key is None and self._buf[self._pos] == "[":
+                    self.hop_key = self._key
+                    self._pos += 1
+                    self._state = "hops"
+                    continue
+                ok, value = self._value()
+                if not ok:
+                    break
+                self.meta[self._key or ""] = value
+                self._state = "key"
+            elif st == "hops":
+                ch = self._buf[self._pos]
+                if ch == "]":
+                    self._pos += 1
+                    self._state = "key"
+                elif ch == ",":
+                    self._pos += 1
+                else:
+                    ok, hop = self._value()
+                    if not ok:
+                        break
+                    hops.append(hop)
+            else:  # done
+                break
+        return hops
+
+
+def iter_bundle_hops(chunks: Iterable[bytes | str], meta: dict[str, Any] | None = None) -> Iterator[dict[str, Any]]:
+    """Yield hops from a chunked bundle body; top-level fields are copied into ``meta``."""
+    parser = BundleParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+    if meta is not None:
+        meta.update(parser.meta)
+
+
+async def aiter_bundle_hops(chunks: AsyncIterable[bytes | str],
+                            meta: dict[str, Any] | None = None) -> AsyncIterator[dict[str, Any]]:
+    parser = BundleParser()
+    async for chunk in chunks:
+        for hop in parser.feed(chunk):
+            yield hop
+    for hop in parser.close():
+        yield hop
+    if meta is not None:
+        meta.update(parser.meta)
+
+
+def analyze_stream(chunks: Iterable[bytes | str], outputs: Iterable[str] = ALL_OUTPUTS) -> BundleAnalyzer:
+    """Run a ``BundleAnalyzer`` over a chunked bundle body without materializing it."""
+    meta: dict[str, Any] = {}
+    analyzer = BundleAnalyzer(outputs).feed_all(iter_bundle_hops(chunks, meta))
+    analyzer.set_meta(meta)
+    return analyzer
+
+
+async def aanalyze_stream(chunks: AsyncIterable[bytes | str],
+                          outputs: Iterable[str] = ALL_OUTPUTS) -> BundleAnalyzer:
+    meta: dict[str, Any] = {}
+    analyzer = BundleAnalyzer(outputs)
+    async for hop in aiter_bundle_hops(chunks, meta):
+        analyzer.feed(hop)
+    analyzer.set_meta(meta)
+    return analyzer
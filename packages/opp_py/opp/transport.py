@@ -0,0 +1,194 @@
+"""Shared HTTP transport: pooled keep-alive httpx clients with retry/backoff.
+
+Clients built here are meant to be long-lived (one per OPEClient / CLI process /
+exporter app) so TCP and TLS handshakes are amortized across requests.
+
+Environment overrides (see ``TransportConfig.from_env``):
+  - OPP_HTTP_MAX_CONNECTIONS (default 20), OPP_HTTP_MAX_KEEPALIVE (default 10)
+  - OPP_HTTP_KEEPALIVE_EXPIRY seconds (default 30)
+  - OPP_HTTP2=1 to negotiate HTTP/2 (needs ``pip install 'httpx[http2]'``)
+  - OPP_HTTP_RETRIES (default 2), OPP_HTTP_BACKOFF seconds (default 0.1)
+
+Idempotent methods (GET, HEAD, OPTIONS, PUT, DELETE) are retried on any transport error
+and on 429/502/503/504. Other methods (the envelope POSTs) are retried only when the
+request cannot have been processed: connect-phase errors (the request never left the
+client) and 429/503 responses carrying ``Retry-After``. A read timeout or a 502/504 after
+a POST may mean the gateway already stored the receipts, so it is not resent.
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import os
+import time
+from dataclasses import dataclass, replace
+from typing import Any
+
+import httpx
+
+__all__ = [
+    "IDEMPOTENT_METHODS", "RETRY_STATUSES", "TransportConfig", "aopen_stream", "arequest", "build_async_client",
+    "build_client", "open_stream", "request",
+]
+
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# Raised before the request was sent: safe to retry whatever the method.
+_UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, ""))
+    except ValueError:
+        return default
+
+
+@dataclass(frozen=True)
+class TransportConfig:
+    timeout: float = 2.0
+    max_connections: int = 20
+    max_keepalive: int = 10
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+    retries: int = 2
+    backoff: float = 0.1
+    backoff_max: float = 2.0
+
+    @classmethod
+    def from_env(cls, **overrides: Any) -> TransportConfig:
+        cfg = cls(
+            max_connections=int(_env_float("OPP_HTTP_MAX_CONNECTIONS", cls.max_connections)),
+            max_keepalive=int(_env_float("OPP_HTTP_MAX_KEEPALIVE", cls.max_keepalive)),
+            keepalive_expiry=_env_float("OPP_HTTP_KEEPALIVE_EXPIRY", cls.keepalive_expiry),
+            http2=os.getenv("OPP_HTTP2", "").lower() in ("1", "true", "yes"),
+            retries=int(_env_float("OPP_HTTP_RETRIES", cls.retries)),
+            backoff=_env_float("OPP_HTTP_BACKOFF", cls.backoff),
+        )
+        return replace(cfg, **overrides)
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def use_http2(self) -> bool:
+        # httpx raises at construction time when h2 is missing; degrade to HTTP/1.1 instead.
+        return self.http2 and importlib.util.find_spec("h2") is not None
+
+    def delay(self, attempt: int, resp: httpx.Response | None = None) -> float:
+        if resp is not None:
+            retry_after = resp.headers.get("retry-after", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return min(self.backoff * (2.0 ** attempt), self.backoff_max)
+
+
+def _retry_error(method: str, exc: httpx.TransportError) -> bool:
+    return method.upper() in IDEMPOTENT_METHODS or isinstance(exc, _UNSENT_ERRORS)
+
+
+def _retry_status(method: str, resp: httpx.Response) -> bool:
+    if resp.status_code not in RETRY_STATUSES:
+        return False
+    if method.upper() in IDEMPOTENT_METHODS:
+        return True
+    # Refused without being processed, and the server said when to come back.
+    return resp.status_code in (429, 503) and "retry-after" in resp.headers
+
+
+def build_client(cfg: TransportConfig | None = None) -> httpx.Client:
+    cfg = cfg or TransportConfig.from_env()
+    return httpx.Client(timeout=cfg.timeout, limits=cfg.limits(), http2=cfg.use_http2())
+
+
+def build_async_client(cfg: TransportConfig | None = None) -> httpx.AsyncClient:
+    cfg = cfg or TransportConfig.from_env()
+    return httpx.AsyncClient(timeout=cfg.timeout, limits=cfg.limits(), http2=cfg.use_http2())
+
+
+def request(client: httpx.Client, method: str, url: str, cfg: TransportConfig | None = None,
+            **kwargs: Any) -> httpx.Response:
+    """Issue a request, retrying transport errors and 429/502/503/504 with exponential backoff.
+
+    Non-idempotent methods are retried only when safe (see module docstring).
+    """
+    cfg = cfg or TransportConfig()
+    attempt = 0
+    while True:
+        try:
+            resp = client.request(method, url, **kwargs)
+        except httpx.TransportError as exc:
+            if attempt >= cfg.retries or not _retry_error(method, exc):
+                raise
+            time.sleep(cfg.delay(attempt))
+        else:
+            if attempt >= cfg.retries or not _retry_status(method, resp):
+                return resp
+            time.sleep(cfg.delay(attempt, resp))
+        attempt += 1
+
+
+async def arequest(client: httpx.AsyncClient, method: str, url: str, cfg: TransportConfig | None = None,
+                   **kwargs: Any) -> httpx.Response:
+    """Async counterpart of ``request``."""
+    cfg = cfg or TransportConfig()
+    attempt = 0
+    while True:
+        try:
+            resp = await client.request(method, url, **kwargs)
+        except httpx.TransportError as exc:
+            if attempt >= cfg.retries or not _retry_error(method, exc):
+                raise
+            await asyncio.sleep(cfg.delay(attempt))
+        else:
+            if attempt >= cfg.retries or not _retry_status(method, resp):
+                return resp
+            await asyncio.sleep(cfg.delay(attempt, resp))
+        attempt += 1
+
+
+def open_stream(client: httpx.Client, method: str, url: str, cfg: TransportConfig | None = None,
+                **kwargs: Any) -> httpx.Response:
+    """Like ``request`` but returns once headers arrive, leaving the body unread.
+
+    Retries only happen before any body bytes are consumed. The caller must ``close()``
+    the response (or iterate it to the end).
+    """
+    cfg = cfg or TransportConfig()
+    attempt = 0
+    while True:
+        try:
+            resp = client.send(client.build_request(method, url, **kwargs), stream=True)
+        except httpx.TransportError as exc:
+            if attempt >= cfg.retries or not _retry_error(method, exc):
+                raise
+            time.sleep(cfg.delay(attempt))
+        else:
+            if attempt >= cfg.retries or not _retry_status(method, resp):
+                return resp
+            resp.close()
+            time.sleep(cfg.delay(attempt, resp))
+        attempt += 1
+
+
+async def aopen_stream(client: httpx.AsyncClient, method: str, url: str, cfg: TransportConfig | None = None,
+                       **kwargs: Any) -> httpx.Response:
+    """Async counterpart of ``open_stream``; the caller must ``await resp.aclose()``."""
+    cfg = cfg or TransportConfig()
+    attempt = 0
+    while True:
+        try:
+            resp = await client.send(client.build_request(method, url, **kwargs), stream=True)
+        except httpx.TransportError as exc:
+            if attempt >= cfg.retries or not _retry_error(method, exc):
+                raise
+            await asyncio.sleep(cfg.delay(attempt))
+        else:
+            if attempt >= cfg.retries or not _retry_status(method, resp):
+                return resp
+            await resp.aclose()
+            await asyncio.sleep(cfg.delay(attempt, resp))
+        attempt += 1
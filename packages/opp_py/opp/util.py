@@ -2,19 +2,19 @@ from __future__ import annotations
 
 import base64
 import datetime
-import hashlib
-import json
-from typing import Any
+import os
 
+from .canonical import canonical, cid_of
 
-def b64u(b: bytes) -> str:
-    return base64.urlsafe_b64encode(b).decode().rstrip("=")
+__all__ = ["b64u", "canonical", "cid_of", "env_trace_id", "utcnow"]
 
-def canonical(obj: Any) -> bytes:
-    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
 
-def cid_of(obj: Any) -> str:
-    return "sha256:" + hashlib.sha256(canonical(obj)).hexdigest()
+def b64u(b: bytes) -> str:
+    return base64.urlsafe_b64encode(b).decode().rstrip("=")
 
 def utcnow() -> str:
     return datetime.datetime.now(datetime.UTC).isoformat()
+
+def env_trace_id() -> str:
+    """Trace id of receipts created without an explicit one (``OPP_TRACE_ID`` / ``ODIN_TRACE_ID``)."""
+    return os.getenv("OPP_TRACE_ID") or os.getenv("ODIN_TRACE_ID") or "opp-trace"
@@ -0,0 +1,286 @@
+"""Deep (per-receipt) verification of export bundles.
+
+Every hop is checked the way ``OPEClient.create_envelope`` produced it: the payload's
+CID is recomputed (``payload``, falling back to ``normalized``) and compared with the
+hop's ``cid``, then the Ed25519 ``signature`` over ``"{cid}|{trace_id}|{ts}"`` is
+verified with the sender key. Keys come from ``trusted`` (kid -> raw 32-byte key, e.g.
+``keys_from_jwks``) and, unless ``allow_embedded=False``, from the hop's
+``sender.jwk``; embedded keys prove integrity but not who signed.
+
+``ReceiptVerifier`` accepts hops one at a time (so it can sit next to ``BundleAnalyzer``
+on a streamed bundle), submits them to a thread or process pool in chunks, and keeps
+only failures. Verified (message, signature, key) triples are memoized per process, so
+re-validating a trace skips the Ed25519 work for receipts already seen. Across
+processes and runs, a ``PrefixTracker`` built from an ``opp.checkpoint`` checkpoint
+lets the verifier skip a previously validated chain prefix altogether.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import os
+import threading
+from collections import OrderedDict, deque
+from collections.abc import Iterable, Mapping, Sequence
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+from .canonical import cid_of
+from .checkpoint import CheckpointStore, PrefixTracker
+
+__all__ = ["ReceiptVerifier", "key_scope", "keys_from_jwks", "verify_hops"]
+
+_MEMO_SIZE = 1 << 17
+_memo: OrderedDict[bytes, None] = OrderedDict()
+_keys: dict[bytes, Ed25519PublicKey] = {}
+_memo_lock = threading.Lock()
+
+# (index, receipt_hash, payload, claimed_cid, trace_id, ts, signature_b64u, key_raw)
+_Task = tuple[int, Any, Any, Any, Any, Any, str, bytes]
+
+
+def _b64u_decode(s: str) -> bytes:
+    return base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+
+
+def keys_from_jwks(jwks: Mapping[str, Any]) -> dict[str, bytes]:
+    """Trusted sender keys (kid -> raw Ed25519 public key) from a JWKS document."""
+    out: dict[str, bytes] = {}
+    for jwk in jwks.get("keys", []):
+        if jwk.get("kty", "OKP") == "OKP" and jwk.get("crv", "Ed25519") == "Ed25519" and jwk.get("kid"):
+            out[jwk["kid"]] = _b64u_decode(jwk["x"])
+    return out
+
+
+def key_scope(trusted: Mapping[str, bytes] | None, allow_embedded: bool = True) -> str:
+    """Fingerprint of a key policy, so checkpoints are only reused under the same keys."""
+    if not trusted:
+        return "embedded" if allow_embedded else "none"
+    h = hashlib.sha256(b"embedded" if allow_embedded else b"trusted-only")
+    for kid in sorted(trusted):
+        h.update(b"|%s=%s" % (kid.encode(), trusted[kid]))
+    return h.hexdigest()[:32]
+
+
+def _signature_ok(message: bytes, sig_b64u: str, key_raw: bytes) -> bool:
+    memo_key = hashlib.sha256(b"%d:%s|%s|%s" % (len(message), message, sig_b64u.encode(), key_raw)).digest()
+    if memo_key in _memo:
+        return True
+    try:
+        key = _keys.get(key_raw)
+        if key is None:
+            if len(_keys) > 1024:
+                _keys.clear()
+            key = _keys[key_raw] = Ed25519PublicKey.from_public_bytes(key_raw)
+        key.verify(_b64u_decode(sig_b64u), message)
+    except (InvalidSignature, ValueError):
+        return False
+    with _memo_lock:
+        _memo[memo_key] = None
+        if len(_memo) > _MEMO_SIZE:
+            _memo.popitem(last=False)
+    return True
+
+
+def _verify_chunk(tasks: list[_Task]) -> tuple[int, list[dict[str, Any]]]:
+    failures: list[dict[str, Any]] = []
+    for idx, rh, payload, claimed, trace_id, ts, sig, key_raw in tasks:
+        cid = cid_of(payload)
+        if claimed and claimed != cid:
+            failures.append({"index": idx, "receipt_hash": rh, "error": "cid_mismatch", "cid": cid})
+        elif not _signature_ok(f"{cid}|{trace_id}|{ts}".encode(), sig, key_raw):
+            failures.append({"index": idx, "receipt_hash": rh, "error": "bad_signature"})
+    return len(tasks), failures
+
+
+class ReceiptVerifier:
+    """Streaming deep verifier; ``feed()`` hops, then read ``result()``.
+
+    ``executor`` is ``"thread"``, ``"process"`` (CID recomputation is pure Python and
+    GIL-bound, so large bundles verify fastest in processes) or an existing ``Executor``.
+    With ``workers <= 1`` chunks are verified inline. Hops that ``prefix`` reports as
+    inside its checkpoint are counted as ``skipped``; if ``result()["checkpoint"]`` is
+    not ``"matched"`` they were not verified and the chain must be re-run without it.
+    """
+
+    def __init__(
+        self,
+        *,
+        trusted: Mapping[str, bytes] | None = None,
+        allow_embedded: bool = True,
+        trace_id: str | None = None,
+        workers: int | None = 1,
+        executor: str | Executor = "thread",
+        chunk_size: int = 2048,
+        max_failures: int = 100,
+        prefix: PrefixTracker | None = None,
+    ):
+        self.trusted = dict(trusted or {})
+        self.allow_embedded = allow_embedded
+        self.trace_id = trace_id
+        self.chunk_size = chunk_size
+        self.max_failures = max_failures
+        self.prefix = prefix
+        self.count = 0
+        self.verified = 0
+        self.skipped = 0
+        self.failure_count = 0
+        self.failures: list[dict[str, Any]] = []
+        self._chunk: list[_Task] = []
+        self._pending: deque[Future[tuple[int, list[dict[str, Any]]]]] = deque()
+        self._embedded: dict[str, bytes] = {}
+        self._own_pool = False
+        self._pool: Executor | None = None
+        if isinstance(executor, Executor):
+            self._pool = executor
+            self._max_pending = 2 * (workers or os.cpu_count() or 1)
+        else:
+            workers = workers or os.cpu_count() or 1
+            self._max_pending = 2 * workers
+            if workers > 1:
+                if executor == "process":
+                    self._pool = ProcessPoolExecutor(max_workers=workers)
+                elif executor == "thread":
+                    self._pool = ThreadPoolExecutor(max_workers=workers)
+                else:
+                    raise ValueError(f"unknown executor {executor!r} (expected 'thread' or 'process')")
+                self._own_pool = True
+
+    @property
+    def scope(self) -> str:
+        return key_scope(self.trusted, self.allow_embedded)
+
+    def _fail(self, failures: Iterable[dict[str, Any]]) -> None:
+        for f in failures:
+            self.failure_count += 1
+            if len(self.failures) < self.max_failures:
+                self.failures.append(f)
+
+    def _key(self, hop: Mapping[str, Any]) -> bytes | None:
+        sender = hop.get("sender") or {}
+        kid = sender.get("kid") or hop.get("kid")
+        if kid in self.trusted:
+            return self.trusted[kid]
+        jwk = sender.get("jwk") if self.allow_embedded else None
+        if isinstance(jwk, Mapping) and isinstance(jwk.get("x"), str):
+            x = jwk["x"]
+            raw = self._embedded.get(x)
+            if raw is None:
+                try:
+                    raw = self._embedded[x] = _b64u_decode(x)
+                except ValueError:
+                    return None
+            return raw
+        return None
+
+    def feed(self, hop: Mapping[str, Any]) -> None:
+        idx = self.count
+        self.count += 1
+        if self.prefix is not None and self.prefix.feed(hop):
+            self.skipped += 1
+            return
+        rh = hop.get("receipt_hash")
+        payload = hop["payload"] if "payload" in hop else hop.get("normalized")
+        sig = hop.get("signature") or hop.get("sig")
+        if payload is None:
+            self._fail([{"index": idx, "receipt_hash": rh, "error": "missing_payload"}])
+            return
+        if not isinstance(sig, str):
+            self._fail([{"index": idx, "receipt_hash": rh, "error": "missing_signature"}])
+            return
+        key = self._key(hop)
+        if key is None:
+            self._fail([{"index": idx, "receipt_hash": rh, "error": "unknown_key"}])
+            return
+        claimed = hop.get("cid") or hop.get("payload_cid")
+        trace_id = hop.get("trace_id") or self.trace_id
+        self._chunk.append((idx, rh, payload, claimed, trace_id, hop.get("ts"), sig, key))
+        if len(self._chunk) >= self.chunk_size:
+            self._submit()
+
+    def feed_all(self, hops: Iterable[Mapping[str, Any]]) -> ReceiptVerifier:
+        for hop in hops:
+            self.feed(hop)
+        return self
+
+    def _collect(self, fut: Future[tuple[int, list[dict[str, Any]]]]) -> None:
+        n, failures = fut.result()
+        self.verified += n - len(failures)
+        self._fail(failures)
+
+    def _submit(self) -> None:
+        chunk, self._chunk = self._chunk, []
+        if not chunk:
+            return
+        if self._pool is None:
+            n, failures = _verify_chunk(chunk)
+            self.verified += n - len(failures)
+            self._fail(failures)
+            return
+        self._pending.append(self._pool.submit(_verify_chunk, chunk))
+        while len(self._pending) > self._max_pending:  # bound memory held by queued chunks
+            self._collect(self._pending.popleft())
+
+    def result(self) -> dict[str, Any]:
+        """Finish outstanding chunks and summarize (failures sorted by hop index)."""
+        self._submit()
+        try:
+            while self._pending:
+                self._collect(self._pending.popleft())
+        finally:
+            self.close()
+        self.failures.sort(key=lambda f: f["index"])
+        out: dict[str, Any] = {
+            "ok": self.failure_count == 0,
+            "count": self.count,
+            "verified": self.verified,
+            "skipped": self.skipped,
+            "failure_count": self.failure_count,
+            "failures": self.failures,
+        }
+        if self.prefix is not None:
+            checkpoint = out["checkpoint"] = self.prefix.summary()
+            out["ok"] = out["ok"] and checkpoint["status"] != "mismatch"
+        return out
+
+    def close(self) -> None:
+        if self._own_pool and self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+def verify_hops(hops: Iterable[Mapping[str, Any]], *, checkpoints: CheckpointStore | None = None,
+                **kwargs: Any) -> dict[str, Any]:
+    """Deep-verify every hop; keyword arguments as for ``ReceiptVerifier``.
+
+    With ``checkpoints`` (and a ``trace_id``) the prefix verified by an earlier call is
+    skipped, the whole chain is re-verified if that prefix changed, and a fully verified
+    chain is checkpointed for next time.
+    """
+    trace_id = kwargs.get("trace_id")
+    if checkpoints is None or not trace_id:
+        return ReceiptVerifier(**kwargs).feed_all(hops).result()
+    seq = hops if isinstance(hops, Sequence) else list(hops)
+    scope = key_scope(kwargs.get("trusted"), kwargs.get("allow_embedded", True))
+    checkpoint = checkpoints.get(trace_id, scope)
+    tracker = PrefixTracker(checkpoint)
+    res = ReceiptVerifier(prefix=tracker, **kwargs).feed_all(seq).result()
+    if res["checkpoint"]["status"] == "mismatch":  # history changed since the checkpoint
+        tracker = PrefixTracker(None)
+        res = ReceiptVerifier(prefix=tracker, **kwargs).feed_all(seq).result()
+        res["checkpoint"]["status"] = "mismatch"
+    if res["ok"]:
+        checkpoints.record(trace_id, tracker, scope)
+    return res
+
+
+def _reset_after_fork() -> None:
+    global _memo_lock
+    _memo_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
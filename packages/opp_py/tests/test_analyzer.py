@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import pytest
+from opp.analyzer import BundleAnalyzer
+from opp.graph import build_graph_from_bundle, to_passport
+
+
+def _bundle() -> dict:
+    chain = [
+        {"trace_id": "tA", "receipt_hash": "h1", "ts": "2024-01-01T00:00:00Z",
+         "normalized": {"step": "ingest.v1", "model_id": "m-1",
+                        "dataset": {"chunks": [{"cid": "c1"}, {"cid": "c2"}]},
+                        "safety": {"nsfw": False}}},
+        {"trace_id": "tA", "receipt_hash": "h2", "prev_receipt_hash": "h1",
+         "normalized": {"step": "train.v1", "metrics": {"loss": 0.5},
+                        "policy": {"engine": "opa", "decisions": [{"rule": "r", "outcome": "allow"}]}}},
+        {"trace_id": "tA", "receipt_hash": "h3", "prev_receipt_hash": "h2", "ts": "2024-01-01T00:01:00Z",
+         "normalized": {"step": "train.v1", "metrics": {"loss": 0.1}, "safety": {"nsfw": True},
+                        "policy": {"engine": "opa", "decisions": [{"rule": "d", "result": "DENY"}]}}},
+    ]
+    return {"chain": chain, "bundle_cid": "sha256:b"}
+
+
+def test_all_outputs_in_one_pass_match_legacy_functions():
+    bundle = _bundle()
+    res = BundleAnalyzer.analyze(bundle).results()
+    graph = build_graph_from_bundle(bundle)
+    assert res["graph"] == graph
+    assert res["passport"] == to_passport(graph, bundle)
+    assert res["passport"]["trace_id"] == "tA"
+    assert res["passport"]["metrics"] == {"loss": 0.1} and res["passport"]["safety_flags"] == {"nsfw": True}
+    assert res["policy"]["breach_count"] == 1 and res["policy"]["engines"] == ["opa"]
+    assert res["validation"] == {"ok": True, "count": 3, "break_at": None}
+
+
+def test_outputs_are_opt_in():
+    a = BundleAnalyzer.analyze(_bundle(), outputs={"policy"})
+    assert a.nodes == [] and a.dataset_roots == []
+    assert set(a.results()) == {"policy"}
+    with pytest.raises(RuntimeError):
+        a.graph()
+    with pytest.raises(ValueError):
+        BundleAnalyzer(outputs={"nope"})
+
+
+def test_streamed_feed_and_chain_break():
+    bundle = _bundle()
+    bundle["chain"][2]["prev_receipt_hash"] = "WRONG"
+    a = BundleAnalyzer(outputs={"validation", "graph"})
+    for hop in bundle["chain"]:
+        a.feed(hop)
+    assert a.validation() == {"ok": False, "count": 3, "break_at": 2}
+    assert a.graph()["edges"][-1] == {"from": "h2", "to": "h3", "type": "link"}
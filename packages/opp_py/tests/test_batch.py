@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from opp import batch as opp_batch
+from opp import cli as opp_cli
+from opp.batch import arun_batch, iter_trace_ids, process_bundle
+
+
+def _bundle(trace: str) -> dict:
+    chain = [
+        {"trace_id": trace, "receipt_hash": "r1", "ts": "2024-01-01T00:00:00Z", "normalized": {"step": "ingest.v1"}},
+        {"trace_id": trace, "receipt_hash": "r2", "prev_receipt_hash": "bad" if "broken" in trace else "r1",
+         "ts": "2024-01-01T00:00:10Z",
+         "normalized": {"step": "train.v1", "policy": {"engine": "opa", "decisions": [{"rule": "r", "outcome": "deny"}]}}},
+    ]
+    return {"trace_id": trace, "chain": chain}
+
+
+class Gateway:
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.paths: list[str] = []
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.paths.append(request.url.path)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.active -= 1
+        trace = request.url.path.rsplit("/", 1)[-1]
+        if trace.startswith("missing"):
+            return httpx.Response(404)
+        if trace.startswith("malformed"):  # a hop whose "normalized" is a list
+            return httpx.Response(200, json={"trace_id": trace, "chain": [{"receipt_hash": "r1", "normalized": []}]})
+        if request.url.path.startswith("/validate/"):
+            return httpx.Response(200, json={"ok": "broken" not in trace, "trace": trace})
+        return httpx.Response(200, json=_bundle(trace))
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+
+
+def _collect(traces, command, **kw) -> list[dict]:
+    async def main():
+        return [item async for item in arun_batch(traces, command, **kw)]
+
+    return asyncio.run(main())
+
+
+def test_iter_trace_ids_skips_blanks_and_comments():
+    assert list(iter_trace_ids(["a\n", "\n", "# note\n", "  b  \n"])) == ["a", "b"]
+
+
+def test_gateway_batch_is_concurrent_and_bounded():
+    gw = Gateway()
+    traces = [f"t{i}" for i in range(20)] + ["t-broken", "missing-1"]
+    out = _collect(traces, "validate", gateway="http://gw", concurrency=5, executor="thread", workers=2,
+                   client=gw.client())
+    by_id = {o["trace_id"]: o for o in out}
+    assert len(out) == len(traces) and set(by_id) == set(traces)
+    assert 1 < gw.peak <= 5
+    assert by_id["t3"] == {"trace_id": "t3", "ok": True, "result": {"ok": True, "count": 2, "break_at": None}}
+    assert by_id["t-broken"]["ok"] is False and by_id["t-broken"]["result"]["break_at"] == 1
+    assert by_id["missing-1"]["ok"] is False and "404" in by_id["missing-1"]["error"]
+
+
+def test_gateway_batch_commands_match_single_trace_output():
+    gw = Gateway()
+    [graph] = _collect(["g1"], "graph", gateway="http://gw", executor="thread", client=gw.client())
+    assert graph["result"]["graph"]["count"] == 2
+    [pol] = _collect(["p1"], "policy", gateway="http://gw", executor="thread", client=gw.client())
+    assert pol["result"]["breach_count"] == 1 and pol["result"]["trace_id"] == "p1"
+    [pp] = _collect(["p2"], "passport", gateway="http://gw", workers=2, executor="process", client=gw.client())
+    assert pp["ok"] and pp["result"]["receipts"] == 2
+
+
+def test_api_batch_and_argument_errors():
+    gw = Gateway()
+    out = _collect(["a1", "a-broken"], "validate", api="http://api", options={"deep": True}, client=gw.client())
+    assert sorted((o["trace_id"], o["ok"]) for o in out) == [("a-broken", False), ("a1", True)]
+    assert all(p.startswith("/validate/") for p in gw.paths)
+    with pytest.raises(ValueError):
+        _collect(["x"], "nope", gateway="http://gw")
+    with pytest.raises(ValueError):
+        _collect(["x"], "graph")
+
+
+def test_malformed_bundle_is_an_error_line_not_a_crash():
+    gw = Gateway()
+    for command in ("graph", "passport", "policy"):  # validate only reads the hash links
+        out = _collect(["malformed-1", "t1"], command, gateway="http://gw", executor="thread", client=gw.client())
+        by_id = {o["trace_id"]: o for o in out}
+        assert by_id["t1"]["ok"] is True, command
+        bad = by_id["malformed-1"]
+        assert bad["ok"] is False and bad["error"].startswith("AttributeError"), (command, bad)
+
+
+def test_process_bundle_deep_reports_missing_signatures():
+    body = json.dumps(_bundle("d1")).encode()
+    out = process_bundle("validate", body, "d1", {"deep": True})
+    assert out["ok"] is False and out["result"]["deep"]["failure_count"] == 2
+
+
+def test_cli_batch_streams_ndjson_and_summary(monkeypatch, capsys, tmp_path):
+    gw = Gateway()
+    monkeypatch.setattr(opp_batch, "build_async_client", lambda cfg: gw.client())
+    ids = tmp_path / "ids.txt"
+    ids.write_text("t1\n# skip\nt2\n\nt-broken\n")
+    with pytest.raises(SystemExit) as e:
+        opp_cli.batch(command="validate", traces=None, from_file=str(ids), gateway="http://gw", api=None,
+                      concurrency=2, workers=1, executor="thread", deep=False, keys=None, trusted_only=False,
+                      checkpoint_db=None)
+    captured = capsys.readouterr()
+    lines = [json.loads(line) for line in captured.out.splitlines()]
+    assert sorted(line["trace_id"] for line in lines) == ["t-broken", "t1", "t2"]
+    summary = json.loads(captured.err)["summary"]
+    assert (summary["total"], summary["ok"], summary["failed"], summary["errors"]) == (3, 2, 1, 0)
+    assert e.value.code == 2
+
+    with pytest.raises(SystemExit) as e:
+        opp_cli.batch(command="graph", traces=["t1", "missing-2"], from_file=None, gateway="http://gw", api=None,
+                      concurrency=2, workers=1, executor="thread", deep=False, keys=None, trusted_only=False,
+                      checkpoint_db=None)
+    assert e.value.code == 1 and json.loads(capsys.readouterr().err)["summary"]["errors"] == 1
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from opp.cache import TTLCache
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_lru_eviction_and_stats():
+    c = TTLCache(maxsize=2, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1  # a becomes most recent
+    c.set("c", 3)  # evicts b
+    assert "b" not in c and c.get("c") == 3
+    assert c.get("missing", "dflt") == "dflt"
+    st = c.stats()
+    assert st["size"] == 2 and st["evictions"] == 1
+    assert st["hits"] == 2 and st["misses"] == 1 and st["hit_ratio"] == round(2 / 3, 4)
+
+
+def test_ttl_expiry_and_per_entry_ttl():
+    clock = Clock()
+    c = TTLCache(maxsize=10, ttl=5, clock=clock)
+    c.set("short", 1, ttl=1)
+    c.set("long", 2)
+    clock.now += 2
+    assert c.get("short") is None and c.get("long") == 2
+    clock.now += 10
+    assert c.get("long") is None
+    assert c.stats()["expirations"] == 2 and len(c) == 0
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    clock = Clock()
+    c1 = TTLCache(maxsize=1, ttl=30, disk_dir=str(tmp_path), clock=clock)
+    c1.set("k1", {"graph": {"count": 2}})
+    c1.set("k2", [1, 2])  # k1 leaves memory but stays on disk
+    assert c1.get("k1") == {"graph": {"count": 2}} and c1.disk_hits == 1
+
+    c2 = TTLCache(maxsize=4, ttl=30, disk_dir=str(tmp_path), clock=clock)
+    assert c2.get("k2") == [1, 2] and c2.stats()["disk_hits"] == 1
+    clock.now += 31
+    c3 = TTLCache(maxsize=4, ttl=30, disk_dir=str(tmp_path), clock=clock)
+    assert c3.get("k1") is None  # expired on disk too
+
+
+def test_disk_tier_skips_unserializable_and_pop(tmp_path):
+    c = TTLCache(maxsize=4, disk_dir=str(tmp_path))
+    c.set("obj", object())  # kept in memory only
+    assert c.get("obj") is not None
+    assert not any(p.name.endswith(".json") for p in tmp_path.iterdir())
+    c.set("x", 1)
+    assert c.pop("x") == 1 and c.get("x") is None
+    assert c.pop("x") is None
+
+
+def test_zero_size_disables():
+    c = TTLCache(maxsize=0)
+    c.set("a", 1)
+    assert c.get("a") is None and len(c) == 0
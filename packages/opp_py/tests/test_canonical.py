@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import enum
+import hashlib
+import json
+import random
+
+import pytest
+from opp import canonical as cmod
+
+# (object, canonical bytes): the frozen wire format every CID depends on.
+GOLDEN = [
+    (None, b"null"),
+    (True, b"true"),
+    ({"b": 1, "a": 2}, b'{"a":2,"b":1}'),
+    ({"z": {"y": [3, {"b": None, "a": False}]}}, b'{"z":{"y":[3,{"a":false,"b":null}]}}'),
+    ((1, 2), b"[1,2]"),
+    ([], b"[]"),
+    ({}, b"{}"),
+    ("é✓\U0001f600", '"é✓\U0001f600"'.encode()),
+    ({"é": 1, "e": 2, "\U0001f600": 3, "￿": 4}, '{"e":2,"é":1,"￿":4,"\U0001f600":3}'.encode()),
+    ("\"\\/\b\f\n\r\t\x00\x1f\x7f ", '"\\"\\\\/\\b\\f\\n\\r\\t\\u0000\\u001f\x7f "'.encode()),
+    (0.1, b"0.1"),
+    ([1e16, 1e-05, 1e300, 5e-324, -0.0, 3.0], b"[1e+16,1e-05,1e+300,5e-324,-0.0,3.0]"),
+    ({"x": 1.2345678901234568e16}, b'{"x":1.2345678901234568e+16}'),
+    ([float("nan"), float("inf"), -float("inf")], b"[NaN,Infinity,-Infinity]"),
+    ({"n": None, "v": float("nan")}, b'{"n":null,"v":NaN}'),
+    (2**64, b"18446744073709551616"),
+    ([2**63 - 1, -(2**63)], b"[9223372036854775807,-9223372036854775808]"),
+    ({2: "b", 1: "a"}, b'{"1":"a","2":"b"}'),
+    ({"s": "1e5,", "t": ":1.50]"}, b'{"s":"1e5,","t":":1.50]"}'),
+]
+
+
+class _Str(str):
+    pass
+
+
+class _Color(enum.IntEnum):
+    RED = 1
+
+
+SUBCLASSES = [({"k": _Str("v")}, b'{"k":"v"}'), ([_Color.RED], b"[1]"), ({_Str("b"): 1, "a": 2}, b'{"a":2,"b":1}')]
+
+
+def _backends() -> list[str]:
+    names = ["stdlib"]
+    if cmod.orjson is not None:
+        names.append("orjson")
+    return names
+
+
+@pytest.fixture(params=_backends())
+def backend(request):
+    prev = cmod.backend()
+    cmod.set_backend(request.param)
+    yield request.param
+    cmod.set_backend(prev)
+
+
+@pytest.mark.parametrize("obj,expected", GOLDEN + SUBCLASSES)
+def test_golden_vectors(backend, obj, expected):
+    assert cmod.canonical(obj) == expected
+    assert b"".join(cmod.iter_canonical(obj, chunk_size=4)) == expected
+    assert cmod.cid_of(obj) == cmod.cid_of(obj, stream=True) == "sha256:" + hashlib.sha256(expected).hexdigest()
+
+
+def _random_obj(rng: random.Random, depth: int = 0):
+    kind = rng.randrange(9 if depth < 4 else 6)
+    if kind == 0:
+        return rng.choice([None, True, False])
+    if kind == 1:
+        return rng.randint(-(2**70), 2**70) if rng.random() < 0.1 else rng.randint(-1000, 1000)
+    if kind == 2:
+        return rng.choice([rng.random(), rng.uniform(-1e20, 1e20), 10 ** rng.uniform(-30, 30), 1.5, 100.0])
+    if kind in (3, 4, 5):
+        return "".join(rng.choice('ab"\\\n\x01é✓\U0001f600 ,:[]1e.') for _ in range(rng.randrange(8)))
+    if kind in (6, 7):
+        return [_random_obj(rng, depth + 1) for _ in range(rng.randrange(5))]
+    return {str(rng.randrange(50)) + rng.choice("ké\U0001f600"): _random_obj(rng, depth + 1)
+            for _ in range(rng.randrange(5))}
+
+
+def test_backends_agree_on_random_documents(backend):
+    rng = random.Random(1234)
+    for _ in range(500):
+        obj = _random_obj(rng)
+        ref = json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        assert cmod.canonical(obj) == ref
+
+
+def test_errors_match_stdlib(backend):
+    with pytest.raises(TypeError):
+        cmod.canonical({"x": object()})
+    with pytest.raises(TypeError):
+        cmod.canonical({1: "a", "b": 2})  # mixed key types cannot be sorted
+    with pytest.raises(UnicodeEncodeError):
+        cmod.canonical("\ud800")
+
+
+def test_set_backend_validation():
+    with pytest.raises(ValueError):
+        cmod.set_backend("simdjson")
+    prev = cmod.backend()
+    assert cmod.set_backend("stdlib") == "stdlib"
+    cmod.set_backend(prev)
+
+
+def test_util_and_shim_use_shared_canonical():
+    from opp import util
+    assert util.canonical is cmod.canonical and util.cid_of is cmod.cid_of
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import hashlib
+import json
+
+from opp.analyzer import BundleAnalyzer
+from opp.chain import ReceiptChain
+from opp.graph import build_graph_from_bundle
+
+
+def _hops(n: int) -> list[dict]:
+    formats = ("2024-01-01T00:00:{:02d}Z", "2024-01-01T00:00:{:02d}.123456+00:00", "2024-01-01T00:00:{:02d}.250Z")
+    return [{"receipt_hash": hashlib.sha256(str(i).encode()).hexdigest(),
+             "ts": formats[i % 3].format(i), "normalized": {"step": f"s{i % 2}"}} for i in range(n)]
+
+
+def test_graph_matches_dict_graph_and_is_compact():
+    hops = _hops(30)
+    chain = ReceiptChain.from_hops(hops)
+    assert chain.graph() == build_graph_from_bundle({"chain": hops})
+    assert chain.steps == ["s0", "s1"] and chain.ts(1) == hops[1]["ts"]
+    assert chain.nbytes == 45 * 30
+
+
+def test_values_without_compact_form_round_trip():
+    odd = [
+        {"receipt_hash": "r1", "ts": "2024-01-01T02:00:00+02:00", "normalized": {"step": None}},
+        {"receipt_hash": "AB" * 32, "ts": None, "normalized": {"step": {"name": "x"}}},
+        {"receipt_hash": None, "ts": "yesterday", "normalized": {}},
+        {"receipt_hash": "ab" * 32, "ts": "2024-01-01T00:00:00.1Z", "normalized": {"step": 7}},
+    ]
+    hops = _hops(3) + odd
+    expected = build_graph_from_bundle({"chain": hops})
+    chain = ReceiptChain.from_hops(hops)
+    assert chain.graph() == expected
+    restored = ReceiptChain.from_dict(json.loads(json.dumps(chain.to_dict())))
+    assert restored.graph() == expected and restored.steps == chain.steps
+
+
+def test_analyzer_keeps_graph_columnar():
+    hops = _hops(5)
+    a = BundleAnalyzer(outputs={"graph"}).feed_all(hops)
+    assert len(a.chain) == 5 and a.edges[0] == {"from": hops[0]["receipt_hash"], "to": hops[1]["receipt_hash"],
+                                                "type": "link"}
+    assert BundleAnalyzer(outputs={"passport"}).feed_all(hops).chain.nbytes == 0
+    assert ReceiptChain().graph() == {"nodes": [], "edges": [], "count": 0}
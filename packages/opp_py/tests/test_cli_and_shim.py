@@ -42,10 +42,20 @@ def fake_get():
     return calls, _fake
 
 
+def _use_getter(monkeypatch, getter) -> None:
+    """Serve ``getter`` both as whole-JSON ``_get`` and as a chunked streaming body."""
+    def _iter_body(url: str):
+        body = json.dumps(getter(url)).encode()
+        return [body[i:i + 7] for i in range(0, len(body), 7)]
+
+    monkeypatch.setattr(opp_cli, "_get", getter)
+    monkeypatch.setattr(opp_cli, "_iter_body", _iter_body)
+
+
 def test_cli_graph_api(monkeypatch, capsys, fake_get):
     calls, getter = fake_get
-    monkeypatch.setattr(opp_cli, "_get", getter)
-    opp_cli.graph(trace="t1", api="http://api")
+    _use_getter(monkeypatch, getter)
+    opp_cli.graph(trace="t1", api="http://api", fmt="json")
     out = capsys.readouterr().out
     assert '"hello": "world"' in out
     assert any("/graph/" in c for c in calls)
@@ -53,8 +63,8 @@ def test_cli_graph_api(monkeypatch, capsys, fake_get):
 
 def test_cli_graph_gateway(monkeypatch, capsys, fake_get):
     calls, getter = fake_get
-    monkeypatch.setattr(opp_cli, "_get", getter)
-    opp_cli.graph(trace="t2", gateway="http://gw", api=None)
+    _use_getter(monkeypatch, getter)
+    opp_cli.graph(trace="t2", gateway="http://gw", api=None, fmt="json")
     out = capsys.readouterr().out
     # Should include graph with count
     assert '"graph"' in out and '"count": 2' in out, out
@@ -63,12 +73,12 @@ def test_cli_graph_gateway(monkeypatch, capsys, fake_get):
 
 def test_cli_graph_missing_params():
     with pytest.raises(typer.BadParameter):
-        opp_cli.graph(trace="t", api=None, gateway=None)  # type: ignore[arg-type]
+        opp_cli.graph(trace="t", api=None, gateway=None, fmt="json")  # type: ignore[arg-type]
 
 
 def test_cli_validate_api_ok(monkeypatch, capsys, fake_get):
     calls, getter = fake_get
-    monkeypatch.setattr(opp_cli, "_get", getter)
+    _use_getter(monkeypatch, getter)
     with pytest.raises(SystemExit) as exc:  # capture exit code
         opp_cli.validate(trace="t3", api="http://api", gateway="http://ignored")
     assert exc.value.code == 0
@@ -87,9 +97,9 @@ def test_cli_validate_gateway_bad_chain(monkeypatch, capsys, fake_get):
             d["chain"][1]["prev_receipt_hash"] = "WRONG"
         return d
 
-    monkeypatch.setattr(opp_cli, "_get", getter_bad)
+    _use_getter(monkeypatch, getter_bad)
     with pytest.raises(SystemExit) as exc:
-        opp_cli.validate(trace="t4", gateway="http://gw", api=None)
+        opp_cli.validate(trace="t4", gateway="http://gw", api=None, deep=False)
     assert exc.value.code == 2, capsys.readouterr().out
     out = capsys.readouterr().out
     assert '"ok": false' in out
@@ -97,11 +107,11 @@ def test_cli_validate_gateway_bad_chain(monkeypatch, capsys, fake_get):
 
 def test_cli_passport_and_policy(monkeypatch, capsys, fake_get):
     calls, getter = fake_get
-    monkeypatch.setattr(opp_cli, "_get", getter)
+    _use_getter(monkeypatch, getter)
     # passport with file output
     with tempfile.TemporaryDirectory() as td:
         out_file = os.path.join(td, "passport.json")
-        opp_cli.passport(trace="t5", gateway="http://gw", out=out_file)
+        opp_cli.passport(trace="t5", gateway="http://gw", out=out_file, fmt="json", snapshot_db=None)
         content = open(out_file, "r", encoding="utf-8").read()
         assert '"trace_id": "t5"' in content
     # clear any prior stdout (e.g., 'Wrote ...')
@@ -130,33 +140,29 @@ def test_odin_shim_create_and_send_success(monkeypatch):
         status_code = 202
 
     class DummyClient(types.SimpleNamespace):
-        def __enter__(self):
-            return self
-        def __exit__(self, *a):
-            return False
-        def post(self, url, json):  # noqa: A003 - shadow ok
-            self.last = (url, json)
+        def request(self, method, url, json):
+            self.last = (method, url, json)
             return DummyResp()
 
-    monkeypatch.setattr(odin_shim, "httpx", types.SimpleNamespace(Client=DummyClient))
-    client = odin_shim.OPEClient(gateway_url="http://gw")
+    http = DummyClient()
+    client = odin_shim.OPEClient(gateway_url="http://gw", http_client=http)
     env = client.create_envelope({"foo": "bar"}, "evt", "target")
     assert env["payload"]["foo"] == "bar"
     res = client.send_envelope(env)
     assert res["status_code"] == 202
+    # the same pooled client serves every send
+    client.send_envelope(env)
+    assert http.last[:2] == ("POST", "http://gw/api/v1/envelopes")
 
 
 def test_odin_shim_send_failure(monkeypatch):
     os.environ["OPP_SENDER_PRIV_B64"] = _seed_b64u()
 
     class BadClient:
-        def __enter__(self):
+        def request(self, *a, **kw):
             raise RuntimeError("network down")
-        def __exit__(self, *a):
-            return False
 
-    monkeypatch.setattr(odin_shim, "httpx", types.SimpleNamespace(Client=BadClient))
-    client = odin_shim.OPEClient(gateway_url="http://gw")
+    client = odin_shim.OPEClient(gateway_url="http://gw", http_client=BadClient())
     env = client.create_envelope({"x": 1}, "evt", "tgt")
     res = client.send_envelope(env)
     assert res["status_code"] is None
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import base64
+
+import pytest
+from opp import decorators as dec
+
+
+def _seed(b: int) -> str:
+    return base64.urlsafe_b64encode(bytes([b]) * 32).decode().rstrip("=")
+
+
+@pytest.fixture(autouse=True)
+def _clean_cache(monkeypatch):
+    for k in ["ODIN_SENDER_PRIV_B64", "ODIN_SENDER_KID", "OPP_SENDER_KID"]:
+        monkeypatch.delenv(k, raising=False)
+    dec.reset_client_cache()
+    yield
+    dec.reset_client_cache()
+
+
+def test_client_is_cached_per_env(monkeypatch):
+    monkeypatch.setenv("OPP_SENDER_PRIV_B64", _seed(4))
+    c1 = dec._get_client(None)
+    assert dec._get_client(None) is c1
+    monkeypatch.setenv("OPP_SENDER_KID", "other")
+    c2 = dec._get_client(None)
+    assert c2 is not c1 and c2.sender_kid == "other"
+    monkeypatch.setenv("OPP_SENDER_PRIV_B64", _seed(5))
+    assert dec._get_client(None) is not c2
+
+
+def test_explicit_client_bypasses_cache(monkeypatch):
+    monkeypatch.setenv("OPP_SENDER_PRIV_B64", _seed(4))
+    sentinel = object()
+    assert dec._get_client(sentinel) is sentinel  # type: ignore[arg-type]
+
+
+def test_cache_reset_and_fork(monkeypatch):
+    monkeypatch.setenv("OPP_SENDER_PRIV_B64", _seed(6))
+    c1 = dec._get_client(None)
+    dec.reset_client_cache()
+    c2 = dec._get_client(None)
+    assert c2 is not c1
+    monkeypatch.setattr(dec, "_cache_pid", -1)  # as seen from a forked child
+    assert dec._get_client(None) is not c2
+
+
+def test_async_client_cached_separately(monkeypatch):
+    monkeypatch.setenv("OPP_SENDER_PRIV_B64", _seed(7))
+    sync_client = dec._get_client(None)
+    async_client = dec._get_async_client(None)
+    assert async_client is not sync_client
+    assert dec._get_async_client(None) is async_client and dec._get_client(None) is sync_client
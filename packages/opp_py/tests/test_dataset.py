@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import json
+import os
+
+import pytest
+from opp import cli as opp_cli
+from opp.dataset import ChunkCache, Chunker, chunk_file, dataset_manifest
+from opp.graph import _collect_dataset_roots
+from opp.merkle import merkle_root
+
+
+@pytest.fixture()
+def corpus(tmp_path):
+    d = tmp_path / "corpus"
+    (d / "sub").mkdir(parents=True)
+    (d / "a.bin").write_bytes(os.urandom(10_000))
+    (d / "sub" / "b.bin").write_bytes(os.urandom(2_500))
+    (d / "empty.bin").write_bytes(b"")
+    return d
+
+
+def test_fixed_chunks_match_bytes(corpus):
+    data = (corpus / "a.bin").read_bytes()
+    chunks = chunk_file(str(corpus / "a.bin"), Chunker(4096))
+    assert [c["size"] for c in chunks] == [4096, 4096, 1808]
+    import hashlib
+    assert chunks[1]["cid"] == "sha256:" + hashlib.sha256(data[4096:8192]).hexdigest()
+    assert chunk_file(str(corpus / "empty.bin"), Chunker(4096)) == []
+
+
+def test_cdc_boundaries_cover_file_and_resync():
+    import random
+    rnd = random.Random(1)
+    base = bytes(rnd.getrandbits(8) for _ in range(60_000))
+    ch = Chunker(2048, cdc=True)
+    mv = memoryview(base)
+    spans = list(ch.boundaries(mv))
+    assert sum(n for _, n in spans) == len(base)
+    assert all(n <= ch.max_size for _, n in spans)
+    # inserting bytes at the front only disturbs the first boundaries
+    shifted = list(ch.boundaries(memoryview(b"xyz" + base)))
+    tail = {base[o:o + n] for o, n in spans[3:]}
+    assert len(tail & {(b"xyz" + base)[o:o + n] for o, n in shifted}) >= len(tail) - 1
+
+
+def test_manifest_root_matches_passport_derivation(corpus):
+    m = dataset_manifest([str(corpus)], chunker=Chunker(4096))
+    assert [f["path"] for f in m["files"]] == ["a.bin", "empty.bin", "sub/b.bin"]
+    assert m["root"] == merkle_root([c["cid"].encode() for c in m["chunks"]])
+    bundle = {"chain": [{"normalized": {"dataset": m}}]}
+    assert _collect_dataset_roots(bundle) == [m["root"]]
+
+
+def test_cache_skips_unchanged_files(corpus, tmp_path):
+    cache_path = str(tmp_path / "cache" / "chunks.json")
+    first = dataset_manifest([str(corpus)], chunker=Chunker(4096), cache=ChunkCache(cache_path))
+    cache = ChunkCache(cache_path)
+    again = dataset_manifest([str(corpus)], chunker=Chunker(4096), cache=cache, workers=2)
+    assert again == first and cache.hits == 3 and cache.misses == 0
+    (corpus / "sub" / "b.bin").write_bytes(b"changed")
+    cache = ChunkCache(cache_path)
+    changed = dataset_manifest([str(corpus)], chunker=Chunker(4096), cache=cache)
+    assert cache.misses == 1 and changed["root"] != first["root"]
+    # a different chunker never reuses entries
+    cache = ChunkCache(cache_path)
+    dataset_manifest([str(corpus)], chunker=Chunker(1024), cache=cache)
+    assert cache.hits == 0
+
+
+def test_cli_dataset_root(corpus, tmp_path, capsys):
+    out = tmp_path / "manifest.json"
+    opp_cli.dataset_root(paths=[str(corpus)], chunk_size=4096, cdc=False, cache=None, workers=1, out=str(out))
+    summary = json.loads(capsys.readouterr().out)
+    manifest = json.loads(out.read_text())
+    assert summary["root"] == manifest["root"] and summary["chunks"] == len(manifest["chunks"]) == 4
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import asyncio
+import types
+
+import pytest
+from opp import decorators as dec
+from opp.decorators import stamp
+
+
+class CaptureClient(types.SimpleNamespace):
+    def __init__(self):
+        super().__init__(sent=[])
+
+    def create_envelope(self, payload, payload_type, target_type, trace_id=None, ts=None):
+        return {"payload": payload}
+
+    def send_envelope(self, env):
+        self.sent.append(env["payload"])
+        return {"ok": True}
+
+
+class AsyncCaptureClient(CaptureClient):
+    async def send_envelope(self, env):
+        await asyncio.sleep(0)
+        self.sent.append(env["payload"])
+        return {"ok": True}
+
+
+@pytest.fixture()
+def cap(monkeypatch):
+    c = CaptureClient()
+    monkeypatch.setattr(dec, "_get_client", lambda _: c)
+    return c
+
+
+def test_coroutine_stamped_around_execution(cap):
+    ran = []
+
+    @stamp("async.v1", outputs=lambda r: {"r": r})
+    async def work(x):
+        ran.append(len(cap.sent))
+        await asyncio.sleep(0)
+        return x * 2
+
+    coro = work(3)
+    assert cap.sent == []  # nothing emitted until the coroutine actually runs
+    assert asyncio.run(coro) == 6
+    assert ran == [1]
+    assert [p["phase"] for p in cap.sent] == ["start", "end"]
+    assert cap.sent[1]["status"] == "ok" and "outputs_cid" in cap.sent[1]
+
+
+def test_coroutine_error_and_cancel(cap):
+    @stamp("async.v1")
+    async def boom():
+        raise ValueError("x")
+
+    @stamp("async.v1")
+    async def slow():
+        await asyncio.sleep(10)
+
+    with pytest.raises(ValueError):
+        asyncio.run(boom())
+
+    async def cancel_it():
+        t = asyncio.ensure_future(slow())
+        await asyncio.sleep(0.01)
+        t.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await t
+
+    asyncio.run(cancel_it())
+    statuses = [p["status"] for p in cap.sent if p["phase"] == "end"]
+    assert statuses == ["error", "cancelled"]
+
+
+def test_async_generator(cap):
+    @stamp("agen.v1")
+    async def produce(n):
+        for i in range(n):
+            yield i
+
+    async def consume():
+        gen = produce(3)
+        assert cap.sent == []
+        return [i async for i in gen]
+
+    assert asyncio.run(consume()) == [0, 1, 2]
+    assert [p["phase"] for p in cap.sent] == ["start", "end"]
+
+
+def test_sync_generator_return_value_and_close(cap):
+    @stamp("gen.v1", outputs=lambda r: {"total": r})
+    def produce(n):
+        total = 0
+        for i in range(n):
+            total += i
+            yield i
+        return total
+
+    gen = produce(3)
+    assert cap.sent == []
+    assert list(gen) == [0, 1, 2]
+    assert [p["phase"] for p in cap.sent] == ["start", "end"]
+    assert "outputs_cid" in cap.sent[1]
+
+    early = produce(5)
+    next(early)
+    early.close()
+    assert cap.sent[-1]["phase"] == "end"
+
+
+def test_explicit_async_client_is_awaited():
+    aclient = AsyncCaptureClient()
+
+    @stamp("async.v1", client=aclient)  # type: ignore[arg-type]
+    async def work():
+        return 1
+
+    assert asyncio.run(work()) == 1
+    assert [p["phase"] for p in aclient.sent] == ["start", "end"]
+
+    with pytest.raises(TypeError):
+        @stamp("sync.v1", client=aclient)  # type: ignore[arg-type]
+        def sync_work():
+            return 1
+
+
+def test_sync_mode_uses_async_opeclient(monkeypatch):
+    monkeypatch.setenv("OPP_SEND_MODE", "sync")
+    aclient = AsyncCaptureClient()
+    monkeypatch.setattr(dec, "_get_async_client", lambda _: aclient)
+
+    @stamp("async.v1")
+    async def work():
+        return 1
+
+    asyncio.run(work())
+    assert len(aclient.sent) == 2
+
+
+def test_async_opeclient_sends_and_falls_back(monkeypatch):
+    import base64
+
+    import httpx
+    from opp.odin_shim import AsyncOPEClient
+
+    monkeypatch.setenv("OPP_SENDER_PRIV_B64", base64.urlsafe_b64encode(b"\x08" * 32).decode().rstrip("="))
+    urls: list[str] = []
+
+    def handler(req: httpx.Request) -> httpx.Response:
+        urls.append(req.url.path)
+        return httpx.Response(404 if req.url.path.endswith("/batch") else 202)
+
+    async def go():
+        http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client = AsyncOPEClient(gateway_url="http://gw", http_client=http)
+        env = client.create_envelope({"a": 1}, "evt", "tgt")
+        assert (await client.send_envelope(env))["status_code"] == 202
+        assert (await client.send_batch([env, env]))["status_code"] == 202
+        await client.aclose()
+
+    asyncio.run(go())
+    assert urls == ["/api/v1/envelopes", "/api/v1/envelopes/batch", "/api/v1/envelopes", "/api/v1/envelopes"]
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import hashlib
+import json
+
+import pytest
+from opp import cli as opp_cli
+from opp.formats import cbor_dumps, cbor_loads, decode, encode, negotiate
+
+
+def _bundle(n: int) -> dict:
+    chain = []
+    for i in range(n):
+        hop = {"trace_id": "tf", "receipt_hash": hashlib.sha256(str(i).encode()).hexdigest(),
+               "ts": f"2024-01-01T00:00:{i:02d}Z",
+               "normalized": {"step": f"s{i % 3}", "metrics": {"loss": 1 / (i + 1)}, "safety": {"ok": i % 2 == 0},
+                              "dataset": {"chunks": [{"cid": f"c{i}"}]}}}
+        if chain:
+            hop["prev_receipt_hash"] = chain[-1]["receipt_hash"]
+        chain.append(hop)
+    return {"trace_id": "tf", "chain": chain}
+
+
+def test_cbor_matches_rfc_vectors_and_round_trips():
+    vectors = {0: "00", 23: "17", 24: "1818", 100: "1864", 1000000: "1a000f4240", -1000: "3903e7",
+               18446744073709551616: "c249010000000000000000", 1.1: "fb3ff199999999999a", "IETF": "6449455446",
+               "ü": "62c3bc", True: "f5", None: "f6", b"\x01\x02": "420102"}
+    for value, hexed in vectors.items():
+        assert cbor_dumps(value) == bytes.fromhex(hexed), value
+        assert cbor_loads(bytes.fromhex(hexed)) == value
+    assert cbor_dumps([1, [2, 3], {"a": 1}]) == bytes.fromhex("83018202 03a1616101".replace(" ", ""))
+    value = {"big": -(2 ** 70), "neg": -1, "f": -0.5, "nested": [{}, [], ""], "hash": "ab" * 32, "HEX": "AB" * 32}
+    assert cbor_loads(cbor_dumps(value)) == value
+    assert cbor_dumps("ab" * 32) == b"\x78\x40" + b"ab" * 32  # digests stay plain text strings, no tags
+    assert cbor_loads(bytes.fromhex("d74401020304")) == b"\x01\x02\x03\x04"  # foreign tag 23: the tagged value
+    assert cbor_loads(bytes.fromhex("f93c00")) == 1.0
+    for bad in (b"\x62a", b"\x9f", b"\x01\x02"):
+        with pytest.raises(ValueError):
+            cbor_loads(bad)
+    with pytest.raises(ValueError):
+        encode({}, "xml")
+
+
+def test_cli_binary_output_equals_json_output(monkeypatch, capsysbinary, tmp_path):
+    body = json.dumps(_bundle(12)).encode()
+    monkeypatch.setattr(opp_cli, "_iter_body", lambda url: [body])
+    opp_cli.graph(trace="tf", gateway="http://gw", api=None, fmt="json")
+    expected = json.loads(capsysbinary.readouterr().out)
+    for fmt in ("json-compact", "cbor"):
+        opp_cli.graph(trace="tf", gateway="http://gw", api=None, fmt=fmt)
+        assert decode(capsysbinary.readouterr().out, fmt) == expected, fmt
+
+    opp_cli.passport(trace="tf", gateway="http://gw", out=None, fmt="json", snapshot_db=None)
+    expected = json.loads(capsysbinary.readouterr().out)
+    assert expected["receipts"] == 12 and len(expected["dataset_roots"]) == 12
+    out = tmp_path / "passport.cbor"
+    opp_cli.passport(trace="tf", gateway="http://gw", out=str(out), fmt="cbor", snapshot_db=None)
+    assert decode(out.read_bytes(), "cbor") == expected
+    with pytest.raises(Exception, match="--format"):
+        opp_cli.graph(trace="tf", gateway="http://gw", api=None, fmt="xml")
+
+
+def test_negotiate_accept_header():
+    assert negotiate(None) == "json" and negotiate("text/html") == "json"
+    assert negotiate("application/cbor") == "cbor"
+    assert negotiate("*/*, application/cbor") == "cbor"
+    assert negotiate("application/json, application/cbor") == "json"
+    assert negotiate("application/cbor;q=0.5, application/json") == "json"
+    assert negotiate("application/cbor;q=0") == "json"
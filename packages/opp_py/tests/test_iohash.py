@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import array
+import hashlib
+import os
+import types
+
+from opp import decorators as dec
+from opp import iohash
+from opp.canonical import cid_of
+from opp.decorators import stamp
+from opp.iohash import file_cid, forget, io_cid, register
+from opp.merkle import merkle_root
+
+
+def _sha(b: bytes) -> str:
+    return "sha256:" + hashlib.sha256(b).hexdigest()
+
+
+def test_json_values_keep_canonical_cids():
+    for obj in ({"a": [1, 2.5, None]}, [1, "x"], "text", 3, True, None):
+        assert io_cid(obj) == cid_of(obj)
+
+
+def test_buffers_hash_raw_memory():
+    data = bytes(range(256)) * 16
+    assert io_cid(data) == io_cid(bytearray(data)) == io_cid(memoryview(data)) == _sha(data)
+    doubles = array.array("d", [1.0, 2.0, 3.0])
+    assert io_cid(doubles) != _sha(doubles.tobytes())  # dtype is part of the CID
+    assert io_cid(doubles) == io_cid(array.array("d", [1.0, 2.0, 3.0]))
+    grid = memoryview(bytes(range(12))).cast("B", (3, 4))
+    assert io_cid(grid) != io_cid(bytes(range(12))) != io_cid(memoryview(bytes(range(12))).cast("B", (4, 3)))
+    assert io_cid(memoryview(data)[::2]) == _sha(data[::2])  # non-contiguous
+
+
+def test_files_hash_content_and_cache_by_stat(tmp_path, monkeypatch):
+    iohash.clear_cache()
+    p = tmp_path / "blob.bin"
+    p.write_bytes(b"x" * 5000)
+    assert io_cid(p) == file_cid(str(p)) == _sha(b"x" * 5000)
+    assert file_cid(tmp_path / "blob.bin") == _sha(b"x" * 5000)
+
+    reads = []
+    monkeypatch.setattr(iohash.mmap, "mmap", lambda *a, **k: reads.append(a) or (_ for _ in ()).throw(AssertionError))
+    assert file_cid(p) == _sha(b"x" * 5000)  # unchanged stat: served from the cache
+    assert reads == []
+    monkeypatch.undo()
+
+    p.write_bytes(b"y" * 10)
+    st = p.stat()
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert file_cid(p) == _sha(b"y" * 10)
+    empty = tmp_path / "empty"
+    empty.write_bytes(b"")
+    assert file_cid(empty) == _sha(b"")
+
+
+def test_iterators_stream_into_a_merkle_root():
+    items = [b"chunk-1", {"k": 1}, b"chunk-2"]
+    leaves = [io_cid(i).encode() for i in items]
+    assert io_cid(iter(items)) == io_cid(x for x in items) == merkle_root(leaves)
+
+
+def test_registry_and_identity_memo():
+    calls = []
+
+    class Frame:
+        def __init__(self, v):
+            self.v = v
+
+    register(Frame, lambda f: calls.append(f) or cid_of({"frame": f.v}))
+    f = Frame(1)
+    assert io_cid(f) == io_cid(f) == cid_of({"frame": 1})
+    assert len(calls) == 1
+    f.v = 2
+    forget(f)
+    assert io_cid(f) == cid_of({"frame": 2}) and len(calls) == 2
+    assert io_cid(f, memo=False) == cid_of({"frame": 2}) and len(calls) == 3
+    n = len(iohash._memo)
+    del f, calls[:]  # last references: the memo entry goes with the object
+    assert len(iohash._memo) == n - 1
+
+
+def test_stamp_hashes_blobs_instead_of_failing(monkeypatch):
+    cap = types.SimpleNamespace(sent=[])
+    cap.create_envelope = lambda payload, *a, **k: {"payload": payload}
+    cap.send_envelope = lambda env: cap.sent.append(env["payload"])
+    monkeypatch.setattr(dec, "_get_client", lambda _: cap)
+
+    @stamp("blob.v1", inputs=lambda a, k: a[0], outputs=lambda r: r)
+    def upper(blob: bytes) -> bytes:
+        return blob.upper()
+
+    assert upper(b"abc") == b"ABC"
+    start, end = cap.sent
+    assert start["inputs_cid"] == _sha(b"abc") and end["outputs_cid"] == _sha(b"ABC")
+
+
+def test_containers_hash_non_json_members_by_type(tmp_path):
+    p = tmp_path / "blob.bin"
+    p.write_bytes(b"abc")
+    assert io_cid((1, "x")) == cid_of([1, "x"]) and io_cid({"a": (1,)}) == cid_of({"a": [1]})  # pure JSON as before
+    assert io_cid((b"abc",)) == io_cid([b"abc"]) == io_cid([p]) == merkle_root([_sha(b"abc").encode()])
+    assert io_cid([b"abc", 1]) == io_cid(iter([b"abc", 1]))
+    assert io_cid([b"abc"]) != io_cid([b"abd"]) and io_cid([b"a", b"b"]) != io_cid([b"b", b"a"])
+    blob = {"blob": b"abc", "n": 1}
+    assert io_cid(blob) == io_cid({"n": 1, "blob": p}) == merkle_root(
+        sorted(f"{cid_of(k)} {io_cid(v)}".encode() for k, v in blob.items()))
+    assert io_cid(blob) != io_cid({"blob": b"abc", "n": 2}) != io_cid({"other": b"abc", "n": 1})
+    assert io_cid({"nested": [{"blob": array.array("d", [1.0])}]}) != io_cid({"nested": [{"blob": array.array("d", [2.0])}]})
+
+
+def test_stamp_hashes_all_positional_arguments(monkeypatch, tmp_path):
+    cap = types.SimpleNamespace(sent=[])
+    cap.create_envelope = lambda payload, *a, **k: {"payload": payload}
+    cap.send_envelope = lambda env: cap.sent.append(env["payload"])
+    monkeypatch.setattr(dec, "_get_client", lambda _: cap)
+
+    @stamp("concat.v1", inputs=lambda a, k: a, outputs=lambda r: r)
+    def concat(left: bytes, right) -> bytes:
+        return left + right.read_bytes()
+
+    p = tmp_path / "right.bin"
+    p.write_bytes(b"def")
+    assert concat(b"abc", p) == b"abcdef"
+    start, end = cap.sent
+    assert start["inputs_cid"] == merkle_root([_sha(b"abc").encode(), _sha(b"def").encode()])
+    assert end["outputs_cid"] == _sha(b"abcdef")
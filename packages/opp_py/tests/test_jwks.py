@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from opp.jwks import JWKSCache, cache_control_max_age, public_key_from_jwk, verify_ed25519
+
+
+def _key(seed: int) -> tuple[Ed25519PrivateKey, dict]:
+    priv = Ed25519PrivateKey.from_private_bytes(bytes([seed]) * 32)
+    raw = priv.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    return priv, {"kty": "OKP", "crv": "Ed25519", "x": base64.urlsafe_b64encode(raw).decode().rstrip("=")}
+
+
+class Clock:
+    now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Gateway:
+    def __init__(self, keys: dict[str, dict], cache_control: str | None = "max-age=60"):
+        self.keys = keys
+        self.cache_control = cache_control
+        self.calls = 0
+        self.fail = False
+        self.body: object = None
+
+    async def fetch(self, url: str) -> httpx.Response:
+        self.calls += 1
+        await asyncio.sleep(0)
+        if self.fail:
+            return httpx.Response(503, request=httpx.Request("GET", url))
+        headers = {"cache-control": self.cache_control} if self.cache_control else {}
+        body = self.body or {"keys": [{**jwk, "kid": kid} for kid, jwk in self.keys.items()] + [{"kty": "RSA", "kid": "rsa"}]}
+        return httpx.Response(200, json=body, headers=headers, request=httpx.Request("GET", url))
+
+
+def test_cache_control_parsing():
+    assert cache_control_max_age({}) is None
+    assert cache_control_max_age({"cache-control": "public, max-age=120"}) == 120
+    assert cache_control_max_age({"cache-control": "max-age=120, s-maxage=30"}) == 30
+    assert cache_control_max_age({"cache-control": "no-cache"}) == 0
+    assert cache_control_max_age({"cache-control": "public"}) is None
+
+
+def test_key_parsing_and_verify():
+    priv, jwk = _key(1)
+    pub = public_key_from_jwk(jwk)
+    assert pub is not None
+    sig = priv.sign(b"msg")
+    assert verify_ed25519(pub, b"msg", sig)
+    assert verify_ed25519(pub, b"msg", base64.urlsafe_b64encode(sig).decode().rstrip("="))
+    assert not verify_ed25519(pub, b"other", sig)
+    assert not verify_ed25519(pub, b"msg", "%%%")
+    assert public_key_from_jwk({"kty": "RSA"}) is None
+    assert public_key_from_jwk({"kty": "OKP", "crv": "Ed25519", "x": "short"}) is None
+
+
+def test_hits_ttl_and_background_refresh():
+    _, j1 = _key(1)
+    gw, clock = Gateway({"k1": j1}), Clock()
+    cache = JWKSCache("u", gw.fetch, clock=clock)
+
+    async def main():
+        a = await cache.aget("k1")
+        assert a is not None and await cache.aget("k1") is a and await cache.aget(None) is a
+        assert gw.calls == 1 and cache.kids == ["k1"]  # the RSA key is skipped
+        clock.now += 50  # past 80% of max-age=60: served now, refreshed in background
+        assert await cache.aget("k1") is a
+        await asyncio.sleep(0.01)
+        assert gw.calls == 2
+        clock.now += 61  # expired: inline refetch
+        await cache.aget("k1")
+        assert gw.calls == 3
+
+    asyncio.run(main())
+
+
+def test_unknown_kid_rotation_and_rate_limit():
+    _, j1 = _key(1)
+    _, j2 = _key(2)
+    gw, clock = Gateway({"k1": j1}), Clock()
+    cache = JWKSCache("u", gw.fetch, clock=clock, min_refetch_interval=10)
+
+    async def main():
+        assert await cache.aget("k1") is not None
+        gw.keys = {"k2": j2}  # rotation on the gateway
+        assert await cache.aget("k2") is None  # fetched < 10s ago: no refetch
+        assert gw.calls == 1
+        clock.now += 11
+        assert await cache.aget("k2") is not None
+        assert gw.calls == 2 and cache.kids == ["k2"]  # k1 retired
+        assert await cache.aget("k1") is None
+
+    asyncio.run(main())
+
+
+def test_stale_keys_on_refresh_error_and_first_fetch_error():
+    _, j1 = _key(1)
+    gw, clock = Gateway({"k1": j1}, cache_control=None), Clock()
+    cache = JWKSCache("u", gw.fetch, default_ttl=5, clock=clock)
+
+    async def main():
+        assert await cache.aget("k1") is not None
+        gw.fail = True
+        clock.now += 6
+        assert await cache.aget("k1") is not None  # stale but usable
+        assert cache.stats()["errors"] == 1
+        gw.fail = False
+        gw.body = ["not", "a", "jwks"]  # malformed document: also kept stale
+        clock.now += 6
+        assert await cache.aget("k1") is not None
+        assert cache.stats()["errors"] == 2
+        gw.body, gw.fail = None, True
+
+    asyncio.run(main())
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(JWKSCache("u", gw.fetch).aget("k1"))
+
+
+def test_concurrent_lookups_share_one_fetch():
+    _, j1 = _key(1)
+    gw = Gateway({"k1": j1})
+    cache = JWKSCache("u", gw.fetch)
+
+    async def main():
+        return await asyncio.gather(*[cache.aget("k1") for _ in range(10)])
+
+    keys = asyncio.run(main())
+    assert gw.calls == 1 and all(k is keys[0] for k in keys)
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import io
+import os
+
+import pytest
+from opp.merkle import (
+    MerkleBuilder,
+    merkle_proof,
+    merkle_root,
+    merkle_root_iter,
+    merkle_root_stream,
+    verify_proof,
+)
+
+
+def _chunks(n: int) -> list[bytes]:
+    return [f"chunk-{i}".encode() for i in range(n)]
+
+
+@pytest.mark.parametrize("n", list(range(40)) + [63, 64, 65, 127, 128, 129, 1000])
+def test_builder_matches_merkle_root(n):
+    chunks = _chunks(n)
+    assert merkle_root_iter(iter(chunks)) == merkle_root(chunks)
+
+
+def test_root_is_non_destructive():
+    b = MerkleBuilder()
+    chunks = _chunks(11)
+    for i, c in enumerate(chunks):
+        b.add(c)
+        assert b.root() == merkle_root(chunks[: i + 1])
+    assert len(b) == 11
+
+
+def test_stream_chunks_file():
+    data = os.urandom(10_000)
+    expected = merkle_root([data[i:i + 1024] for i in range(0, len(data), 1024)])
+    assert merkle_root_stream(io.BytesIO(data), chunk_size=1024) == expected
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 5, 7, 8, 13, 33])
+def test_proofs_verify_for_every_leaf(n):
+    chunks = _chunks(n)
+    root = merkle_root(chunks)
+    b = MerkleBuilder(track=range(n)).update(chunks)
+    for i, c in enumerate(chunks):
+        proof = b.proof(i)
+        assert proof["root"] == root and proof["leaf_count"] == n
+        assert verify_proof(c, proof, root)
+        assert not verify_proof(b"tampered", proof, root)
+
+
+def test_merkle_proof_streaming_and_bad_root():
+    chunks = _chunks(21)
+    proof = merkle_proof(iter(chunks), 17)
+    assert verify_proof(chunks[17], proof, merkle_root(chunks))
+    assert not verify_proof(chunks[17], proof, merkle_root(chunks[:20]))
+
+
+def test_untracked_proof_raises():
+    b = MerkleBuilder(track=[5]).update(_chunks(3))
+    with pytest.raises(KeyError):
+        b.proof(1)
+    with pytest.raises(KeyError):
+        b.proof(5)
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from opp.merkle import hash_leaves, merkle_root, merkle_root_digests, merkle_root_parallel
+
+
+@pytest.mark.parametrize("n", [0, 1, 2, 3, 17, 257, 1000])
+def test_digest_layers_match_reference(n):
+    chunks = [os.urandom(48) for _ in range(n)]
+    digests = hash_leaves(chunks)
+    assert len(digests) == 32 * n
+    assert merkle_root_digests(digests) == merkle_root(chunks)
+    # force tiny parallel slices to exercise slice boundaries and odd duplication
+    with ThreadPoolExecutor(3) as pool:
+        assert merkle_root_digests(digests, pool=pool, batch_nodes=4) == merkle_root(chunks)
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_parallel_root_identical(executor):
+    chunks = [os.urandom(i % 97 + 1) for i in range(1500)]
+    assert merkle_root_parallel(chunks, workers=2, executor=executor, batch_size=100) == merkle_root(chunks)
+
+
+def test_parallel_reuses_executor_and_rejects_unknown():
+    chunks = [b"x%d" % i for i in range(300)]
+    with ThreadPoolExecutor(2) as pool:
+        assert merkle_root_parallel(chunks, executor=pool, batch_size=64) == merkle_root(chunks)
+    with pytest.raises(ValueError):
+        merkle_root_parallel(chunks, workers=2, executor="gpu", batch_size=10)
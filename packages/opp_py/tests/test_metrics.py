@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import base64
+import sys
+import types
+
+import httpx
+import pytest
+from opp import decorators as dec
+from opp import metrics
+from opp.odin_shim import OPEClient
+from opp.sender import get_sender, shutdown_senders
+from opp.store import SQLiteReceiptStore
+
+SEED = base64.urlsafe_b64encode(bytes([3]) * 32).decode().rstrip("=")
+
+
+@pytest.fixture
+def recording():
+    metrics.reset()
+    metrics.enable(True)
+    yield
+    metrics.enable(False)
+    metrics.reset()
+
+
+def _count(name: str, **labels: str) -> int:
+    h = metrics.histogram(name, "", tuple(labels))
+    series = h.series().get(tuple(labels.values()))
+    return series["count"] if series else 0
+
+
+def test_disabled_sections_are_free_and_unrecorded():
+    h = metrics.histogram("opp_test_disabled_seconds", "test")
+    assert not metrics.enabled()
+    with metrics.timed(h) as t:
+        pass
+    assert t is None and metrics.timed(h) is metrics.timed(h)
+    metrics.observe(h, 1.0)
+    assert h.series() == {}
+
+
+def test_histogram_renders_prometheus_text(recording):
+    h = metrics.histogram("opp_test_size", "Sizes", ("kind",), buckets=(1, 10))
+    for v in (0.5, 5, 50):
+        h.observe(v, 'a"b')
+    text = metrics.render()
+    assert "# TYPE opp_test_size histogram" in text
+    assert 'opp_test_size_bucket{kind="a\\"b",le="1"} 1' in text
+    assert 'opp_test_size_bucket{kind="a\\"b",le="10"} 2' in text
+    assert 'opp_test_size_bucket{kind="a\\"b",le="+Inf"} 3' in text
+    assert 'opp_test_size_sum{kind="a\\"b"} 55.5' in text and 'opp_test_size_count{kind="a\\"b"} 3' in text
+    with pytest.raises(ValueError):
+        h.observe(1.0)
+    with pytest.raises(ValueError):
+        metrics.histogram("opp_test_size", "Sizes", ("other",))
+
+
+def test_stamp_records_envelope_sign_send_and_handoff(recording, monkeypatch, tmp_path):
+    monkeypatch.setenv("OPP_SEND_MODE", "sync")
+    client = OPEClient(gateway_url="http://gw", sender_priv_b64=SEED, sender_kid="k1",
+                       store=SQLiteReceiptStore(str(tmp_path / "r.db")))
+
+    @dec.stamp("m.step", client=client)
+    def work(x: int) -> int:
+        return x * 2
+
+    assert work(2) == 4
+    assert _count("opp_envelope_create_seconds") == 2 and _count("opp_envelope_sign_seconds") == 2
+    assert _count("opp_send_seconds", target="store", kind="envelope") == 2
+    assert _count("opp_stamp_handoff_seconds", mode="sync") == 2
+
+
+def test_background_sender_queue_and_counters(recording, monkeypatch, tmp_path):
+    monkeypatch.setenv("OPP_SEND_MODE", "background")
+    client = OPEClient(gateway_url="http://metrics-gw", sender_priv_b64=SEED, sender_kid="k1",
+                       store=SQLiteReceiptStore(str(tmp_path / "r.db")))
+    try:
+        for i in range(3):
+            dec._send(client, client.create_envelope({"i": i}, "opp.step.v1", "opp.step.v1", trace_id="t"))
+        assert get_sender(client).flush(timeout=5)
+        assert _count("opp_sender_queue_depth") == 3 and _count("opp_stamp_handoff_seconds", mode="background") == 3
+        assert _count("opp_send_seconds", target="store", kind="batch") >= 1
+        text = metrics.render()
+        assert 'opp_sender_sent_total{gateway="http://metrics-gw"} 3' in text
+        assert 'opp_sender_pending{gateway="http://metrics-gw"} 0' in text
+    finally:
+        shutdown_senders(timeout=5)
+
+
+def test_otel_spans(monkeypatch):
+    spans: list[str] = []
+
+    class Span:
+        def __init__(self, name):
+            spans.append(name)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            spans.append("/" + spans[-1])
+
+    trace = types.ModuleType("opentelemetry.trace")
+    trace.get_tracer = lambda name: types.SimpleNamespace(start_as_current_span=Span)  # type: ignore[attr-defined]
+    monkeypatch.setitem(sys.modules, "opentelemetry", types.ModuleType("opentelemetry"))
+    monkeypatch.setitem(sys.modules, "opentelemetry.trace", trace)
+    monkeypatch.setattr(metrics, "_tracer", None)
+    h = metrics.histogram("opp_test_span_seconds", "test")
+    try:
+        metrics.enable(False, otel=True)
+        assert metrics.tracing()
+        with metrics.timed(h, span="opp.test"):
+            pass
+        with metrics.timed(h):  # no span name: nothing to do
+            pass
+        assert spans == ["opp.test", "/opp.test"] and h.series() == {}
+    finally:
+        metrics.enable(False, otel=False)
+    monkeypatch.setattr(metrics, "_tracer", None)
+    monkeypatch.setitem(sys.modules, "opentelemetry.trace", None)
+    with pytest.raises(RuntimeError):
+        metrics.enable(False, otel=True)
+    assert not metrics.tracing()
+
+
+def test_serve_exposes_metrics(recording):
+    metrics.observe(metrics.histogram("opp_test_served_seconds", "Served"), 0.2)
+    server = metrics.serve(0)
+    try:
+        base = f"http://127.0.0.1:{server.server_port}"
+        r = httpx.get(f"{base}/metrics")
+        assert r.status_code == 200 and r.headers["content-type"] == metrics.CONTENT_TYPE
+        assert "opp_test_served_seconds_count 1" in r.text
+        assert httpx.get(f"{base}/nope").status_code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import asyncio
+import types
+
+import pytest
+from opp import decorators as dec
+from opp import sampling
+from opp.decorators import stamp
+from opp.merkle import merkle_root
+from opp.sampling import Aggregator, SamplingPolicy, keep_call
+from opp.util import cid_of
+
+
+class CaptureClient(types.SimpleNamespace):
+    def __init__(self):
+        super().__init__(sent=[])
+
+    def create_envelope(self, payload, payload_type, target_type, trace_id=None, ts=None):
+        return {"payload": payload, "payload_type": payload_type}
+
+    def send_envelope(self, env):
+        self.sent.append(env)
+        return {"ok": True}
+
+
+class AsyncCaptureClient(CaptureClient):
+    async def send_envelope(self, env):
+        await asyncio.sleep(0)
+        self.sent.append(env)
+        return {"ok": True}
+
+
+@pytest.fixture()
+def cap(monkeypatch):
+    c = CaptureClient()
+    monkeypatch.setattr(dec, "_get_client", lambda _: c)
+    return c
+
+
+def test_policy_from_env(monkeypatch):
+    monkeypatch.setenv("OPP_SAMPLE_RATE", "0.5")
+    monkeypatch.setenv("OPP_SAMPLE_RATES", "tok.v1=0.01, eval.v1=1")
+    monkeypatch.setenv("OPP_SAMPLE_BY", "TRACE")
+    monkeypatch.setenv("OPP_AGGREGATE", "tok.v1=2.5")
+    monkeypatch.setenv("OPP_AGGREGATE_MAX_CALLS", "100")
+    p = SamplingPolicy.from_env()
+    assert p.by == "trace" and p.max_calls == 100
+    assert p.rate_for("tok.v1") == 0.01 and p.rate_for("eval.v1") == 1.0 and p.rate_for("other") == 0.5
+    assert p.window_for("tok.v1") == 2.5 and p.window_for("other") is None
+
+    monkeypatch.setenv("OPP_SAMPLE_RATES", "tok.v1")
+    with pytest.raises(ValueError):
+        SamplingPolicy.from_env()
+    with pytest.raises(ValueError):
+        SamplingPolicy(rate=1.5)
+    with pytest.raises(ValueError):
+        SamplingPolicy(by="span")
+
+
+def test_keep_call_rates_and_trace_determinism():
+    assert keep_call(1.0, "call", "s", "t") and not keep_call(0.0, "trace", "s", "t")
+    first = [keep_call(0.3, "trace", "s", f"trace-{i}") for i in range(200)]
+    assert first == [keep_call(0.3, "trace", "s", f"trace-{i}") for i in range(200)]
+    assert 20 < sum(first) < 100
+
+
+def test_aggregator_summary(monkeypatch):
+    agg = Aggregator("tok.v1", 60, attrs={"k": "v"}, sample_rate=0.5, background=False)
+    cids = [cid_of({"i": i}) for i in range(4)]
+    for i, cid in enumerate(cids):
+        assert agg.record(0.001 * (i + 1), "ok" if i < 3 else "error", cid, cid if i < 3 else None) is None
+    assert agg.flush() is None  # window still open
+    s = agg.flush(force=True)
+    assert s is not None and agg.flush(force=True) is None
+    assert s["phase"] == "aggregate" and s["attrs"] == {"k": "v"} and s["sample_rate"] == 0.5
+    assert s["count"] == 4 and s["errors"] == 1 and s["status"] == {"ok": 3, "error": 1}
+    assert s["latency_ms"]["min"] == pytest.approx(1) and s["latency_ms"]["max"] == pytest.approx(4)
+    assert s["latency_ms"]["p50"] == pytest.approx(2) and s["latency_ms"]["total"] == pytest.approx(10)
+    assert s["inputs_root"] == merkle_root([c.encode() for c in cids]) and s["inputs_count"] == 4
+    assert s["outputs_root"] == merkle_root([c.encode() for c in cids[:3]]) and s["outputs_count"] == 3
+
+
+def test_aggregator_windows_close_on_time_and_max_calls(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sampling.time, "time", lambda: now[0])
+    agg = Aggregator("s", 10, max_calls=3, background=False)
+    assert agg.record(0.1, "ok") is None
+    now[0] += 11
+    closed = agg.record(0.2, "ok")  # closes the expired window, then opens a new one
+    assert closed is not None and closed["count"] == 1
+    assert agg.record(0.1, "ok") is None
+    full = agg.record(0.1, "ok")
+    assert full is not None and full["count"] == 3 and agg.flush(force=True) is None
+
+
+def test_stamp_sample_zero_emits_nothing(cap):
+    @stamp("tok.v1", sample=0)
+    def work(x):
+        return x + 1
+
+    assert [work(i) for i in range(5)] == [1, 2, 3, 4, 5]
+    assert cap.sent == []
+    with pytest.raises(ValueError):
+        stamp("tok.v1", sample=2)
+
+
+def test_stamp_aggregate_sync(cap, monkeypatch):
+    monkeypatch.setenv("OPP_AGGREGATE_MAX_CALLS", "3")
+
+    @stamp("tok.v1", inputs=lambda a, k: {"x": a[0]}, aggregate=60)
+    def work(x):
+        if x < 0:
+            raise ValueError(x)
+        return x * 2
+
+    assert work(1) == 2 and work(2) == 4
+    assert cap.sent == []
+    with pytest.raises(ValueError):
+        work(-1)
+    assert len(cap.sent) == 1
+    env = cap.sent[0]
+    assert env["payload_type"] == "opp.step.aggregate.v1"
+    assert env["payload"]["count"] == 3 and env["payload"]["errors"] == 1
+    assert env["payload"]["inputs_root"] == merkle_root([cid_of({"x": x}).encode() for x in (1, 2, -1)])
+
+    work(5)
+    sampling.flush_aggregates()
+    assert len(cap.sent) == 2 and cap.sent[1]["payload"]["count"] == 1
+
+    with pytest.raises(TypeError):
+        @stamp("gen.v1", aggregate=1)
+        def gen():
+            yield 1
+
+
+def test_stamp_aggregate_async_client():
+    client = AsyncCaptureClient()
+
+    @stamp("tok.v1", client=client, aggregate=60)
+    async def work(x):
+        await asyncio.sleep(0)
+        return x
+
+    async def main():
+        return [await work(i) for i in range(3)]
+
+    assert asyncio.run(main()) == [0, 1, 2]
+    assert client.sent == []
+    sampling.flush_aggregates()
+    assert [e["payload"]["count"] for e in client.sent] == [3]
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import base64
+import threading
+import types
+from typing import Any
+
+from opp import decorators as dec
+from opp import odin_shim
+from opp.sender import BatchSender, get_sender, shutdown_senders
+
+
+class BatchCapture:
+    def __init__(self, gateway_url: str = "http://gw", status: int | None = 202, delay: threading.Event | None = None):
+        self.gateway_url = gateway_url
+        self.status = status
+        self.delay = delay
+        self.batches: list[list[dict[str, Any]]] = []
+        self.inline: list[dict[str, Any]] = []
+
+    def create_envelope(self, payload, payload_type, target_type, trace_id=None, ts=None):
+        return {"payload": payload}
+
+    def send_envelope(self, env):
+        self.inline.append(env)
+        return {"status_code": self.status}
+
+    def send_batch(self, envs):
+        if self.delay is not None:
+            self.delay.wait(2)
+        self.batches.append(list(envs))
+        return {"status_code": self.status, "count": len(envs)}
+
+
+def test_batches_respect_size_and_flush():
+    cap = BatchCapture()
+    sender = BatchSender(cap, max_batch=4, flush_interval=0.2)
+    for i in range(10):
+        assert sender.submit({"n": i})
+    assert sender.close(timeout=5)
+    delivered = [e["n"] for b in cap.batches for e in b]
+    assert sorted(delivered) == list(range(10))
+    assert all(len(b) <= 4 for b in cap.batches)
+    assert sender.stats() == {"sent": 10, "failed": 0, "dropped": 0, "pending": 0}
+
+
+def test_full_queue_drops_instead_of_blocking():
+    gate = threading.Event()
+    cap = BatchCapture(delay=gate)
+    sender = BatchSender(cap, max_batch=1, flush_interval=0, max_queue=2)
+    results = [sender.submit({"n": i}) for i in range(10)]
+    assert results.count(False) >= 1
+    assert sender.dropped == results.count(False)
+    gate.set()
+    sender.close(timeout=5)
+
+
+def test_failed_batches_counted_and_closed_sender_sends_inline():
+    cap = BatchCapture(status=None)
+    sender = BatchSender(cap, flush_interval=0)
+    sender.submit({"n": 1})
+    sender.close(timeout=5)
+    assert sender.failed == 1
+    sender.submit({"n": 2})
+    assert cap.batches[-1] == [{"n": 2}]
+
+
+def test_stamp_uses_background_sender(monkeypatch):
+    monkeypatch.delenv("OPP_SEND_MODE", raising=False)
+    cap = BatchCapture(gateway_url="http://bg-test")
+    monkeypatch.setattr(dec, "_get_client", lambda _: cap)
+
+    @dec.stamp("bg.v1")
+    def f():
+        return 1
+
+    assert f() == 1
+    get_sender(cap).flush(timeout=5)
+    assert [e["payload"]["phase"] for b in cap.batches for e in b] == ["start", "end"]
+    assert cap.inline == []
+    shutdown_senders(timeout=5)
+
+
+def test_clients_on_one_gateway_keep_their_own_senders(monkeypatch):
+    monkeypatch.delenv("OPP_SEND_MODE", raising=False)
+    first, second = BatchCapture(gateway_url="http://shared"), BatchCapture(gateway_url="http://shared/")
+    try:
+        assert get_sender(first) is get_sender(first) is not get_sender(second)
+        for client in (first, second):
+            @dec.stamp("own.v1", client=client)
+            def f():
+                return 1
+
+            f()
+            assert get_sender(client).flush(timeout=5)
+        assert [e["payload"]["phase"] for b in first.batches for e in b] == ["start", "end"]
+        assert [e["payload"]["phase"] for b in second.batches for e in b] == ["start", "end"]
+    finally:
+        shutdown_senders(timeout=5)
+
+
+def test_stamp_sync_mode(monkeypatch):
+    monkeypatch.setenv("OPP_SEND_MODE", "sync")
+    cap = BatchCapture()
+    monkeypatch.setattr(dec, "_get_client", lambda _: cap)
+
+    @dec.stamp("sync.v1")
+    def f():
+        return 1
+
+    f()
+    assert len(cap.inline) == 2 and cap.batches == []
+
+
+def test_shim_send_batch_falls_back_without_bulk_endpoint(monkeypatch):
+    monkeypatch.setenv("OPP_SENDER_PRIV_B64", base64.urlsafe_b64encode(b"\x02" * 32).decode().rstrip("="))
+    posted: list[str] = []
+
+    class Resp:
+        def __init__(self, code):
+            self.status_code = code
+
+    class DummyClient(types.SimpleNamespace):
+        def request(self, method, url, json):
+            posted.append(url)
+            return Resp(404 if url.endswith("/batch") else 202)
+
+    client = odin_shim.OPEClient(gateway_url="http://gw", http_client=DummyClient())
+    envs = [client.create_envelope({"i": i}, "evt", "tgt") for i in range(2)]
+    assert client.send_batch(envs) == {"status_code": 202, "count": 2}
+    assert client.send_batch(envs[:1])["status_code"] == 202
+    assert posted.count("http://gw/api/v1/envelopes/batch") == 1
+    assert posted.count("http://gw/api/v1/envelopes") == 3
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from opp.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    sf = SingleFlight()
+    runs = 0
+
+    async def fetch():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.01)
+        return {"n": runs}
+
+    async def main():
+        results = await asyncio.gather(*[sf.do("k", fetch) for _ in range(20)], sf.do("other", fetch))
+        assert not sf.pending("k")
+        return results
+
+    results = asyncio.run(main())
+    assert runs == 2
+    assert all(r is results[0] for r in results[:20])
+    assert sf.stats() == {"in_flight": 0, "calls": 21, "shared": 19}
+
+
+def test_sequential_calls_rerun():
+    sf = SingleFlight()
+    runs = 0
+
+    async def fetch():
+        nonlocal runs
+        runs += 1
+        return runs
+
+    async def main():
+        return [await sf.do("k", fetch) for _ in range(3)]
+
+    assert asyncio.run(main()) == [1, 2, 3]
+
+
+def test_exception_reaches_every_waiter():
+    sf = SingleFlight()
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        return await asyncio.gather(*[sf.do("k", boom) for _ in range(3)], return_exceptions=True)
+
+    errs = asyncio.run(main())
+    assert all(isinstance(e, RuntimeError) for e in errs)
+    assert sf.stats()["in_flight"] == 0
+
+
+def test_cancelled_waiter_does_not_cancel_shared_work():
+    sf = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(sf.do("k", slow))
+        second = asyncio.ensure_future(sf.do("k", slow))
+        await asyncio.sleep(0)
+        assert sf.pending("k")
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "done"
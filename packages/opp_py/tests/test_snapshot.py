@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import hashlib
+import json
+
+import pytest
+from opp import cli as opp_cli
+from opp.analyzer import BundleAnalyzer
+from opp.snapshot import SnapshotStore, resume, snapshot_scope
+from opp.store import open_store
+
+
+def _chain(n: int, salt: str = "") -> list[dict]:
+    chain: list[dict] = []
+    for i in range(n):
+        prev = chain[-1]["receipt_hash"] if chain else None
+        hop = {"trace_id": "ts", "receipt_hash": hashlib.sha256(f"{salt}{prev}{i}".encode()).hexdigest(),
+               "ts": f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}Z",
+               "normalized": {"step": f"s{i % 4}", "model_id": "m" if i == 2 else None,
+                              "metrics": {"loss": 1 / (i + 1), f"m{i % 3}": i}, "safety": {"flag": i == 5},
+                              "dataset": {"chunks": [{"cid": f"c{i}"}]},
+                              "policy": {"engine": f"e{i % 2}",
+                                         "decisions": [{"rule": f"r{i}", "outcome": "deny" if i % 3 == 0 else "allow"}]}}}
+        if prev:
+            hop["prev_receipt_hash"] = prev
+        chain.append(hop)
+    return chain
+
+
+def test_resumed_analysis_equals_full_pass():
+    chain = _chain(20)
+    snap = None
+    for n in (0, 4, 4, 11, 20):
+        a = resume(snap)
+        a.feed_all(chain[:n])
+        assert a.finish() == ("none" if snap is None else "matched")
+        assert a.results() == BundleAnalyzer.analyze({"chain": chain[:n]}).results(), n
+        snap = json.loads(json.dumps(a.snapshot()))  # snapshots survive JSON storage
+    a = resume(snap, outputs={"passport"})  # other outputs: starts afresh
+    assert a.resume_status == "none"
+
+
+def test_skip_reads_only_new_hops_and_mismatches_rerun():
+    chain = _chain(10)
+    snap = BundleAnalyzer({"passport"}).feed_all(chain[:6]).snapshot()
+    a = BundleAnalyzer.from_snapshot(snap)
+    a.skip(6)
+    a.feed_all(chain[6:])
+    assert a.finish() == "matched" and a.passport() == BundleAnalyzer.analyze({"chain": chain}, {"passport"}).passport()
+    with pytest.raises(ValueError):
+        BundleAnalyzer.from_snapshot(snap).skip(7)
+
+    rewritten = BundleAnalyzer.from_snapshot(snap).feed_all(_chain(10, salt="x"))
+    assert rewritten.finish() == "mismatch"
+    with pytest.raises(RuntimeError):
+        rewritten.snapshot()
+    assert BundleAnalyzer.from_snapshot(snap).feed_all(chain[:5]).finish() == "mismatch"  # truncated
+    relinked = chain[:6] + [{**chain[6], "prev_receipt_hash": "other"}]
+    assert BundleAnalyzer.from_snapshot(snap).feed_all(relinked).finish() == "mismatch"
+    assert BundleAnalyzer.from_snapshot(snap).feed_all(chain[:6]).finish() == "matched"  # nothing new
+
+
+def test_snapshot_store_scopes_and_persistence(tmp_path):
+    db = str(tmp_path / "snap.sqlite")
+    snap = BundleAnalyzer({"passport"}).feed_all(_chain(3)).snapshot()
+    with SnapshotStore(db) as store:
+        store.put("ts", snap, snapshot_scope({"passport"}, "http://gw"))
+        assert store.get("ts", snapshot_scope({"passport"}, "sqlite:///x.db")) is None
+    with SnapshotStore(db) as store:
+        assert store.get("ts", "passport|http://gw") == json.loads(json.dumps(snap))
+        assert store.stats() == {"path": db, "snapshots": 1, "hits": 1, "misses": 0}
+        store.delete("ts")
+        assert len(store) == 0
+
+
+def test_cli_passport_folds_in_only_new_hops(monkeypatch, capsys, tmp_path):
+    chain = _chain(12)
+    served = {"n": 5, "bodies": 0}
+
+    def _iter_body(url: str):
+        served["bodies"] += 1
+        return [json.dumps({"trace_id": "ts", "chain": chain[:served["n"]]}).encode()]
+
+    monkeypatch.setattr(opp_cli, "_iter_body", _iter_body)
+    db = str(tmp_path / "snap.sqlite")
+    for n in (5, 12):
+        served["n"] = n
+        opp_cli.passport(trace="ts", gateway="http://gw", out=None, fmt="json", snapshot_db=db)
+        expected = BundleAnalyzer.analyze({"trace_id": "ts", "chain": chain[:n]}, {"passport"}).passport()
+        assert json.loads(capsys.readouterr().out) == expected
+    assert served["bodies"] == 2
+
+    chain[:] = _chain(12, salt="rewritten")  # history changed: one extra download, full recompute
+    opp_cli.passport(trace="ts", gateway="http://gw", out=None, fmt="json", snapshot_db=db)
+    assert json.loads(capsys.readouterr().out)["dataset_roots"] == expected["dataset_roots"]
+    assert served["bodies"] == 4
+
+    url = f"segments://{tmp_path / 'seg'}"
+    with open_store(url) as store:
+        store.append_many(_chain(4))
+    reads: list[int] = []
+    real_hops = opp_cli._hops
+    monkeypatch.setattr(opp_cli, "_hops", lambda gw, trace, start=0: reads.append(start) or real_hops(gw, trace, start))
+    for more in (0, 3):
+        with open_store(url) as store:
+            store.append_many(_chain(4 + more)[4:])
+        opp_cli.passport(trace="ts", gateway=url, out=None, fmt="json", snapshot_db=db)
+        assert json.loads(capsys.readouterr().out)["receipts"] == 4 + more
+    assert reads == [0, 4]
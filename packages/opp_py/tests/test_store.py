@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import os
+
+import httpx
+import pytest
+from opp import cli as opp_cli
+from opp import decorators
+from opp.batch import arun_batch
+from opp.odin_shim import OPEClient
+from opp.sender import get_sender, shutdown_senders
+from opp.store import (
+    SegmentReceiptStore,
+    SQLiteReceiptStore,
+    is_store_url,
+    open_store,
+    store_from_env,
+)
+from opp.verify import verify_hops
+
+SEED = base64.urlsafe_b64encode(bytes([5]) * 32).decode().rstrip("=")
+
+
+def _envs(client: OPEClient, trace: str, n: int, start: int = 0) -> list[dict]:
+    return [client.create_envelope({"step": f"s{i % 2}", "i": i}, "opp.step.v1", "opp.step.v1",
+                                   trace_id=trace, ts=f"2024-01-01T00:00:{i:02d}Z") for i in range(start, start + n)]
+
+
+def _segments(d: str) -> list[str]:
+    return sorted(n for n in os.listdir(d) if n.startswith("segment-"))
+
+
+@pytest.fixture(params=["sqlite", "segments"])
+def url(request, tmp_path) -> str:
+    if request.param == "sqlite":
+        return f"sqlite://{tmp_path / 'receipts.db'}"
+    return f"segments://{tmp_path / 'segments'}"
+
+
+def test_append_links_chains_and_verifies(url):
+    client = OPEClient(gateway_url="http://gw", sender_priv_b64=SEED, sender_kid="k1")
+    with open_store(url) as store:
+        first = store.append(_envs(client, "a", 1)[0])
+        assert "prev_receipt_hash" not in first
+        hops = store.append_many(_envs(client, "a", 3, start=1) + _envs(client, "b", 2))
+        assert hops[0]["prev_receipt_hash"] == first["receipt_hash"]
+        assert store.head("a") == (4, hops[2]["receipt_hash"]) and store.head("nope") is None
+        assert store.traces() == ["a", "b"]
+    with open_store(url) as store:  # reopened: indexes and heads come back from disk
+        chain = list(store.iter_hops("a"))
+        assert [h["normalized"]["i"] for h in chain] == [0, 1, 2, 3]
+        assert verify_hops(chain, trace_id="a")["ok"]
+        store.append(_envs(client, "a", 1, start=4)[0])
+        assert store.export("a")["chain"][-1]["prev_receipt_hash"] == chain[-1]["receipt_hash"]
+
+
+def test_query_by_step_and_time_range(url):
+    client = OPEClient(gateway_url="http://gw", sender_priv_b64=SEED, sender_kid="k1")
+    with open_store(url) as store:
+        store.append_many(_envs(client, "a", 6) + _envs(client, "b", 4))
+        assert [h["normalized"]["i"] for h in store.query(step="s1", trace_id="a")] == [1, 3, 5]
+        ranged = store.query(since="2024-01-01T00:00:02Z", until="2024-01-01T00:00:04Z")
+        assert sorted((h["trace_id"], h["normalized"]["i"]) for h in ranged) == [("a", 2), ("a", 3), ("b", 2), ("b", 3)]
+        assert len(list(store.query(step="s0", limit=2))) == 2
+        assert len(list(store.query())) == 10
+
+
+def test_segments_roll_and_recover_from_torn_write(tmp_path):
+    client = OPEClient(gateway_url="http://gw", sender_priv_b64=SEED, sender_kid="k1")
+    d = str(tmp_path / "seg")
+    with SegmentReceiptStore(d, segment_bytes=1024) as store:
+        store.append_many(_envs(client, "t", 8))
+    segs = _segments(d)
+    assert len(segs) > 1
+    with open(os.path.join(d, segs[-1]), "ab") as f:
+        f.write(b'{"trace_id": "t", "torn')
+    with SegmentReceiptStore(d, readonly=True) as ro:
+        assert ro.head("t")[0] == 8
+        with pytest.raises(RuntimeError):
+            ro.append(_envs(client, "t", 1)[0])
+    with SegmentReceiptStore(d) as store:
+        store.append(_envs(client, "t", 1, start=8)[0])
+        assert verify_hops(list(store.iter_hops("t")))["count"] == 9
+    with SegmentReceiptStore(d) as store:
+        assert [h["normalized"]["i"] for h in store.iter_hops("t")] == list(range(9))
+
+
+def test_segment_store_admits_one_writer(tmp_path, monkeypatch):
+    client = OPEClient(gateway_url="http://gw", sender_priv_b64=SEED, sender_kid="k1")
+    d = str(tmp_path / "seg")
+    with SegmentReceiptStore(d) as writer:
+        with pytest.raises(RuntimeError, match=f"pid {os.getpid()}"):
+            SegmentReceiptStore(d)  # e.g. OPP_RECEIPT_STORE in a second process
+        with SegmentReceiptStore(d, readonly=True) as reader:
+            writer.append(_envs(client, "t", 1)[0])
+            assert reader.head("t")[0] == 1
+        monkeypatch.setattr(os, "getpid", lambda: writer._pid + 1)  # as seen from a forked child
+        with pytest.raises(RuntimeError, match="opened by process"):
+            writer.append(_envs(client, "t", 1, start=1)[0])
+        monkeypatch.undo()
+    with SegmentReceiptStore(d) as writer:  # closing released the lock
+        assert writer.head("t")[0] == 1
+
+
+def test_readonly_segment_reader_sees_later_appends(tmp_path):
+    client = OPEClient(gateway_url="http://gw", sender_priv_b64=SEED, sender_kid="k1")
+    d = str(tmp_path / "shared")
+    with SegmentReceiptStore(d, segment_bytes=1024) as writer, SegmentReceiptStore(d, readonly=True) as reader:
+        assert reader.head("t") is None and reader.traces() == []
+        writer.append(_envs(client, "t", 1)[0])
+        assert reader.head("t") == writer.head("t")
+        writer.append_many(_envs(client, "t", 7, start=1) + _envs(client, "u", 1))  # rolls segments
+        assert len(_segments(d)) > 1
+        assert reader.head("t") == writer.head("t") and reader.head("t")[0] == 8
+        assert [h["normalized"]["i"] for h in reader.iter_hops("t", start=6)] == [6, 7]
+        assert reader.traces() == ["t", "u"] and len(list(reader.query(step="s1", trace_id="t"))) == 4
+        with open(os.path.join(d, _segments(d)[-1]), "ab") as f:
+            f.write(b'{"trace_id": "t", "in progr')  # a write still in flight is not indexed yet
+        assert reader.head("t")[0] == 8
+
+
+def test_client_writes_to_store_and_env(monkeypatch, tmp_path):
+    store = SQLiteReceiptStore(str(tmp_path / "r.db"))
+    client = OPEClient(gateway_url="http://unreachable.invalid", sender_priv_b64=SEED, sender_kid="k1", store=store)
+    assert client.send_envelope(_envs(client, "t", 1)[0]) == {"status_code": 201}
+    assert client.send_batch(_envs(client, "t", 2, start=1)) == {"status_code": 201, "count": 2}
+    assert store.head("t")[0] == 3
+    store.close()  # append failures are swallowed like network failures
+    assert client.send_envelope(_envs(client, "t", 1, start=3)[0]) == {"status_code": None}
+
+    env_url = f"sqlite://{tmp_path / 'env.db'}"
+    monkeypatch.setenv("OPP_RECEIPT_STORE", env_url)
+    decorators.reset_client_cache()
+    env_client = OPEClient(gateway_url="http://unreachable.invalid", sender_priv_b64=SEED, sender_kid="k1")
+    assert env_client.store is store_from_env() and env_client.store.url == env_url
+    assert is_store_url(env_url) and not is_store_url("http://gw")
+
+
+def test_store_client_sharing_a_gateway_url_keeps_its_receipts(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPP_SEND_MODE", "background")
+    posted: list[dict] = []
+
+    def gateway(req: httpx.Request) -> httpx.Response:
+        body = json.loads(req.content)
+        posted.extend(body["envelopes"] if isinstance(body, dict) and "envelopes" in body else [body])
+        return httpx.Response(202, json={"ok": True})
+
+    remote = OPEClient(gateway_url="http://gw", sender_priv_b64=SEED, sender_kid="k1",
+                       http_client=httpx.Client(transport=httpx.MockTransport(gateway)))
+    store = SQLiteReceiptStore(str(tmp_path / "r.db"))
+    local = OPEClient(gateway_url="http://gw", sender_priv_b64=SEED, sender_kid="k1", store=store)
+    try:
+        for env in _envs(remote, "remote", 2):
+            decorators._send(remote, env)
+        for env in _envs(local, "local", 3):
+            decorators._send(local, env)
+        assert get_sender(remote).flush(timeout=5) and get_sender(local).flush(timeout=5)
+    finally:
+        shutdown_senders(timeout=5)
+    assert store.head("local")[0] == 3 and store.head("remote") is None
+    assert sorted(e["trace_id"] for e in posted) == ["remote", "remote"]
+
+
+def test_cli_and_batch_read_from_store(capsys, tmp_path):
+    client = OPEClient(gateway_url="http://gw", sender_priv_b64=SEED, sender_kid="k1")
+    url = f"sqlite://{tmp_path / 'r.db'}"
+    with open_store(url) as store:
+        store.append_many(_envs(client, "t1", 3) + _envs(client, "t2", 2))
+    opp_cli.passport(trace="t1", gateway=url, out=None, fmt="json", snapshot_db=None)
+    assert json.loads(capsys.readouterr().out)["receipts"] == 3
+    with pytest.raises(SystemExit) as e:
+        opp_cli.validate(trace="t1", gateway=url, api=None, deep=True, keys=None, trusted_only=False,
+                         workers=1, executor="thread", checkpoint_db=None)
+    out = json.loads(capsys.readouterr().out)
+    assert e.value.code == 0 and out["ok"] and out["deep"]["verified"] == 3
+
+    async def main():
+        return [o async for o in arun_batch(["t1", "t2", "missing"], "validate", gateway=url, executor="thread")]
+
+    by_id = {o["trace_id"]: o for o in asyncio.run(main())}
+    assert by_id["t1"]["ok"] and by_id["t2"]["result"]["count"] == 2
+    assert by_id["missing"]["result"]["count"] == 0
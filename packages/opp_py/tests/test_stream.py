@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+
+import pytest
+from opp.analyzer import BundleAnalyzer
+from opp.stream import BundleParser, aanalyze_stream, analyze_stream, iter_bundle_hops
+
+
+def _bundle(n: int = 5) -> dict:
+    chain = []
+    prev = None
+    for i in range(n):
+        hop = {"trace_id": "t", "receipt_hash": f"r{i}", "ts": f"2024-01-01T00:00:{i:02d}Z",
+               "normalized": {"step": f"s{i % 2}", "note": "ünïcødé ✓", "metrics": {"loss": 1.5 / (i + 1)}}}
+        if prev:
+            hop["prev_receipt_hash"] = prev
+        chain.append(hop)
+        prev = hop["receipt_hash"]
+    return {"trace_id": "t", "count": 12345, "chain": chain, "bundle_cid": "sha256:abc", "ts": "z"}
+
+
+def _chunks(body: bytes, size: int) -> list[bytes]:
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 64, 1 << 20])
+def test_hops_and_meta_match_full_parse(size):
+    bundle = _bundle()
+    body = json.dumps(bundle, indent=1, ensure_ascii=False).encode("utf-8")
+    meta: dict = {}
+    hops = list(iter_bundle_hops(_chunks(body, size), meta))
+    assert hops == bundle["chain"]
+    assert meta == {k: v for k, v in bundle.items() if k != "chain"}
+
+
+def test_analyze_stream_equals_analyze():
+    bundle = _bundle(9)
+    body = json.dumps(bundle).encode()
+    streamed = analyze_stream(_chunks(body, 11)).results()
+    assert streamed == BundleAnalyzer.analyze(bundle).results()
+    assert streamed["passport"]["bundle_cid"] == "sha256:abc"
+
+
+def test_async_stream():
+    bundle = _bundle(4)
+    body = json.dumps(bundle).encode()
+
+    async def gen():
+        for c in _chunks(body, 5):
+            yield c
+
+    a = asyncio.run(aanalyze_stream(gen(), {"graph", "validation"}))
+    assert a.graph()["count"] == 4 and a.validation()["ok"]
+
+
+def test_hops_key_and_empty():
+    assert list(iter_bundle_hops([b'{"hops": [{"a": 1}, {"a": 2}]}'])) == [{"a": 1}, {"a": 2}]
+    assert list(iter_bundle_hops([b'{"chain": []}'])) == []
+    meta: dict = {}
+    assert list(iter_bundle_hops([b"{}"], meta)) == [] and meta == {}
+
+
+def test_hops_are_yielded_before_body_ends():
+    p = BundleParser()
+    assert p.feed(b'{"trace_id": "t", "chain": [{"receipt_hash": "r0"}, ') == [{"receipt_hash": "r0"}]
+    assert p.feed(b'{"receipt_hash": "r1"}') == []  # may still be followed by more data
+    assert p.feed(b"]}") == [{"receipt_hash": "r1"}]
+    assert p.close() == []
+    assert p.meta == {"trace_id": "t"} and p.hop_key == "chain"
+
+
+@pytest.mark.parametrize("chunks", [[b'{"chain": [], "z": 1.', b'5}'], [b'{"z": 2e', b'3, "chain": []}'],
+                                    [b'{"z": -1.5E', b'+2, "chain": []}'], [b'{"z": -', b'7}'], [b'{"z": 10', b'0}']])
+def test_meta_numbers_split_at_chunk_edges(chunks):
+    meta: dict = {}
+    assert list(iter_bundle_hops(chunks, meta)) == []
+    assert meta == {k: v for k, v in json.loads(b"".join(chunks)).items() if k != "chain"}
+
+
+def test_random_chunking_matches_json_loads():
+    bundle = {**_bundle(3), "a": 1.25, "b": -3e-7, "c": 10, "d": 2.5e+30, "e": [1.5, 2], "f": True, "g": None}
+    body = json.dumps(bundle).encode()
+    for seed in range(40):
+        rng = random.Random(seed)
+        cuts = sorted(rng.sample(range(1, len(body)), rng.randint(1, 40)))
+        chunks = [body[i:j] for i, j in zip([0, *cuts], [*cuts, len(body)])]
+        meta: dict = {}
+        assert list(iter_bundle_hops(chunks, meta)) == bundle["chain"], seed
+        assert meta == {k: v for k, v in bundle.items() if k != "chain"}, seed
+
+
+@pytest.mark.parametrize("body", [b'{"chain": [{"a": 1}', b'[1, 2]', b'{"chain": [{"a": 1}]} x', b'{"a" 1}'])
+def test_malformed_bodies_raise(body):
+    with pytest.raises(ValueError):
+        list(iter_bundle_hops(_chunks(body, 4)))
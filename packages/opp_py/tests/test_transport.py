@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import base64
+
+import httpx
+import pytest
+from opp import odin_shim
+from opp.transport import TransportConfig, arequest, build_client, request
+
+NO_WAIT = TransportConfig(retries=2, backoff=0.0)
+
+
+def _flaky(codes: list[int]):
+    seen: list[int] = []
+
+    def handler(req: httpx.Request) -> httpx.Response:
+        code = codes[min(len(seen), len(codes) - 1)]
+        seen.append(code)
+        return httpx.Response(code, json={"n": len(seen)})
+
+    return seen, httpx.MockTransport(handler)
+
+
+def test_request_retries_retryable_statuses():
+    seen, mock = _flaky([503, 429, 200])
+    with httpx.Client(transport=mock) as c:
+        r = request(c, "GET", "http://gw/x", NO_WAIT)
+    assert r.status_code == 200 and seen == [503, 429, 200]
+
+
+def test_request_gives_up_after_retries():
+    seen, mock = _flaky([502])
+    with httpx.Client(transport=mock) as c:
+        r = request(c, "GET", "http://gw/x", NO_WAIT)
+    assert r.status_code == 502 and len(seen) == 3
+
+
+def test_request_does_not_retry_client_errors():
+    seen, mock = _flaky([404, 200])
+    with httpx.Client(transport=mock) as c:
+        assert request(c, "GET", "http://gw/x", NO_WAIT).status_code == 404
+    assert seen == [404]
+
+
+def test_request_reraises_transport_errors():
+    calls = []
+
+    def handler(req):
+        calls.append(req)
+        raise httpx.ConnectError("refused", request=req)
+
+    with httpx.Client(transport=httpx.MockTransport(handler)) as c, pytest.raises(httpx.ConnectError):
+        request(c, "GET", "http://gw/x", NO_WAIT)
+    assert len(calls) == 3
+
+
+def test_post_retried_only_when_not_processed():
+    def run(handler):
+        calls = []
+
+        def record(req):
+            calls.append(req)
+            return handler(req, len(calls))
+
+        with httpx.Client(transport=httpx.MockTransport(record)) as c:
+            try:
+                return request(c, "POST", "http://gw/x", NO_WAIT, json={}).status_code, len(calls)
+            except httpx.TransportError as e:
+                return type(e).__name__, len(calls)
+
+    def read_timeout(req, n):
+        raise httpx.ReadTimeout("slow", request=req)
+
+    def refused_once(req, n):
+        if n == 1:
+            raise httpx.ConnectError("refused", request=req)
+        return httpx.Response(201)
+
+    assert run(read_timeout) == ("ReadTimeout", 1)  # may have been stored: not resent
+    assert run(refused_once) == (201, 2)
+    assert run(lambda req, n: httpx.Response(502 if n == 1 else 201)) == (502, 1)
+    assert run(lambda req, n: httpx.Response(503 if n == 1 else 201)) == (503, 1)
+    assert run(lambda req, n: httpx.Response(503, headers={"retry-after": "0"}) if n == 1 else httpx.Response(201)) \
+        == (201, 2)
+
+
+def test_arequest_retries():
+    import asyncio
+
+    seen, mock = _flaky([504, 200])
+
+    async def go():
+        async with httpx.AsyncClient(transport=mock) as c:
+            return await arequest(c, "GET", "http://gw/x", NO_WAIT)
+
+    assert asyncio.run(go()).status_code == 200 and seen == [504, 200]
+
+
+def test_config_from_env_and_http2_degrades(monkeypatch):
+    monkeypatch.setenv("OPP_HTTP_MAX_CONNECTIONS", "7")
+    monkeypatch.setenv("OPP_HTTP2", "1")
+    cfg = TransportConfig.from_env(timeout=9.0)
+    assert cfg.max_connections == 7 and cfg.http2 and cfg.timeout == 9.0
+    assert cfg.delay(10) == cfg.backoff_max
+    build_client(cfg).close()  # must not raise even when h2 is not installed
+
+
+def test_opeclient_reuses_pool_and_rebuilds_after_fork(monkeypatch):
+    monkeypatch.setenv("OPP_SENDER_PRIV_B64", base64.urlsafe_b64encode(b"\x03" * 32).decode().rstrip("="))
+    built: list[object] = []
+
+    def fake_build(cfg):
+        c = httpx.Client(transport=httpx.MockTransport(lambda r: httpx.Response(202)))
+        built.append(c)
+        return c
+
+    monkeypatch.setattr(odin_shim, "build_client", fake_build)
+    client = odin_shim.OPEClient(gateway_url="http://gw")
+    env = client.create_envelope({"a": 1}, "evt", "tgt")
+    assert client.send_envelope(env)["status_code"] == 202
+    assert client.send_envelope(env)["status_code"] == 202
+    assert len(built) == 1
+    client._http_pid = -1  # simulate running in a forked child
+    client.send_envelope(env)
+    assert len(built) == 2
+    client.close()
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import base64
+import json
+
+import pytest
+from opp import cli as opp_cli
+from opp import verify
+from opp.checkpoint import CheckpointStore, PrefixTracker
+from opp.odin_shim import OPEClient
+from opp.verify import ReceiptVerifier, keys_from_jwks, verify_hops
+
+
+def _seed(b: int) -> str:
+    return base64.urlsafe_b64encode(bytes([b]) * 32).decode().rstrip("=")
+
+
+def _chain(n: int, seed: int = 3, kid: str = "k1", trace: str = "t") -> list[dict]:
+    client = OPEClient(gateway_url="http://gw", sender_priv_b64=_seed(seed), sender_kid=kid)
+    chain, prev = [], None
+    for i in range(n):
+        env = client.create_envelope({"step": f"s{i}", "i": i}, "opp.step.v1", "opp.step.v1",
+                                     trace_id=trace, ts=f"2024-01-01T00:00:{i:02d}Z")
+        hop = {**env, "receipt_hash": f"r{i}", "normalized": env["payload"]}
+        if prev:
+            hop["prev_receipt_hash"] = prev
+        prev = hop["receipt_hash"]
+        chain.append(hop)
+    return chain
+
+
+def _jwks(chain: list[dict]) -> dict:
+    sender = chain[0]["sender"]
+    return {"keys": [{**sender["jwk"], "kid": sender["kid"]}, {"kty": "RSA", "kid": "rsa"}]}
+
+
+def test_valid_chain_verifies():
+    chain = _chain(5)
+    res = verify_hops(chain)
+    assert res == {"ok": True, "count": 5, "verified": 5, "skipped": 0, "failure_count": 0, "failures": []}
+
+
+def test_tampering_is_reported_per_receipt():
+    chain = _chain(6)
+    chain[1]["payload"] = {**chain[1]["payload"], "i": 99}  # payload no longer matches its cid
+    chain[2]["signature"] = chain[3]["signature"]  # signature over another receipt
+    chain[3]["payload"] = {**chain[3]["payload"], "i": 99}
+    chain[3]["cid"] = verify.cid_of(chain[3]["payload"])  # consistent cid, but the signature is not
+    del chain[4]["signature"]
+    del chain[5]["payload"], chain[5]["normalized"]
+    res = verify_hops(chain)
+    assert not res["ok"] and res["count"] == 6 and res["verified"] == 1
+    assert [(f["index"], f["error"]) for f in res["failures"]] == [
+        (1, "cid_mismatch"), (2, "bad_signature"), (3, "bad_signature"),
+        (4, "missing_signature"), (5, "missing_payload"),
+    ]
+
+
+def test_trusted_keys_and_embedded_keys():
+    chain = _chain(3)
+    trusted = keys_from_jwks(_jwks(chain))
+    assert list(trusted) == ["k1"]
+    assert verify_hops(chain, trusted=trusted, allow_embedded=False)["ok"]
+    # a receipt signed by a key outside the trusted set
+    rogue = _chain(1, seed=9, kid="rogue")
+    res = verify_hops(chain + rogue, trusted=trusted, allow_embedded=False)
+    assert [(f["index"], f["error"]) for f in res["failures"]] == [(3, "unknown_key")]
+    # a trusted kid wins over whatever key the receipt embeds
+    forged = _chain(1, seed=9, kid="k1")
+    assert verify_hops(forged, trusted=trusted)["failures"][0]["error"] == "bad_signature"
+    assert verify_hops(forged)["ok"]  # embedded key alone: integrity only
+
+
+def test_pools_chunks_and_failure_cap():
+    chain = _chain(20)
+    for hop in chain[::2]:
+        hop["signature"] = chain[1]["signature"]
+    for executor in ("thread", "process"):
+        res = verify_hops(chain, workers=2, executor=executor, chunk_size=3, max_failures=4)
+        assert res["count"] == 20 and res["verified"] == 10 and res["failure_count"] == 10
+        assert [f["index"] for f in res["failures"]] == [0, 2, 4, 6]
+    with pytest.raises(ValueError):
+        ReceiptVerifier(workers=2, executor="fiber")
+
+
+def test_verified_signatures_are_memoized(monkeypatch):
+    chain = _chain(4, seed=11)
+    assert verify_hops(chain)["ok"]
+    monkeypatch.setattr(verify, "_keys", {})
+
+    def _no_crypto(raw):
+        raise AssertionError("signature re-verified")
+
+    monkeypatch.setattr(verify.Ed25519PublicKey, "from_public_bytes", _no_crypto)
+    assert verify_hops(chain)["ok"]
+
+
+def test_cli_validate_deep(monkeypatch, capsys, tmp_path):
+    chain = _chain(4)
+    keys = tmp_path / "jwks.json"
+    keys.write_text(json.dumps(_jwks(chain)))
+
+    def getter(url: str):
+        return {"trace_id": "t", "chain": chain}
+
+    def _iter_body(url: str):
+        body = json.dumps(getter(url)).encode()
+        return [body[i:i + 7] for i in range(0, len(body), 7)]
+
+    monkeypatch.setattr(opp_cli, "_get", getter)
+    monkeypatch.setattr(opp_cli, "_iter_body", _iter_body)
+    with pytest.raises(SystemExit) as e:
+        opp_cli.validate(trace="t", gateway="http://gw", api=None, deep=True, keys=str(keys),
+                         trusted_only=True, workers=1, executor="thread", checkpoint_db=None)
+    out = json.loads(capsys.readouterr().out)
+    assert e.value.code == 0 and out["ok"] and out["deep"]["verified"] == 4
+
+    chain[2]["payload"] = {"step": "forged"}
+    with pytest.raises(SystemExit) as e:
+        opp_cli.validate(trace="t", gateway="http://gw", api=None, deep=True, keys=None,
+                         trusted_only=False, workers=1, executor="thread", checkpoint_db=None)
+    out = json.loads(capsys.readouterr().out)
+    assert e.value.code == 2 and not out["ok"]
+    assert out["deep"]["failures"][0]["error"] == "cid_mismatch"
+
+
+def test_checkpointed_reverification_only_checks_new_hops(tmp_path):
+    db = str(tmp_path / "cp.sqlite")
+    chain = _chain(6)
+    with CheckpointStore(db) as store:
+        first = verify_hops(chain[:4], checkpoints=store, trace_id="t")
+        assert first["ok"] and first["verified"] == 4 and first["checkpoint"]["status"] == "none"
+    with CheckpointStore(db) as store:  # persisted across connections
+        grown = verify_hops(chain, checkpoints=store, trace_id="t")
+        assert grown["ok"] and (grown["skipped"], grown["verified"]) == (4, 2)
+        assert grown["checkpoint"] == {"status": "matched", "resumed_at": 4, "count": 6}
+        assert store.get("t", "embedded")["count"] == 6
+        # another key policy does not reuse the embedded-key checkpoint
+        trusted = keys_from_jwks(_jwks(chain))
+        assert verify_hops(chain, checkpoints=store, trace_id="t", trusted=trusted)["skipped"] == 0
+        assert len(store) == 2
+
+
+def test_checkpoint_mismatch_reverifies_everything(tmp_path):
+    chain = _chain(5)
+    with CheckpointStore(str(tmp_path / "cp.sqlite")) as store:
+        assert verify_hops(chain[:3], checkpoints=store, trace_id="t")["ok"]
+        chain[1]["payload"] = {"step": "rewritten"}  # history rewritten after the checkpoint
+        res = verify_hops(chain, checkpoints=store, trace_id="t")
+        assert not res["ok"] and res["skipped"] == 0 and res["checkpoint"]["status"] == "mismatch"
+        assert [f["index"] for f in res["failures"]] == [1]
+        assert store.get("t", "embedded")["count"] == 3  # failed runs are not checkpointed
+        truncated = verify_hops(chain[:2], checkpoints=store, trace_id="t")
+        assert truncated["checkpoint"]["status"] == "mismatch"
+
+
+def test_prefix_tracker_statuses():
+    chain = _chain(3)
+    t = PrefixTracker()
+    assert not any(t.feed(h) for h in chain) and t.finish() == "none"
+    cp = {"count": 2, "receipt_hash": "r1", "digest": PrefixTracker().digest}
+    t = PrefixTracker(cp)
+    assert [t.feed(h) for h in chain] == [True, True, False] and t.finish() == "mismatch"
+
+
+def test_cli_validate_deep_checkpoint(monkeypatch, capsys, tmp_path):
+    chain = _chain(5)
+    served = {"n": 3}
+
+    def _iter_body(url: str):
+        body = json.dumps({"trace_id": "t", "chain": chain[:served["n"]]}).encode()
+        return [body[i:i + 64] for i in range(0, len(body), 64)]
+
+    monkeypatch.setattr(opp_cli, "_iter_body", _iter_body)
+    db = str(tmp_path / "cp.sqlite")
+    runs = []
+    for n in (3, 5):
+        served["n"] = n
+        with pytest.raises(SystemExit) as e:
+            opp_cli.validate(trace="t", gateway="http://gw", api=None, deep=True, keys=None, trusted_only=False,
+                             workers=1, executor="thread", checkpoint_db=db)
+        assert e.value.code == 0
+        runs.append(json.loads(capsys.readouterr().out)["deep"])
+    assert [(r["skipped"], r["verified"]) for r in runs] == [(0, 3), (3, 2)]
+
+    chain[0]["ts"] = "2030-01-01T00:00:00Z"  # rewritten history: full re-run flags it
+    with pytest.raises(SystemExit) as e:
+        opp_cli.validate(trace="t", gateway="http://gw", api=None, deep=True, keys=None, trusted_only=False,
+                         workers=1, executor="thread", checkpoint_db=db)
+    out = json.loads(capsys.readouterr().out)
+    assert e.value.code == 2 and out["deep"]["checkpoint"]["status"] == "mismatch"
+    assert out["deep"]["skipped"] == 0 and out["deep"]["failures"][0]["index"] == 0
@@ -1,119 +1,546 @@
 from __future__ import annotations
-import base64, json, hashlib
-from typing import Optional, Dict, Any
-from fastapi import FastAPI, HTTPException
+import asyncio, base64, json, hashlib, os, time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, Optional, Dict, Any, List, Tuple
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
 import httpx
-from opp.graph import build_graph_from_bundle, to_passport  # type: ignore
+from opp import metrics  # type: ignore
+from opp.analyzer import ALL_OUTPUTS, BundleAnalyzer  # type: ignore
+from opp.cache import TTLCache  # type: ignore
+from opp.chain import ReceiptChain  # type: ignore
+from opp.formats import MEDIA_TYPES, encode, negotiate  # type: ignore
+from opp.canonical import cid_of  # type: ignore
+from opp.jwks import JWKSCache, verify_ed25519  # type: ignore
+from opp.singleflight import SingleFlight  # type: ignore
+from opp.snapshot import SnapshotStore, resume, snapshot_scope  # type: ignore
+from opp.stream import aiter_bundle_hops  # type: ignore
+from opp.verify import keys_from_jwks, verify_hops  # type: ignore
+from opp.checkpoint import CheckpointStore  # type: ignore
+from opp.store import is_store_url, open_store  # type: ignore
+from opp.transport import TransportConfig, aopen_stream, arequest, build_async_client  # type: ignore
 
-app = FastAPI(title="OPP Exporter API", version="0.1.0")
+# One pooled keep-alive client for all upstream (gateway) calls, owned by the app lifespan.
+TRANSPORT = TransportConfig.from_env(timeout=15.0)
+_http: Optional[httpx.AsyncClient] = None
 
-def canonical(obj: Any) -> bytes:
-    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+def http_client() -> httpx.AsyncClient:
+    global _http
+    if _http is None or _http.is_closed:
+        _http = build_async_client(TRANSPORT)
+    return _http
 
-def sha256_hex(b: bytes) -> str:
-    import hashlib
-    return hashlib.sha256(b).hexdigest()
+# Deep (?deep=true) validation: per-receipt CID + signature checks, off the event loop.
+VERIFY_WORKERS = int(os.getenv("OPP_VERIFY_WORKERS", "1"))
+VERIFY_TRUSTED_ONLY = os.getenv("OPP_VERIFY_TRUSTED_ONLY", "").lower() in ("1", "true", "yes")
+_verify_pool: Optional[ProcessPoolExecutor] = None
+# Verified chain prefixes: a grown trace only has its new hops deep-verified.
+CHECKPOINTS = CheckpointStore(os.environ["OPP_CHECKPOINT_DB"]) if os.getenv("OPP_CHECKPOINT_DB") else None
+# Analyzer state per trace (opp.snapshot): a changed trace only has its new hops folded into the cached
+# graph/passport/policy/validation. The previous cache entry carries it; OPP_SNAPSHOT_DB keeps it across
+# expiry and restarts.
+SNAPSHOTS = SnapshotStore(os.environ["OPP_SNAPSHOT_DB"]) if os.getenv("OPP_SNAPSHOT_DB") else None
+
+# Local receipt store (opp.store): when OPP_RECEIPT_STORE is set, requests without ?gateway=
+# are served from it instead of a live gateway.
+DEFAULT_GATEWAY = "http://127.0.0.1:8080"
+STORE = open_store(os.environ["OPP_RECEIPT_STORE"], readonly=True) if os.getenv("OPP_RECEIPT_STORE") else None
+
+def source(gateway: Optional[str]) -> str:
+    if gateway is None:
+        return STORE.url if STORE is not None else DEFAULT_GATEWAY
+    if is_store_url(gateway) and (STORE is None or gateway != STORE.url):
+        raise HTTPException(status_code=400, detail="only the configured receipt store can be read")
+    return gateway
+
+def sender_keys() -> Dict[str, bytes]:
+    path = os.getenv("OPP_SENDER_JWKS")
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return keys_from_jwks(json.load(f))
+
+def verify_pool() -> Optional[ProcessPoolExecutor]:
+    """Long-lived worker processes, so their verified-signature memo survives between requests."""
+    global _verify_pool
+    if _verify_pool is None and VERIFY_WORKERS > 1:
+        _verify_pool = ProcessPoolExecutor(max_workers=VERIFY_WORKERS)
+    return _verify_pool
+
+def deep_verify(hops: list, trace_id: str) -> Dict[str, Any]:
+    pool = verify_pool()
+    return verify_hops(hops, checkpoints=CHECKPOINTS, trusted=sender_keys(), allow_embedded=not VERIFY_TRUSTED_ONLY,
+                       trace_id=trace_id, workers=VERIFY_WORKERS, executor=pool if pool is not None else "thread")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _verify_pool
+    client = http_client()
+    try:
+        yield
+    finally:
+        await client.aclose()
+        if _verify_pool is not None:
+            _verify_pool.shutdown(cancel_futures=True)
+            _verify_pool = None
+
+app = FastAPI(title="OPP Exporter API", version="0.1.0", lifespan=lifespan)
+
+# Bundle/artifact cache: one entry per (gateway, trace) holding the derived graph, passport,
+# policy and validation results, revalidated against the gateway with If-None-Match once
+# older than OPP_CACHE_FRESH_SECONDS. Artifacts are also indexed by the gateway's bundle
+# CID header so a changed ETag over identical content is never parsed again.
+CACHE = TTLCache(
+    maxsize=int(os.getenv("OPP_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("OPP_CACHE_TTL", "300")),
+    disk_dir=os.getenv("OPP_CACHE_DIR") or None,
+)
+CACHE_FRESH = float(os.getenv("OPP_CACHE_FRESH_SECONDS", "1"))
+CACHE_EVENTS: Dict[str, int] = {"revalidated": 0, "refetched": 0, "cid_reused": 0, "resumed": 0, "resume_mismatch": 0}
+SIG_HEADERS = ("x-odin-response-cid", "x-odin-bundle-cid", "x-odin-signature", "x-odin-kid")
+
+# Concurrent identical upstream fetches and derived computations share one in-flight call.
+FLIGHTS = SingleFlight()
+
+# Latency histograms (opp.metrics; recorded with OPP_METRICS=1, spans with OPP_OTEL=1), served on /metrics.
+FETCH = metrics.histogram("opp_exporter_fetch_seconds", "Upstream export fetch time (response headers, full body)",
+                          ("stage",))
+PARSE = metrics.histogram("opp_exporter_parse_seconds", "JSON parse time of a downloaded export bundle")
+ANALYZE = metrics.histogram("opp_exporter_analyze_seconds",
+                            "Folding hops into the analyzer (stream: overlapped with the download)", ("source",))
+COMPUTE = metrics.histogram("opp_exporter_compute_seconds", "Deriving one cached artifact of an analyzed trace",
+                            ("artifact",))
+REQUEST = metrics.histogram("opp_exporter_request_seconds", "Request handling time until the response starts",
+                            ("route",))
+
+async def _timed_request(request: Request, call_next):
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.observe(REQUEST, time.perf_counter() - t0, getattr(route, "path", "unmatched"))
+    return response
+
+if metrics.enabled():
+    app.middleware("http")(_timed_request)
 
 def b64u_decode(s: str) -> bytes:
     s = s.strip()
     pad = "=" * (-len(s) % 4)
     return base64.urlsafe_b64decode(s + pad)
 
-def verify_signature(jwk: Dict[str, Any], message: bytes, sig_b64u: str) -> bool:
-    try:
-        from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
-        pub = Ed25519PublicKey.from_public_bytes(b64u_decode(jwk["x"]))
-        pub.verify(b64u_decode(sig_b64u), message)
-        return True
-    except Exception:
-        return False
+# Parsed signing keys per gateway, refreshed as the JWKS Cache-Control allows.
+JWKS: Dict[str, JWKSCache] = {}
+
+def jwks_for(gw: str) -> JWKSCache:
+    cache = JWKS.get(gw)
+    if cache is None:
+        cache = JWKS[gw] = JWKSCache(
+            f"{gw}/.well-known/jwks.json",
+            lambda url: arequest(http_client(), "GET", url, TRANSPORT),
+            default_ttl=float(os.getenv("OPP_JWKS_TTL", "300")),
+        )
+    return cache
+
+async def _fetch_json(url: str) -> Dict[str, Any]:
+    r = await arequest(http_client(), "GET", url, TRANSPORT)
+    r.raise_for_status()
+    return r.json()
 
 async def fetch_json(url: str) -> Dict[str, Any]:
-    async with httpx.AsyncClient(timeout=15.0) as client:
-        r = await client.get(url)
-        r.raise_for_status()
-        return r.json()
+    """GET JSON, coalesced with identical in-flight fetches (callers must not mutate the result)."""
+    return await FLIGHTS.do(("json", url), lambda: _fetch_json(url))
 
-@app.get("/graph/{trace_id}")
-async def graph(trace_id: str, gateway: Optional[str] = None):
-    gw = gateway or "http://127.0.0.1:8080"
-    bundle = await fetch_json(f"{gw}/v1/receipts/export/{trace_id}")
-    # build minimal graph
+def _analyzed(analyzer: BundleAnalyzer) -> Dict[str, Any]:
+    """Cache entry fields of a finished analysis: the artifacts and the state to resume from."""
+    with metrics.timed(COMPUTE, "snapshot"):
+        snap = analyzer.snapshot()
+    # the graph is cached in columnar form (opp.chain) and materialized per /graph request
+    artifacts = {"chain": snap["chain"]}
+    for name, derive in (("passport", analyzer.passport), ("policy", analyzer.policy),
+                         ("validation", analyzer.validation)):
+        with metrics.timed(COMPUTE, name):
+            artifacts[name] = derive()
+    return {"artifacts": artifacts, "snapshot": snap}
+
+def _fold(snapshot: Optional[Dict[str, Any]], feed: Callable[[BundleAnalyzer], None]) -> Tuple[BundleAnalyzer, str]:
+    """Run ``feed`` on an analyzer resumed from ``snapshot``; from scratch if the trace no longer extends it."""
+    analyzer = resume(snapshot)
+    feed(analyzer)
+    status = analyzer.finish()
+    if status == "mismatch":
+        analyzer = BundleAnalyzer()
+        feed(analyzer)
+    return analyzer, status
+
+def _count_resume(status: str) -> None:
+    if status == "matched":
+        CACHE_EVENTS["resumed"] += 1
+    elif status == "mismatch":
+        CACHE_EVENTS["resume_mismatch"] += 1
+
+async def _prev_snapshot(gw: str, trace_id: str, entry: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if entry is not None and "snapshot" in entry:
+        return entry["snapshot"]
+    if SNAPSHOTS is None:
+        return None
+    return await asyncio.to_thread(SNAPSHOTS.get, trace_id, snapshot_scope(ALL_OUTPUTS, gw))
+
+async def _save_snapshot(gw: str, trace_id: str, new: Dict[str, Any]) -> None:
+    if SNAPSHOTS is not None and "snapshot" in new:
+        await asyncio.to_thread(SNAPSHOTS.put, trace_id, new["snapshot"], snapshot_scope(ALL_OUTPUTS, gw))
+
+async def load_trace(gw: str, trace_id: str, need_cid: bool = False, deep: bool = False) -> Dict[str, Any]:
+    """Cached entry for a trace: derived artifacts, signature headers and, once computed, the local CID.
+
+    ``need_cid`` takes the full-body path (the CID covers the whole canonical bundle);
+    otherwise a miss is analyzed hop by hop while the body streams in. ``deep`` adds the
+    per-receipt verification result. Concurrent loads of the same trace share one
+    upstream fetch.
+    """
+    need_cid = need_cid or deep
+    if not need_cid and FLIGHTS.pending(("trace", gw, trace_id, True, False)):
+        need_cid = True  # a full load is already running and covers this request too
+    return await FLIGHTS.do(("trace", gw, trace_id, need_cid, deep),
+                            lambda: _load_trace(gw, trace_id, need_cid, deep))
+
+CID_FIELDS = ("artifacts", "snapshot", "local_cid", "sig_ts", "deep")
+
+def _covers(entry: Optional[Dict[str, Any]], need_cid: bool, deep: bool) -> bool:
+    return entry is not None and (not need_cid or "local_cid" in entry) and (not deep or "deep" in entry)
+
+def _bundle_entry(bundle: Dict[str, Any], trace_id: str, deep: bool, snapshot: Optional[Dict[str, Any]],
+                  local_cid: Optional[str] = None) -> Dict[str, Any]:
     chain = bundle.get("chain") or bundle.get("hops", [])
-    nodes = [{"id": r.get("receipt_hash"), "ts": r.get("ts")} for r in chain]
-    edges = [{"from": chain[i-1].get("receipt_hash"), "to": chain[i].get("receipt_hash")} for i in range(1, len(chain))]
-    return {"trace_id": trace_id, "nodes": nodes, "edges": edges, "count": len(nodes)}
 
-@app.get("/validate/{trace_id}")
-async def validate(trace_id: str, gateway: Optional[str] = None, kid: Optional[str] = None):
-    gw = gateway or "http://127.0.0.1:8080"
-    # fetch bundle + headers via httpx to get signature headers
-    async with httpx.AsyncClient(timeout=15.0) as client:
-        r = await client.get(f"{gw}/v1/receipts/export/{trace_id}")
+    def feed(analyzer: BundleAnalyzer) -> None:
+        analyzer.set_meta(bundle)
+        analyzer.feed_all(chain)
+
+    with metrics.timed(ANALYZE, "bundle", span="exporter.analyze"):
+        analyzer, status = _fold(snapshot, feed)
+    _count_resume(status)
+    if local_cid is None:
+        with metrics.timed(COMPUTE, "cid"):
+            local_cid = cid_of(bundle)
+    return {
+        **_analyzed(analyzer),
+        "local_cid": local_cid,
+        "sig_ts": bundle.get("ts") or (chain[-1].get("ts") if chain else None),
+    }
+
+def _parsed_bundle(body: bytes) -> Tuple[Dict[str, Any], str]:
+    """Parse a downloaded bundle and hash it (run in a thread: multi-MB bodies would stall the loop)."""
+    with metrics.timed(PARSE, span="exporter.parse"):
+        bundle = json.loads(body)
+    with metrics.timed(COMPUTE, "cid"):
+        return bundle, cid_of(bundle)
+
+def _store_entry(trace_id: str, snapshot: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    def feed(analyzer: BundleAnalyzer) -> None:  # only the rows after the snapshot are read
+        analyzer.set_meta({"trace_id": trace_id})
+        analyzer.skip(analyzer.resumed_at)
+        analyzer.feed_all(STORE.iter_hops(trace_id, analyzer.resumed_at))
+
+    with metrics.timed(ANALYZE, "store", span="exporter.analyze"):
+        analyzer, status = _fold(snapshot, feed)
+    _count_resume(status)
+    return _analyzed(analyzer)
+
+async def _stream_analysis(r: httpx.Response, snapshot: Optional[Dict[str, Any]]) -> BundleAnalyzer:
+    meta: Dict[str, Any] = {}
+    analyzer = resume(snapshot)
+    with metrics.timed(ANALYZE, "stream", span="exporter.analyze"):
+        async for hop in aiter_bundle_hops(r.aiter_bytes(), meta):
+            analyzer.feed(hop)
+    analyzer.set_meta(meta)
+    return analyzer
+
+async def _load_stored(key: str, entry: Optional[Dict[str, Any]], usable: bool, trace_id: str, need_cid: bool,
+                       deep: bool) -> Dict[str, Any]:
+    """Store-backed load: the trace's head (hop count + last receipt hash) plays the ETag."""
+    head = await asyncio.to_thread(STORE.head, trace_id)
+    if head is None:
+        raise HTTPException(status_code=404, detail=f"trace {trace_id!r} not in receipt store")
+    version = f"{head[0]}:{head[1]}"
+    if usable and entry.get("etag") == version:
+        CACHE_EVENTS["revalidated"] += 1
+        entry = {**entry, "checked": time.time()}
+        CACHE.set(key, entry)
+        return entry
+    CACHE_EVENTS["refetched"] += 1
+    snapshot = await _prev_snapshot(STORE.url, trace_id, entry)
+    new: Dict[str, Any] = {"etag": version, "checked": time.time(), "headers": {}, "source": "store"}
+    if need_cid:  # the bundle CID covers the whole trace
+        bundle = await asyncio.to_thread(STORE.export, trace_id)
+        new.update(await asyncio.to_thread(_bundle_entry, bundle, trace_id, deep, snapshot))
+        if deep:
+            with metrics.timed(COMPUTE, "deep", span="exporter.deep_verify"):
+                new["deep"] = await asyncio.to_thread(deep_verify, bundle["chain"], trace_id)
+    else:
+        new.update(await asyncio.to_thread(_store_entry, trace_id, snapshot))
+    await _save_snapshot(STORE.url, trace_id, new)
+    CACHE.set(key, new)
+    return new
+
+async def _load_trace(gw: str, trace_id: str, need_cid: bool, deep: bool) -> Dict[str, Any]:
+    key = f"trace|{gw}|{trace_id}"
+    entry = CACHE.get(key)
+    usable = _covers(entry, need_cid, deep)
+    if usable and time.time() - entry["checked"] < CACHE_FRESH:
+        return entry
+    if STORE is not None and gw == STORE.url:
+        return await _load_stored(key, entry, usable, trace_id, need_cid, deep)
+    headers = {"If-None-Match": entry["etag"]} if usable and entry.get("etag") else {}
+    with metrics.timed(FETCH, "headers", span="exporter.fetch"):
+        r = await aopen_stream(http_client(), "GET", f"{gw}/v1/receipts/export/{trace_id}", TRANSPORT, headers=headers)
+    try:
+        if r.status_code == 304 and usable:
+            CACHE_EVENTS["revalidated"] += 1
+            entry = {**entry, "checked": time.time()}
+            CACHE.set(key, entry)
+            return entry
         r.raise_for_status()
-        bundle = r.json()
+        CACHE_EVENTS["refetched"] += 1
         hdrs = {k.lower(): v for k, v in r.headers.items()}
+        new: Dict[str, Any] = {
+            "etag": hdrs.get("etag"),
+            "checked": time.time(),
+            "headers": {h: hdrs[h] for h in SIG_HEADERS if h in hdrs},
+        }
+        hdr_cid = hdrs.get("x-odin-response-cid") or hdrs.get("x-odin-bundle-cid")
+        known = CACHE.get(f"cid|{gw}|{hdr_cid}") if hdr_cid and not need_cid else None
+        if need_cid:
+            with metrics.timed(FETCH, "body", span="exporter.fetch"):
+                body = await r.aread()
+            bundle, local_cid = await asyncio.to_thread(_parsed_bundle, body)
+            # reuse is keyed on the CID of the bytes received, never on the gateway's header:
+            # a replayed header over a changed body must not inherit the old verdicts
+            known = CACHE.get(f"cid|{gw}|{local_cid}")
+            if known is not None and known.get("local_cid") == local_cid and _covers(known, need_cid, deep):
+                CACHE_EVENTS["cid_reused"] += 1
+                new.update(known)
+            else:
+                snapshot = await _prev_snapshot(gw, trace_id, entry)
+                new.update(await asyncio.to_thread(_bundle_entry, bundle, trace_id, deep, snapshot, local_cid))
+                if deep:
+                    with metrics.timed(COMPUTE, "deep", span="exporter.deep_verify"):
+                        new["deep"] = await asyncio.to_thread(deep_verify, bundle.get("chain") or bundle.get("hops", []),
+                                                              trace_id)
+                CACHE.set(f"cid|{gw}|{local_cid}", {k: new[k] for k in CID_FIELDS if k in new})
+        elif known is not None:
+            # graph/passport/policy take the gateway's word for the CID; the CID and verification
+            # results stay behind, so /validate still hashes and checks the body itself
+            CACHE_EVENTS["cid_reused"] += 1
+            new.update({k: known[k] for k in ("artifacts", "snapshot") if k in known})
+        else:
+            analyzer = await _stream_analysis(r, await _prev_snapshot(gw, trace_id, entry))
+            status = analyzer.finish()
+            _count_resume(status)
+            if status == "mismatch":  # history changed under the snapshot: analyze a fresh download
+                await r.aclose()
+                with metrics.timed(FETCH, "headers", span="exporter.fetch"):
+                    r = await aopen_stream(http_client(), "GET", f"{gw}/v1/receipts/export/{trace_id}", TRANSPORT)
+                r.raise_for_status()
+                analyzer = await _stream_analysis(r, None)
+            new.update(_analyzed(analyzer))
+            if hdr_cid:
+                CACHE.set(f"cid|{gw}|{hdr_cid}", {k: new[k] for k in ("artifacts", "snapshot")})
+    finally:
+        await r.aclose()
+    await _save_snapshot(gw, trace_id, new)
+    CACHE.set(key, new)
+    return new
+
+async def graph_result(gw: str, trace_id: str) -> Dict[str, Any]:
+    entry = await load_trace(gw, trace_id)
+    arts = entry["artifacts"]
+    with metrics.timed(COMPUTE, "graph"):
+        graph = arts["graph"] if "graph" in arts else ReceiptChain.from_dict(arts["chain"]).graph()  # pre-chain disk entries
+    return {"trace_id": trace_id, **graph}
+
+async def validate_result(gw: str, trace_id: str, kid: Optional[str] = None, deep: bool = False) -> Dict[str, Any]:
+    return await FLIGHTS.do(("validate", gw, trace_id, kid, deep), lambda: _validate(gw, trace_id, kid, deep))
+
+async def passport_result(gw: str, trace_id: str) -> Dict[str, Any]:
+    entry = await load_trace(gw, trace_id)
+    return entry["artifacts"]["passport"]
+
+async def policy_result(gw: str, trace_id: str) -> Dict[str, Any]:
+    entry = await load_trace(gw, trace_id)
+    return {"trace_id": trace_id, **entry["artifacts"]["policy"]}
+
+async def negotiated(result: Dict[str, Any], accept: Optional[str]) -> Response:
+    """``result`` as JSON, or CBOR (opp.formats) when the client's Accept header prefers it."""
+    fmt = negotiate(accept)
+    if fmt == "json":
+        return JSONResponse(result, headers={"Vary": "Accept"})
+    body = await asyncio.to_thread(encode, result, fmt)  # big graphs: keep the event loop free
+    return Response(body, media_type=MEDIA_TYPES[fmt], headers={"Vary": "Accept"})
+
+@app.get("/graph/{trace_id}")
+async def graph(trace_id: str, gateway: Optional[str] = None, accept: Optional[str] = Header(None)):
+    return await negotiated(await graph_result(source(gateway), trace_id), accept)
+
+@app.get("/validate/{trace_id}")
+async def validate(trace_id: str, gateway: Optional[str] = None, kid: Optional[str] = None, deep: bool = False,
+                   accept: Optional[str] = Header(None)):
+    return await negotiated(await validate_result(source(gateway), trace_id, kid, deep), accept)
+
+async def _validate(gw: str, trace_id: str, kid: Optional[str], deep: bool) -> Dict[str, Any]:
+    # bundle + signature headers (cached, revalidated with the gateway's ETag)
+    entry = await load_trace(gw, trace_id, need_cid=True, deep=deep)
+    hdrs = entry["headers"]
     # local CID
-    local_cid = "sha256:" + sha256_hex(canonical(bundle))
+    local_cid = entry["local_cid"]
     hdr_cid = hdrs.get("x-odin-response-cid") or hdrs.get("x-odin-bundle-cid")
     cid_match = hdr_cid == local_cid if hdr_cid else False
     # chain check
-    chain = bundle.get("chain") or bundle.get("hops", [])
-    chain_ok = all(i == 0 or chain[i]["prev_receipt_hash"] == chain[i-1]["receipt_hash"] for i in range(len(chain)))
+    chain_ok = entry["artifacts"]["validation"]["ok"]
+    if entry.get("source") == "store":
+        # locally stored receipts carry no gateway bundle signature: chain (+ deep) checks only
+        result = {"ok": chain_ok, "chain_ok": chain_ok, "source": "store", "bundle_cid": local_cid}
+        if deep:
+            result["deep"] = entry["deep"]
+            result["ok"] = chain_ok and entry["deep"]["ok"]
+        return result
     # signature verify
     sig = hdrs.get("x-odin-signature")
     kid_hdr = hdrs.get("x-odin-kid") or kid
-    jwks = await fetch_json(f"{gw}/.well-known/jwks.json")
-    jwk = None
-    for k in jwks.get("keys", []):
-        if not kid_hdr or k.get("kid") == kid_hdr:
-            jwk = k; break
+    pub = await jwks_for(gw).aget(kid_hdr) if sig else None
     sig_ok = False
     variant = None
-    if sig and jwk:
+    if sig and pub:
+        try:
+            sig_bytes = b64u_decode(sig)
+        except ValueError:
+            sig_bytes = b""
         # try cid|trace|ts then cid only
         for v in ["cid|trace|ts", "cid"]:
             if v == "cid|trace|ts":
-                ts = bundle.get("ts") or (chain[-1].get("ts") if chain else None)
+                ts = entry["sig_ts"]
                 msg = f"{local_cid}|{trace_id}|{ts}".encode("utf-8") if ts else None
             else:
                 msg = local_cid.encode("utf-8")
-            if msg and verify_signature(jwk, msg, sig):
+            if msg and sig_bytes and verify_ed25519(pub, msg, sig_bytes):
                 sig_ok = True; variant = v; break
-    return {"ok": bool(cid_match and chain_ok and sig_ok), "chain_ok": chain_ok, "cid_match": cid_match, "sig_ok": sig_ok, "sig_variant": variant, "bundle_cid": local_cid, "kid": kid_hdr}
+    result = {"ok": bool(cid_match and chain_ok and sig_ok), "chain_ok": chain_ok, "cid_match": cid_match, "sig_ok": sig_ok, "sig_variant": variant, "bundle_cid": local_cid, "kid": kid_hdr}
+    if deep:
+        result["deep"] = entry["deep"]
+        result["ok"] = result["ok"] and entry["deep"]["ok"]
+    return result
 
 @app.get("/healthz")
 async def healthz():
     return {"ok": True, "service": "opp-exporter", "version": "0.1.0"}
 
 @app.get("/passport/{trace_id}")
-async def passport(trace_id: str, gateway: Optional[str] = None):
-    gw = gateway or "http://127.0.0.1:8080"
-    bundle = await fetch_json(f"{gw}/v1/receipts/export/{trace_id}")
-    graph = build_graph_from_bundle(bundle)
-    return to_passport(graph, bundle)
+async def passport(trace_id: str, gateway: Optional[str] = None, accept: Optional[str] = Header(None)):
+    return await negotiated(await passport_result(source(gateway), trace_id), accept)
 
 @app.get("/policy/{trace_id}")
-async def policy(trace_id: str, gateway: Optional[str] = None):
-    gw = gateway or "http://127.0.0.1:8080"
-    bundle = await fetch_json(f"{gw}/v1/receipts/export/{trace_id}")
-    chain = bundle.get("chain") or bundle.get("hops") or []
-    decisions = []
-    breaches = []
-    engines = []
-    for r in chain:
-        norm = r.get("normalized", {})
-        policy = norm.get("policy") or {}
-        if isinstance(policy, dict):
-            eng = policy.get("engine") or policy.get("policy_engine")
-            if eng and eng not in engines:
-                engines.append(eng)
-            decs = policy.get("decisions") or norm.get("policy_decisions")
-            if isinstance(decs, list):
-                for d in decs:
-                    if isinstance(d, dict):
-                        decisions.append(d)
-                        outcome = (d.get("outcome") or d.get("result") or d.get("decision") or "").lower()
-                        if outcome and outcome not in ("allow", "pass", "ok"):
-                            breaches.append(d)
-    return {"trace_id": trace_id, "engines": engines, "decisions": decisions, "breaches": breaches, "breach_count": len(breaches)}
+async def policy(trace_id: str, gateway: Optional[str] = None, accept: Optional[str] = Header(None)):
+    return await negotiated(await policy_result(source(gateway), trace_id), accept)
+
+# Multi-trace endpoints: results stream back as NDJSON in completion order, at most
+# OPP_BATCH_CONCURRENCY traces in flight, each bounded by OPP_BATCH_ITEM_TIMEOUT seconds.
+BATCH_CONCURRENCY = int(os.getenv("OPP_BATCH_CONCURRENCY", "16"))
+BATCH_ITEM_TIMEOUT = float(os.getenv("OPP_BATCH_ITEM_TIMEOUT", "30"))
+BATCH_MAX_ITEMS = int(os.getenv("OPP_BATCH_MAX_ITEMS", "5000"))
+
+class BatchRequest(BaseModel):
+    trace_ids: List[str]
+    gateway: Optional[str] = None
+    deep: bool = False
+    kid: Optional[str] = None
+    concurrency: Optional[int] = None
+    timeout: Optional[float] = None
+
+async def _batch_item(command: str, req: BatchRequest, gw: str, trace_id: str, timeout: float) -> Dict[str, Any]:
+    if command == "validate":
+        work = validate_result(gw, trace_id, req.kid, req.deep)
+    else:
+        work = {"graph": graph_result, "passport": passport_result, "policy": policy_result}[command](gw, trace_id)
+    try:
+        result = await asyncio.wait_for(work, timeout)
+    except TimeoutError:
+        return {"trace_id": trace_id, "ok": False, "error": f"timeout after {timeout}s"}
+    except httpx.HTTPStatusError as e:
+        return {"trace_id": trace_id, "ok": False, "error": f"upstream {e.response.status_code}", "status": e.response.status_code}
+    except HTTPException as e:
+        return {"trace_id": trace_id, "ok": False, "error": str(e.detail), "status": e.status_code}
+    except Exception as e:  # noqa: BLE001 - one bad trace becomes its error line, not a broken stream
+        return {"trace_id": trace_id, "ok": False, "error": f"{type(e).__name__}: {e}"}
+    ok = bool(result.get("ok")) if command == "validate" else True
+    return {"trace_id": trace_id, "ok": ok, "result": result}
+
+async def _batch_lines(command: str, req: BatchRequest):
+    gw = source(req.gateway)
+    timeout = min(req.timeout or BATCH_ITEM_TIMEOUT, BATCH_ITEM_TIMEOUT)
+    ids = iter(req.trace_ids)
+    queue: asyncio.Queue = asyncio.Queue()
+    summary = {"total": 0, "ok": 0, "failed": 0, "errors": 0}
+    started = time.perf_counter()
+
+    async def worker() -> None:
+        try:
+            for trace_id in ids:  # shared iterator: each id is taken by exactly one worker
+                queue.put_nowait(await _batch_item(command, req, gw, trace_id, timeout))
+        finally:
+            queue.put_nowait(None)
+
+    n = max(1, min(req.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY, len(req.trace_ids) or 1))
+    workers = [asyncio.ensure_future(worker()) for _ in range(n)]
+    try:
+        running = n
+        while running:
+            item = await queue.get()
+            if item is None:
+                running -= 1
+                continue
+            summary["total"] += 1
+            summary["ok" if item["ok"] else "errors" if "error" in item else "failed"] += 1
+            yield json.dumps(item, separators=(",", ":")) + "\n"
+        yield json.dumps({"summary": {**summary, "seconds": round(time.perf_counter() - started, 3)}}) + "\n"
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+@app.post("/batch/{command}")
+async def batch(command: str, req: BatchRequest):
+    if command not in ("graph", "validate", "passport", "policy"):
+        raise HTTPException(status_code=404, detail=f"unknown batch command {command!r}")
+    if len(req.trace_ids) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"at most {BATCH_MAX_ITEMS} trace ids per batch")
+    return StreamingResponse(_batch_lines(command, req), media_type="application/x-ndjson")
+
+def cache_metrics():
+    """Cache, upstream-event and single-flight counters for /metrics, read at scrape time."""
+    stats, flights = CACHE.stats(), FLIGHTS.stats()
+    yield "opp_exporter_cache_entries", "gauge", "Cached trace and bundle-CID entries", [({}, stats["size"])]
+    for name in ("hits", "misses", "disk_hits", "evictions", "expirations"):
+        yield (f"opp_exporter_cache_{name}_total", "counter", f"Artifact cache {name.replace('_', ' ')}",
+               [({}, stats[name])])
+    yield ("opp_exporter_cache_events_total", "counter", "Upstream revalidations, refetches, CID reuses and resumes",
+           [({"event": k}, v) for k, v in CACHE_EVENTS.items()])
+    yield "opp_exporter_singleflight_calls_total", "counter", "Coalesced calls", [({}, flights["calls"])]
+    yield "opp_exporter_singleflight_shared_total", "counter", "Calls served by another in-flight call", \
+        [({}, flights["shared"])]
+    if SNAPSHOTS is not None:
+        yield "opp_exporter_snapshots", "gauge", "Saved analyzer snapshots", [({}, len(SNAPSHOTS))]
+
+metrics.register_collector(cache_metrics)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text format: latency histograms (with OPP_METRICS=1) plus cache and sender counters."""
+    return Response(await asyncio.to_thread(metrics.render), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {**CACHE.stats(), **CACHE_EVENTS, "single_flight": FLIGHTS.stats(),
+            "jwks": [c.stats() for c in JWKS.values()],
+            "checkpoints": CHECKPOINTS.stats() if CHECKPOINTS is not None else None,
+            "snapshots": SNAPSHOTS.stats() if SNAPSHOTS is not None else None}
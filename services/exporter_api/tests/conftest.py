@@ -0,0 +1,7 @@
+from __future__ import annotations
+
+import os
+import sys
+
+# The exporter is a standalone service module (``uvicorn main:app`` from its directory).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
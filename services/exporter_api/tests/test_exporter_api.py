@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import json
+
+import httpx
+import main
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from fastapi.testclient import TestClient
+from opp.cache import TTLCache
+from opp.canonical import cid_of
+from opp.singleflight import SingleFlight
+
+GW = "http://gw"
+
+
+def _b64u(b: bytes) -> str:
+    return base64.urlsafe_b64encode(b).decode().rstrip("=")
+
+
+def _hops(trace_id: str, n: int, *, salt: str = "") -> list[dict]:
+    hops, prev = [], None
+    for i in range(n):
+        rid = hashlib.sha256(f"{salt}{trace_id}:{i}".encode()).hexdigest()
+        hop = {"trace_id": trace_id, "receipt_hash": rid, "ts": f"2024-01-01T00:00:{i:02d}Z",
+               "normalized": {"step": ("ingest.v1", "train.v1", "eval.v1")[i % 3], "phase": "end", "status": "ok"}}
+        if prev is not None:
+            hop["prev_receipt_hash"] = prev
+        hops.append(hop)
+        prev = rid
+    return hops
+
+
+class Gateway:
+    """Signed export bundles with ETags, If-None-Match revalidation and a JWKS endpoint."""
+
+    def __init__(self):
+        self.key = Ed25519PrivateKey.generate()
+        self.traces: dict[str, list[dict]] = {}
+        self.etags: dict[str, str] = {}
+        self.requests: list[tuple[str, int]] = []
+        self.signed: dict[str, dict[str, str]] = {}  # last signature headers served per trace
+        self.replay: dict[str, dict[str, str]] = {}  # signature headers to serve instead (tampering)
+
+    def put(self, trace_id: str, hops: list[dict], etag: str) -> None:
+        self.traces[trace_id], self.etags[trace_id] = hops, etag
+
+    def handle(self, req: httpx.Request) -> httpx.Response:
+        if req.url.path == "/.well-known/jwks.json":
+            x = self.key.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+            return httpx.Response(200, json={"keys": [{"kty": "OKP", "crv": "Ed25519", "x": _b64u(x), "kid": "gw1"}]})
+        trace_id = req.url.path.rsplit("/", 1)[-1]
+        if trace_id not in self.traces:
+            self.requests.append((trace_id, 404))
+            return httpx.Response(404, json={"detail": "not found"})
+        etag = self.etags[trace_id]
+        if req.headers.get("if-none-match") == etag:
+            self.requests.append((trace_id, 304))
+            return httpx.Response(304, headers={"etag": etag})
+        bundle = {"trace_id": trace_id, "chain": self.traces[trace_id]}
+        cid = cid_of(bundle)
+        ts = bundle["chain"][-1]["ts"]
+        sig = self.key.sign(f"{cid}|{trace_id}|{ts}".encode())
+        self.requests.append((trace_id, 200))
+        signed = {"x-odin-response-cid": cid, "x-odin-signature": _b64u(sig), "x-odin-kid": "gw1"}
+        self.signed[trace_id] = signed
+        return httpx.Response(200, content=json.dumps(bundle).encode(),
+                              headers={"etag": etag, **self.replay.get(trace_id, signed)})
+
+    def bodies(self, trace_id: str) -> int:
+        return self.requests.count((trace_id, 200))
+
+
+@pytest.fixture
+def gw(monkeypatch):
+    gateway = Gateway()
+    client = httpx.AsyncClient(transport=httpx.MockTransport(gateway.handle))
+    monkeypatch.setattr(main, "http_client", lambda: client)
+    monkeypatch.setattr(main, "CACHE", TTLCache(maxsize=64, ttl=300))
+    monkeypatch.setattr(main, "CACHE_FRESH", 0.0)
+    monkeypatch.setattr(main, "CACHE_EVENTS", dict.fromkeys(main.CACHE_EVENTS, 0))
+    monkeypatch.setattr(main, "FLIGHTS", SingleFlight())
+    monkeypatch.setattr(main, "JWKS", {})
+    monkeypatch.setattr(main, "STORE", None)
+    monkeypatch.setattr(main, "SNAPSHOTS", None)
+    return gateway
+
+
+@pytest.fixture
+def api() -> TestClient:
+    return TestClient(main.app)
+
+
+def _passport(api: TestClient, trace_id: str) -> dict:
+    r = api.get(f"/passport/{trace_id}", params={"gateway": GW})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_fresh_entry_is_served_from_cache(gw, api, monkeypatch):
+    monkeypatch.setattr(main, "CACHE_FRESH", 60.0)
+    gw.put("t", _hops("t", 6), '"v1"')
+    first = _passport(api, "t")
+    assert api.get("/graph/t", params={"gateway": GW}).status_code == 200
+    assert _passport(api, "t") == first
+    assert gw.requests == [("t", 200)]
+
+
+def test_etag_revalidation_and_validate(gw, api):
+    gw.put("t", _hops("t", 5), '"v1"')
+    r = api.get("/validate/t", params={"gateway": GW})
+    assert r.status_code == 200
+    result = r.json()
+    assert result["ok"] and result["sig_ok"] and result["cid_match"] and result["chain_ok"]
+    assert api.get("/validate/t", params={"gateway": GW}).json() == result
+    assert gw.requests == [("t", 200), ("t", 304)]
+    assert main.CACHE_EVENTS["revalidated"] == 1 and main.CACHE_EVENTS["refetched"] == 1
+    for key in ("trace|http://gw|t",):
+        assert "bundle" not in main.CACHE.get(key)  # only derived artifacts are cached
+
+
+def test_changed_etag_over_same_content_reuses_artifacts(gw, api):
+    hops = _hops("t", 5)
+    gw.put("t", hops, '"v1"')
+    first = _passport(api, "t")
+    gw.put("t", hops, '"v2"')  # e.g. a gateway restart re-tagging identical content
+    assert _passport(api, "t") == first
+    assert main.CACHE_EVENTS["cid_reused"] == 1 and main.CACHE_EVENTS["resumed"] == 0
+
+
+def test_replayed_cid_header_over_changed_body_fails_validation(gw, api):
+    hops = _hops("t", 5)
+    gw.put("t", hops, '"v1"')
+    assert api.get("/validate/t", params={"gateway": GW}).json()["ok"]
+    gw.replay["t"] = gw.signed["t"]
+    tampered = [dict(h) for h in hops]
+    tampered[2]["normalized"] = {**tampered[2]["normalized"], "step": "forged"}
+    gw.put("t", tampered, '"v2"')
+    result = api.get("/validate/t", params={"gateway": GW}).json()
+    assert not result["ok"] and not result["cid_match"]
+    assert result["bundle_cid"] == cid_of({"trace_id": "t", "chain": tampered})
+    assert main.CACHE_EVENTS["cid_reused"] == 0
+
+
+def test_growing_trace_resumes_and_matches_full_analysis(gw, api):
+    gw.put("t", _hops("t", 4), '"v1"')
+    _passport(api, "t")
+    api.get("/validate/t", params={"gateway": GW})
+    resumed = main.CACHE_EVENTS["resumed"]
+    gw.put("t", _hops("t", 9), '"v2"')
+    grown = _passport(api, "t")
+    validated = api.get("/validate/t", params={"gateway": GW}).json()
+    assert validated["ok"] and validated["bundle_cid"] == cid_of({"trace_id": "t", "chain": _hops("t", 9)})
+    assert main.CACHE_EVENTS["resumed"] == resumed + 2  # streamed and full-body loads both folded in 5 hops
+    assert main.CACHE_EVENTS["resume_mismatch"] == 0
+
+    main.CACHE.clear()  # the same chain analyzed from scratch
+    assert grown == _passport(api, "t")
+
+
+def test_rewritten_history_is_reanalyzed(gw, api):
+    gw.put("t", _hops("t", 6), '"v1"')
+    before = _passport(api, "t")
+    rewritten = _hops("t", 7, salt="x")  # every receipt hash changed
+    gw.put("t", rewritten, '"v2"')
+    after = _passport(api, "t")
+    assert main.CACHE_EVENTS["resume_mismatch"] == 1 and after != before
+    main.CACHE.clear()
+    assert after == _passport(api, "t")
+
+
+def test_upstream_errors_propagate(gw, api):
+    with pytest.raises(httpx.HTTPStatusError):
+        api.get("/passport/missing", params={"gateway": GW})
+
+
+def _batch(api: TestClient, command: str, **body) -> tuple[dict, dict]:
+    r = api.post(f"/batch/{command}", json={"gateway": GW, **body})
+    assert r.status_code == 200, r.text
+    *items, summary = (json.loads(line) for line in r.text.splitlines())
+    return {item["trace_id"]: item for item in items}, summary["summary"]
+
+
+def test_batch_reports_each_trace_and_a_summary(gw, api):
+    gw.put("a", _hops("a", 3), '"a1"')
+    items, summary = _batch(api, "passport", trace_ids=["a", "missing"], concurrency=2)
+    assert items["a"]["ok"] and items["a"]["result"] == _passport(api, "a")
+    assert items["missing"] == {"trace_id": "missing", "ok": False, "error": "upstream 404", "status": 404}
+    assert {k: summary[k] for k in ("total", "ok", "failed", "errors")} == {"total": 2, "ok": 1, "failed": 0, "errors": 1}
+
+
+def test_batch_turns_unexpected_errors_and_timeouts_into_error_lines(gw, api, monkeypatch):
+    async def flaky(gw_: str, trace_id: str) -> dict:
+        if trace_id == "slow":
+            await asyncio.sleep(5)
+        if trace_id == "broken":
+            raise KeyError("chain")
+        return {"trace_id": trace_id}
+
+    monkeypatch.setattr(main, "graph_result", flaky)
+    items, summary = _batch(api, "graph", trace_ids=["ok", "broken", "slow"], timeout=0.05)
+    assert items["ok"] == {"trace_id": "ok", "ok": True, "result": {"trace_id": "ok"}}
+    assert items["broken"] == {"trace_id": "broken", "ok": False, "error": "KeyError: 'chain'"}
+    assert items["slow"] == {"trace_id": "slow", "ok": False, "error": "timeout after 0.05s"}
+    assert summary["total"] == 3 and summary["errors"] == 2
+
+
+def test_batch_rejects_unknown_commands_and_oversized_requests(gw, api, monkeypatch):
+    assert api.post("/batch/explode", json={"trace_ids": ["a"]}).status_code == 404
+    monkeypatch.setattr(main, "BATCH_MAX_ITEMS", 2)
+    assert api.post("/batch/graph", json={"trace_ids": ["a", "b", "c"]}).status_code == 413